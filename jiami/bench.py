@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+# 各阶段模块位于 en/src，根目录脚本（test.py / test_random.py）与本文件同级
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'en', 'src')
+sys.path.insert(1, SRC_DIR)
+
+from cipher import decrypt_file, encrypt_file, load_tables
+from key import sqrt_task
+from keyfile import binary_path, text_to_binary
+from keystream import load_key_values
+from manifest import KeyManifest
+from massage import create_substitution_table
+from sort import generate_and_save_index
+import test as char_stats
+import test_random
+
+BASELINE_FILE = './result/bench_baseline.json'
+# 比基线慢超过该比例视为性能回退
+DEFAULT_THRESHOLD = 0.2
+# sqrt_task 的默认测试位数（百万位）
+DEFAULT_SIZES = [1, 5, 20]
+# 合成明文的默认大小（MB），1024 即 1GB 量级
+DEFAULT_PLAIN_MB = 256
+PLAIN_BLOCK = 1 << 24
+PRINTABLE = bytes(range(32, 127)) + b'\n'
+
+
+def byte_weights(sample_file='./test/1.txt'):
+    """以样本文件的字节频率作为合成明文的分布，样本不存在时使用均匀的可打印字符"""
+    if os.path.exists(sample_file):
+        hist = char_stats.byte_histogram(sample_file).astype(np.float64)
+        if hist.sum() > 0:
+            return hist / hist.sum()
+    hist = np.zeros(256)
+    hist[np.frombuffer(PRINTABLE, dtype=np.uint8)] = 1
+    return hist / hist.sum()
+
+
+def synthetic_plaintext(path, size, weights=None, seed=0, block_size=PLAIN_BLOCK):
+    """按给定字节分布分块生成 size 字节的合成明文（16 位查表抽样，内存与文件大小无关）"""
+    weights = byte_weights() if weights is None else weights
+    # 把分布量化到 65536 格的查找表，每个字节只需一次随机数和一次查表
+    bounds = np.round(np.cumsum(weights) / np.sum(weights) * 65536).astype(np.int64)
+    table = np.repeat(np.arange(256, dtype=np.uint8), np.diff(np.concatenate(([0], bounds))))
+    rng = np.random.default_rng(seed)
+    with open(path, 'wb') as f:
+        for pos in range(0, size, block_size):
+            n = min(block_size, size - pos)
+            f.write(table[rng.integers(0, 65536, n, dtype=np.uint16)].tobytes())
+    return size
+
+
+def timed(func, repeat=1):
+    """运行 repeat 次，返回最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def record(results, name, seconds, amount, unit):
+    results[name] = {
+        'seconds': seconds,
+        'amount': amount,
+        'unit': unit,
+        'rate': amount / max(seconds, 1e-9),
+    }
+    print(f"{name:28} {seconds:9.3f}s  {amount / max(seconds, 1e-9):14,.0f} {unit}/s")
+
+
+def run_benchmarks(work_dir, sizes=DEFAULT_SIZES, plain_mb=DEFAULT_PLAIN_MB, repeat=1,
+                   char_dir='./en/char', only=None):
+    """在 work_dir 中依次测量各阶段，返回 {用例名: 结果}"""
+    results = {}
+
+    def wanted(name):
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    keys_dir = os.path.join(work_dir, 'keys')
+    os.makedirs(keys_dir, exist_ok=True)
+    seed = 12345678901234567890123
+
+    # 1. 平方根密钥生成（不使用缓存），生成的文件同时作为后续阶段的密钥
+    key_files = []
+    for i, millions in enumerate(sizes):
+        digits = millions * 1_000_000
+        key_file = os.path.join(keys_dir, f'key{i}.txt')
+        key_files.append(key_file)
+        if wanted('sqrt_task'):
+            seconds = timed(lambda: sqrt_task(seed + i, key_file, digits, cache_dir=''), repeat)
+            record(results, f'sqrt_task/{millions}M', seconds, digits, 'digits')
+        else:
+            sqrt_task(seed + i, key_file, digits, cache_dir='')
+    if wanted('sqrt_extend'):
+        # 先经缓存生成最长的密钥，再计时把它延长四分之一（牛顿修正缓存的根，只转换新增的尾部）
+        cache_dir = os.path.join(work_dir, 'cache', 'keys')
+        digits = sizes[-1] * 1_000_000
+        sqrt_task(seed, os.path.join(work_dir, 'extend_base.txt'), digits, cache_dir=cache_dir)
+        longer = digits * 5 // 4
+        seconds = timed(lambda: sqrt_task(seed, os.path.join(work_dir, 'extend.txt'), longer,
+                                          cache_dir=cache_dir))
+        record(results, f'sqrt_extend/{sizes[-1]}M+25%', seconds, longer, 'digits')
+    with open(os.path.join(keys_dir, 'key.txt'), 'w') as f:
+        f.write(''.join(str(i) for i in range(len(key_files))))
+
+    if wanted('generate_and_save_index'):
+        index_file = os.path.join(work_dir, 'index.txt')
+        seconds = timed(lambda: generate_and_save_index(index_file, seed), repeat)
+        record(results, 'generate_and_save_index', seconds, 10000, 'digits')
+
+    if wanted('create_substitution_table'):
+        original = ''.join(chr(i) for i in range(32, 127))
+        manifest = KeyManifest(os.path.join(work_dir, 'manifest'))
+        seconds = timed(lambda: create_substitution_table(original, manifest), repeat)
+        record(results, 'create_substitution_table', seconds, len(original), 'chars')
+
+    # 2. 密钥加载：文本解析与二进制 mmap
+    largest = key_files[-1]
+    digits = sizes[-1] * 1_000_000
+    if wanted('keystream'):
+        record(results, 'keystream/text',
+               timed(lambda: load_key_values(keys_dir, len(key_files) - 1), repeat),
+               digits, 'digits')
+        text_to_binary(largest, binary_path(largest))
+        # 二进制格式为 mmap 零解析，求和以强制读入全部页面
+        record(results, 'keystream/binary',
+               timed(lambda: np.asarray(load_key_values(keys_dir, len(key_files) - 1)).sum(), repeat),
+               digits, 'digits')
+        os.remove(binary_path(largest))
+
+    # 3. 加密/解密吞吐（合成明文）
+    plain = os.path.join(work_dir, 'plain.txt')
+    size = plain_mb << 20
+    if wanted('encrypt') or wanted('decrypt') or wanted('char_stats'):
+        seconds = timed(lambda: synthetic_plaintext(plain, size))
+        record(results, 'synthetic_plaintext', seconds, size, 'bytes')
+    if wanted('encrypt') or wanted('decrypt'):
+        tables = load_tables(char_dir)
+        cipher_file = os.path.join(work_dir, 'en.bin')
+        record(results, 'encrypt', timed(lambda: encrypt_file(plain, cipher_file, tables, keys_dir), repeat),
+               size, 'bytes')
+        if wanted('decrypt'):
+            decrypted = os.path.join(work_dir, 'de.bin')
+            record(results, 'decrypt',
+                   timed(lambda: decrypt_file(cipher_file, decrypted, tables, keys_dir), repeat),
+                   size, 'bytes')
+
+    # 4. 统计分析
+    if wanted('randomness'):
+        record(results, 'randomness/run_tests', timed(lambda: test_random.run_tests(largest), repeat),
+               digits, 'digits')
+    if wanted('char_stats'):
+        record(results, 'char_stats/histogram',
+               timed(lambda: char_stats.analyze_character_distribution(plain), repeat), size, 'bytes')
+    return results
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, previous=None):
+    """保存基线；保留旧基线中按用例配置的阈值"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    baseline = {
+        'machine': machine_info(),
+        'thresholds': (previous or {}).get('thresholds', {}),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """与基线比较，返回 (报告行, 回退的用例名列表)；比值为基线速率/本次速率，基线 thresholds 字段可按用例覆盖阈值"""
+    # 中文表头按两列宽计算对齐
+    lines = [f"{'用例':30} {'基线(s)':>8} {'本次(s)':>8} {'比值':>5}  结论"]
+    regressions = []
+    overrides = baseline.get('thresholds', {})
+    for name, current in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            lines.append(f"{name:32} {'-':>10} {current['seconds']:10.3f} {'-':>7}  新用例")
+            continue
+        limit = overrides.get(name, threshold)
+        # 按速率比较，数据规模不同的运行之间也可对比
+        ratio = base['rate'] / max(current['rate'], 1e-9)
+        if ratio > 1 + limit:
+            verdict = f"回退 (>{limit:.0%})"
+            regressions.append(name)
+        elif ratio < 1 - limit:
+            verdict = "提升"
+        else:
+            verdict = "持平"
+        lines.append(f"{name:32} {base['seconds']:10.3f} {current['seconds']:10.3f} {ratio:7.2f}  {verdict}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各阶段性能基准测试与基线比较")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="sqrt_task 的测试位数（百万位，逗号分隔）")
+    parser.add_argument("--plain-size", type=int, default=DEFAULT_PLAIN_MB,
+                        help="合成明文大小（MB）")
+    parser.add_argument("--repeat", type=int, default=1, help="每个用例重复次数，取最短耗时")
+    parser.add_argument("--only", nargs="*", help="只运行名称以这些前缀开头的用例")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基线 JSON 文件")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="回退阈值（相对基线变慢的比例）")
+    parser.add_argument("--save", action="store_true", help="把本次结果保存为新基线")
+    parser.add_argument("--output", help="本次结果另存为 JSON")
+    parser.add_argument("--work-dir", help="临时文件目录（默认系统临时目录，结束后删除）")
+    parser.add_argument("--char-dir", default="./en/char")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    work_dir = tempfile.mkdtemp(prefix='bench_', dir=args.work_dir)
+    print(f"工作目录: {work_dir}")
+    try:
+        results = run_benchmarks(work_dir, sizes, args.plain_size, args.repeat, args.char_dir, args.only)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'machine': machine_info(), 'results': results}, f, ensure_ascii=False, indent=2)
+
+    baseline = load_baseline(args.baseline)
+    if args.save:
+        save_baseline(args.baseline, results, baseline)
+        print(f"基线已保存至: {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"未找到基线 {args.baseline}，使用 --save 创建")
+        return 0
+
+    lines, regressions = compare(results, baseline, args.threshold)
+    print("\n" + "\n".join(lines))
+    if regressions:
+        print(f"\n性能回退: {', '.join(regressions)}")
+        return 1
+    print("\n未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+import contextlib
+import json
+import mmap
+import os
+import queue
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+import numpy as np
+from keystream import KeyStore, KeyStream, KeyStreamIndex, consuming_table, count_consuming, map_file
+from subtable import TABLE_ENV, is_current, load_table_file, save_tables, table_path
+import tracing
+
+# 每次向量化处理的块大小（字节）
+BLOCK_SIZE = 1 << 24
+# 并行模式下每个任务处理的范围大小（字节）
+RANGE_SIZE = 1 << 26
+# 批量模式写在输出目录中的清单：每个输出文件的密钥流起始偏移（解密时按它定位）
+BATCH_MANIFEST = 'batch.json'
+# 流水线中每个队列最多缓存的块数（内存上限约为 (2*深度+3) 个块）
+PIPELINE_DEPTH = 2
+# 与 C 端 fgets(buf, CHAR_SET_SIZE, fp) 一致，最多读取 255 字节
+CHARSET_MAX = 255
+
+
+def read_charset(filename):
+    """按 fgets 语义读取字符集：读到换行（含）或 255 字节为止"""
+    with open(filename, 'rb') as f:
+        data = f.read(CHARSET_MAX)
+    newline = data.find(b'\n')
+    if newline >= 0:
+        data = data[:newline + 1]
+    nul = data.find(b'\0')
+    if nul >= 0:
+        data = data[:nul]
+    return data
+
+
+def load_charsets(char_dir):
+    """读取 char.txt 与 substitution.txt"""
+    original = read_charset(os.path.join(char_dir, 'char.txt'))
+    substitution = read_charset(os.path.join(char_dir, 'substitution.txt'))
+    if len(original) != len(substitution):
+        raise ValueError("Character sets length mismatch")
+    return original, substitution
+
+
+def build_tables(original, substitution):
+    """构造 256 项正向/逆向替换查找表与凯撒移位范围 [min_ord, max_ord]"""
+    if any(c >= 128 for c in substitution):
+        raise ValueError("字符集只支持 ASCII 字符")
+    forward = bytearray(range(256))
+    # C 端线性查找取第一个匹配，倒序写入保证前面的映射优先
+    for o, s in reversed(list(zip(original, substitution))):
+        forward[o] = s
+    # jiemi.c 的 reverse_map：后出现的映射覆盖前面的，未映射字节保持原样
+    inverse = bytearray(range(256))
+    for o, s in zip(original, substitution):
+        inverse[s] = o
+    min_ord, max_ord = min(substitution), max(substitution)
+    return {
+        'forward': bytes(forward),
+        'inverse': bytes(inverse),
+        'min_ord': min_ord,
+        'max_ord': max_ord,
+        'range': max_ord - min_ord + 1,
+    }
+
+
+def load_tables(char_dir, index=None):
+    """优先读取编译好的 tables.bin（index 选择轮换表，默认取环境变量 SUBSTITUTION_TABLE），否则由字符集构造"""
+    if index is None:
+        index = int(os.environ.get(TABLE_ENV) or 0)
+    if is_current(char_dir):
+        try:
+            table_list = load_table_file(table_path(char_dir))
+            if index >= len(table_list):
+                raise ValueError(f"替换表文件只有 {len(table_list)} 张表")
+            return table_list[index]
+        except ValueError as e:
+            # 与 C 端 load_substitution 一致：当前替换表损坏时警告并由字符集重新构造，轮换表无法重建
+            if index:
+                raise
+            print(f"Warning: Invalid substitution table {index} in {table_path(char_dir)}: {e}", file=sys.stderr)
+    if index:
+        raise ValueError(f"轮换表 {index} 需要先生成 {table_path(char_dir)}")
+    return build_tables(*load_charsets(char_dir))
+
+
+def compile_tables(char_dir, substitutions):
+    """由 char.txt 与若干替换串（第 0 个为当前替换表，其后为轮换表）生成 tables.bin，返回表列表"""
+    original = read_charset(os.path.join(char_dir, 'char.txt'))
+    table_list = []
+    for substitution in substitutions:
+        substitution = substitution.encode('utf-8')
+        if len(original) != len(substitution):
+            raise ValueError("Character sets length mismatch")
+        table_list.append(build_tables(original, substitution))
+    save_tables(table_path(char_dir), table_list)
+    return table_list
+
+
+def caesar_shift(arr, tables, stream, sign):
+    """对 [min_ord, max_ord] 内的字节整体做模移位，sign 为 +1 加密、-1 解密"""
+    min_ord = tables['min_ord']
+    mask = (arr >= min_ord) & (arr <= tables['max_ord'])
+    n = int(np.count_nonzero(mask))
+    if n == 0:
+        return arr
+    shifts = stream.take(n).astype(np.int16)
+    values = arr[mask].astype(np.int16) - min_ord
+    arr[mask] = ((values + sign * shifts) % tables['range'] + min_ord).astype(np.uint8)
+    return arr
+
+
+def encrypt_bytes(data, tables, stream):
+    """先替换、再凯撒加密一个数据块；stream 在块之间保持位置"""
+    arr = np.frombuffer(data.translate(tables['forward']), dtype=np.uint8).copy()
+    return caesar_shift(arr, tables, stream, 1).tobytes()
+
+
+def decrypt_bytes(data, tables, stream):
+    """先逆凯撒移位、再逆替换一个数据块"""
+    arr = np.frombuffer(data, dtype=np.uint8).copy()
+    return caesar_shift(arr, tables, stream, -1).tobytes().translate(tables['inverse'])
+
+
+def _read_blocks(fin, block_size, out_queue, errors):
+    try:
+        while True:
+            block = fin.read(block_size)
+            if not block:
+                break
+            out_queue.put(block)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        out_queue.put(None)
+
+
+def _write_blocks(fout, in_queue, errors):
+    while True:
+        block = in_queue.get()
+        if block is None:
+            break
+        if not errors:
+            try:
+                fout.write(block)
+            except Exception as e:
+                errors.append(e)
+    try:
+        fout.flush()
+    except Exception as e:
+        errors.append(e)
+
+
+def stream_transform(func, fin, fout, tables, stream, block_size=BLOCK_SIZE, depth=PIPELINE_DEPTH):
+    """
+    读线程 -> 变换 -> 写线程 三段流水线。
+    密钥流位置跨块延续，队列有界，内存占用与输入大小无关；fin/fout 可以是管道。
+    """
+    read_queue = queue.Queue(depth)
+    write_queue = queue.Queue(depth)
+    errors = []
+    reader = threading.Thread(target=_read_blocks, args=(fin, block_size, read_queue, errors), daemon=True)
+    writer = threading.Thread(target=_write_blocks, args=(fout, write_queue, errors), daemon=True)
+    reader.start()
+    writer.start()
+
+    total = 0
+    try:
+        while True:
+            block = read_queue.get()
+            if block is None:
+                break
+            if errors:
+                continue
+            try:
+                write_queue.put(func(block, tables, stream))
+            except Exception as e:
+                errors.append(e)
+                continue
+            total += len(block)
+    finally:
+        write_queue.put(None)
+        writer.join()
+        reader.join()
+    if errors:
+        raise errors[0]
+    return total
+
+
+def open_binary(path, mode):
+    """打开文件，'-' 表示标准输入/输出"""
+    if path == '-':
+        stdio = sys.stdin if 'r' in mode else sys.stdout
+        return contextlib.nullcontext(stdio.buffer)
+    return open(path, mode)
+
+
+def check_distinct(src, dst):
+    """输出会先被截断，与输入是同一文件时拒绝（否则输入在读取前就被清空）"""
+    if '-' not in (src, dst) and os.path.exists(dst) and os.path.samefile(src, dst):
+        raise ValueError(f"输出文件与输入文件相同: {dst}")
+
+
+def _transform_file(func, src, dst, tables, keys_dir, block_size, stream=None):
+    check_distinct(src, dst)
+    stream = stream if stream is not None else KeyStream(keys_dir)
+    name = 'cipher.decrypt' if func is decrypt_bytes else 'cipher.encrypt'
+    with tracing.span(name, file=src) as span, \
+            open_binary(src, 'rb') as fin, open_binary(dst, 'wb') as fout:
+        total = stream_transform(func, fin, fout, tables, stream, block_size)
+        span.set(bytes=total)
+        return total
+
+
+def encrypt_file(src, dst, tables, keys_dir, block_size=BLOCK_SIZE, stream=None):
+    """按块加密文件，返回处理的字节数"""
+    return _transform_file(encrypt_bytes, src, dst, tables, keys_dir, block_size, stream)
+
+
+def decrypt_file(src, dst, tables, keys_dir, block_size=BLOCK_SIZE, stream=None):
+    """按块解密文件，返回处理的字节数"""
+    return _transform_file(decrypt_bytes, src, dst, tables, keys_dir, block_size, stream)
+
+
+def _count_range(args):
+    """统计输入 [start, end) 消耗的密钥值个数"""
+    src, start, end, consuming, block_size = args
+    total = 0
+    with open(src, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for pos in range(start, end, block_size):
+            total += count_consuming(data[pos:min(pos + block_size, end)], consuming)
+    return total
+
+
+def _transform_range(args):
+    """从指定密钥流偏移开始变换 [start, end)，直接写入输出文件的映射"""
+    src, dst, start, end, key_offset, tables, index, decrypt, block_size = args
+    func = decrypt_bytes if decrypt else encrypt_bytes
+    stream = index.stream_at(key_offset)
+    with tracing.span('cipher.range', start=start, bytes=end - start), \
+            open(src, 'rb') as fin, open(dst, 'r+b') as fout, \
+            mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+            mmap.mmap(fout.fileno(), 0, access=mmap.ACCESS_WRITE) as out:
+        for pos in range(start, end, block_size):
+            stop = min(pos + block_size, end)
+            out[pos:stop] = func(data[pos:stop], tables, stream)
+    return end - start
+
+
+def parallel_transform(src, dst, tables, keys_dir, decrypt=False, workers=None,
+                       range_size=RANGE_SIZE, block_size=BLOCK_SIZE):
+    """
+    多进程加密/解密：先并行统计各范围消耗的密钥值个数得到起始偏移，
+    再由进程池按偏移并行变换。输入输出通过 mmap 共享，输出与串行路径逐字节一致。
+    """
+    check_distinct(src, dst)
+    size = os.path.getsize(src)
+    with open(dst, 'wb') as f:
+        f.truncate(size)
+    if size == 0:
+        return 0
+
+    index = KeyStreamIndex(keys_dir)
+    consuming = consuming_table(tables, decrypt)
+    ranges = [(start, min(start + range_size, size)) for start in range(0, size, range_size)]
+
+    with tracing.span('cipher.parallel', file=src, bytes=size, decrypt=decrypt), \
+            Pool(workers or os.cpu_count() or 1) as pool:
+        counts = pool.map(_count_range, [(src, start, end, consuming, block_size)
+                                         for start, end in ranges])
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        tasks = [(src, dst, start, end, int(offset), tables, index, decrypt, block_size)
+                 for (start, end), offset in zip(ranges, offsets)]
+        return sum(pool.imap_unordered(_transform_range, tasks))
+
+
+def batch_jobs(inputs, out_dir):
+    """
+    展开文件与目录（递归）为 (输入, 输出) 列表：目录中的文件按相对路径写到 out_dir 下，
+    单独给出的文件以文件名写到 out_dir 下。目录中的批量清单不作为输入；
+    两个输入落到同一输出（或占用清单的位置）时在开始处理前报错。
+    """
+    jobs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name == BATCH_MANIFEST:
+                        continue
+                    src = os.path.join(root, name)
+                    jobs.append((src, os.path.join(out_dir, os.path.relpath(src, path))))
+        else:
+            jobs.append((path, os.path.join(out_dir, os.path.basename(path))))
+
+    owners = {os.path.normcase(os.path.abspath(os.path.join(out_dir, BATCH_MANIFEST))): "批量清单"}
+    for src, dst in jobs:
+        key = os.path.normcase(os.path.abspath(dst))
+        if key in owners:
+            raise ValueError(f"输出路径重复: {dst}（{owners[key]} 与 {src}）")
+        owners[key] = src
+    return jobs
+
+
+def _manifest_name(path, base_dir):
+    return os.path.relpath(path, base_dir).replace(os.sep, '/')
+
+
+def count_file_consuming(path, consuming, block_size=BLOCK_SIZE):
+    """一个文件消耗的密钥值个数"""
+    data = map_file(path)
+    return sum(count_consuming(data[pos:pos + block_size], consuming) for pos in range(0, len(data), block_size))
+
+
+def save_batch_manifest(out_dir, period, offsets):
+    """把 {输出相对路径: 起始偏移} 合并写入 out_dir 的批量清单（同一目录先前批次的条目保留）"""
+    path = os.path.join(out_dir, BATCH_MANIFEST)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('period') != period:
+            manifest = None
+    except FileNotFoundError:
+        manifest = None
+    manifest = manifest or {'period': period, 'files': {}}
+    manifest['files'].update(offsets)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def batch_offset(src, period, manifests):
+    """由输入文件所在目录及其上级目录中的批量清单查出加密时的起始偏移"""
+    directory = os.path.dirname(os.path.abspath(src))
+    while True:
+        if directory not in manifests:
+            try:
+                with open(os.path.join(directory, BATCH_MANIFEST), 'r', encoding='utf-8') as f:
+                    manifests[directory] = json.load(f)
+            except FileNotFoundError:
+                manifests[directory] = None
+        manifest = manifests[directory]
+        name = _manifest_name(os.path.abspath(src), directory)
+        if manifest is not None and name in manifest['files']:
+            if manifest['period'] != period:
+                raise ValueError(f"{BATCH_MANIFEST} 的密钥流周期与当前密钥不一致")
+            return manifest['files'][name]
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise ValueError(f"批量清单中没有 {src} 的密钥流偏移")
+        directory = parent
+
+
+def _batch_file(func, src, dst, tables, stream, block_size):
+    """批量模式处理一个文件：不超过一块的小文件直接读写，大文件走读写流水线"""
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    check_distinct(src, dst)
+    if os.path.getsize(src) > block_size:
+        with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+            return stream_transform(func, fin, fout, tables, stream, block_size)
+    with open(src, 'rb') as fin:
+        data = fin.read()
+    with open(dst, 'wb') as fout:
+        fout.write(func(data, tables, stream) if data else data)
+    return len(data)
+
+
+def batch_transform(jobs, tables, keys_dir, out_dir, decrypt=False, threads=None, block_size=BLOCK_SIZE,
+                    store=None, progress=None):
+    """
+    线程池批量加密/解密：替换表、调度序列与 KeyStore 只加载一次，多个文件的读写与变换相互重叠。
+    加密时各文件依次接续在随机起点之后的密钥流上（偏移为之前各文件消耗的密钥值之和），
+    互不复用同一段密钥，起始偏移写入 out_dir 的批量清单；解密时由清单查出同样的偏移。
+    返回与 jobs 顺序一致的记录列表。
+    """
+    func = decrypt_bytes if decrypt else encrypt_bytes
+    index = KeyStreamIndex(keys_dir)
+    store = store if store is not None else KeyStore(keys_dir)
+    consuming = consuming_table(tables, decrypt)
+    offsets = [None] * len(jobs)
+    errors = [None] * len(jobs)
+
+    def run(i):
+        src, dst = jobs[i]
+        record = {'file': src, 'output': dst, 'bytes': 0}
+        start = time.perf_counter()
+        try:
+            if errors[i] is not None:
+                raise errors[i]
+            record['offset'] = offsets[i]
+            with tracing.span('cipher.batch_file', file=src, decrypt=decrypt) as span:
+                stream = index.stream_at(offsets[i], store)
+                record['bytes'] = _batch_file(func, src, dst, tables, stream, block_size)
+                span.set(bytes=record['bytes'])
+        except Exception as e:
+            record['error'] = str(e)
+        record['seconds'] = time.perf_counter() - start
+        if progress:
+            progress(record)
+        return record
+
+    def count(i):
+        try:
+            return count_file_consuming(jobs[i][0], consuming, block_size)
+        except Exception as e:
+            errors[i] = e
+            return 0
+
+    with tracing.span('cipher.batch', files=len(jobs), decrypt=decrypt), \
+            ThreadPoolExecutor(threads or None) as pool:
+        if decrypt:
+            manifests = {}
+            for i, (src, _) in enumerate(jobs):
+                try:
+                    offsets[i] = batch_offset(src, index.period, manifests)
+                except ValueError as e:
+                    errors[i] = e
+        else:
+            position = secrets.randbelow(index.period)
+            for i, used in enumerate(pool.map(count, range(len(jobs)))):
+                offsets[i] = position
+                position = (position + used) % index.period
+            save_batch_manifest(out_dir, index.period,
+                                {_manifest_name(dst, out_dir): offsets[i] for i, (_, dst) in enumerate(jobs)
+                                 if errors[i] is None})
+        return list(pool.map(run, range(len(jobs))))
+
+
+def format_batch_summary(records, elapsed):
+    """批量模式的逐文件与总吞吐汇总"""
+    lines = []
+    for record in records:
+        if 'error' in record:
+            lines.append(f"{record['file']}: ERROR {record['error']}")
+            continue
+        speed = record['bytes'] / max(record['seconds'], 1e-9) / 1e6
+        lines.append(f"{record['file']} -> {record['output']}: {record['bytes']:,} bytes, "
+                     f"{record['seconds']:.3f}s, {speed:.2f} MB/s")
+    total = sum(r['bytes'] for r in records)
+    failed = sum(1 for r in records if 'error' in r)
+    lines.append(f"Files: {len(records) - failed} ok, {failed} failed, {total:,} bytes")
+    lines.append(f"Time elapsed: {elapsed:.2f}s")
+    lines.append(f"Throughput: {total / max(elapsed, 1e-9) / 1e6:.2f} MB/s")
+    return "\n".join(lines)
+
+
+def files_equal(a, b, block_size=BLOCK_SIZE):
+    """逐块比较两个文件内容"""
+    if os.path.getsize(a) != os.path.getsize(b):
+        return False
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        while True:
+            block_a, block_b = fa.read(block_size), fb.read(block_size)
+            if block_a != block_b:
+                return False
+            if not block_a:
+                return True
+
+
+def roundtrip(src, tables, keys_dir, work_dir=None, block_size=BLOCK_SIZE):
+    """加密 -> 解密 -> 比较，返回 (是否一致, 加密MB/s, 解密MB/s)"""
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        enc = os.path.join(tmp, 'en.bin')
+        dec = os.path.join(tmp, 'de.bin')
+
+        start = time.perf_counter()
+        total = encrypt_file(src, enc, tables, keys_dir, block_size)
+        enc_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decrypt_file(enc, dec, tables, keys_dir, block_size)
+        dec_time = time.perf_counter() - start
+
+        ok = files_equal(src, dec, block_size)
+    return ok, total / max(enc_time, 1e-9) / 1e6, total / max(dec_time, 1e-9) / 1e6
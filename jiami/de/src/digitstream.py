@@ -0,0 +1,57 @@
+import asyncio
+import aiofiles
+import gmpy2
+from gmpy2 import mpz
+
+# 每段十进制位数（流式写入时单段字符串的最大长度）
+DEFAULT_SEGMENT = 1 << 20
+
+
+def fraction_window(value, skip, count):
+    """取mpfr小数部分第 skip 位起的 count 位，返回整数（不生成十进制字符串）"""
+    mantissa, exp = value.as_mantissa_exp()
+    scaled = mantissa * mpz(10) ** (skip + count)
+    if exp < 0:
+        scaled >>= int(-exp)
+    else:
+        scaled <<= int(exp)
+    return scaled % mpz(10) ** count
+
+
+def iter_segments(number, width, segment_size=DEFAULT_SEGMENT):
+    """分治进制转换：按从高到低顺序逐段产出 number 的十进制表示（左补零至 width 位）"""
+    if width <= 0:
+        return
+    segment_size = max(1, int(segment_size))
+    blocks = (width + segment_size - 1) // segment_size
+    first_width = width - (blocks - 1) * segment_size
+    powers = {}
+
+    def power(n_blocks):
+        if n_blocks not in powers:
+            powers[n_blocks] = mpz(10) ** (segment_size * n_blocks)
+        return powers[n_blocks]
+
+    def emit(n, n_blocks, head_width):
+        if n_blocks == 1:
+            yield n.digits().zfill(head_width)
+            return
+        low_blocks = n_blocks // 2
+        high, low = gmpy2.t_divmod(n, power(low_blocks))
+        yield from emit(high, n_blocks - low_blocks, head_width)
+        del high
+        yield from emit(low, low_blocks, segment_size)
+
+    yield from emit(mpz(number), blocks, first_width)
+
+
+async def async_write_segments(file, segments, mode="w"):
+    """异步逐段写入，每段转换完成后立即落盘（mode 为 "a" 时追加到已有文件末尾）"""
+    async with aiofiles.open(file, mode) as f:
+        for segment in segments:
+            await f.write(segment)
+
+
+def write_digits(file, number, width, segment_size=DEFAULT_SEGMENT, mode="w"):
+    """将整数按固定段长流式写成 width 位数字文件"""
+    asyncio.run(async_write_segments(file, iter_segments(number, width, segment_size), mode))
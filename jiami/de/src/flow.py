@@ -0,0 +1,119 @@
+import argparse
+import os
+from cipher import BATCH_MANIFEST, batch_offset, compile_tables, decrypt_file, files_equal, load_tables
+from key import sqrt_task
+from keycache import KeyCache
+from keystream import KeyStore, KeyStreamIndex
+from ma import generate_ascii_charset, rotation_substitutions, shuffle_charset
+from pipeline import STATE_DIR, Stage, format_summary, run_pipeline
+from manifest import load_generation, load_rotations
+from scheduler import default_options, plan_jobs, run_sqrt_jobs
+from sort import generate_and_save_index
+import tracing
+
+CHAR_DIR = './de/char'
+KEYS_DIR = './de/keys'
+
+
+def load_secrets(gen_id=None):
+    seed, keys, digits, index = load_generation(gen_id, require=('seed', 'keys', 'digits', 'index'))
+    return {'seed': seed, 'keys': keys, 'digits': digits, 'index': index,
+            'rotations': load_rotations(gen_id)}
+
+
+def key_files(ctx):
+    return [os.path.join(KEYS_DIR, f'key{i}.txt') for i in range(len(ctx['secrets']['keys']))]
+
+
+def build_stages(src, dst, reference=None, workers=None):
+    """
+    解密流程：由密钥清单中的一代重建替换表、平方根密钥与索引，全部完成后解密并校验。
+    密钥流起始偏移从密文所在目录的批量清单中读取。
+    """
+    char_file = os.path.join(CHAR_DIR, 'char.txt')
+    sub_file = os.path.join(CHAR_DIR, 'substitution.txt')
+    table_file = os.path.join(CHAR_DIR, 'tables.bin')
+    index_file = os.path.join(KEYS_DIR, 'key.txt')
+    batch_file = os.path.join(os.path.dirname(src) or '.', BATCH_MANIFEST)
+
+    def run_substitution(ctx):
+        if not os.path.exists(char_file):
+            generate_ascii_charset(char_file)
+        with open(char_file, 'rb') as f:
+            original = f.read().decode('utf-8').strip('\n')
+        substitution = shuffle_charset(original, ctx['secrets']['seed'])
+        with open(sub_file, 'w', encoding='utf-8') as f:
+            f.write(substitution)
+        # 编译 tables.bin（含轮换表），当前替换表直接在内存中交给后续阶段
+        rotations = rotation_substitutions(original, ctx['secrets']['rotations'])
+        ctx['tables'] = compile_tables(CHAR_DIR, [substitution] + rotations)[0]
+
+    def load_substitution(ctx):
+        ctx['tables'] = load_tables(CHAR_DIR, 0)
+
+    def run_keys(ctx):
+        jobs = plan_jobs(ctx['secrets']['keys'], ctx['secrets']['digits'],
+                         os.path.join(KEYS_DIR, 'key{i}.txt'))
+        run_sqrt_jobs(sqrt_task, jobs, workers, options=default_options())
+
+    def run_index(ctx):
+        generate_and_save_index(index_file, ctx['secrets']['index'], cache=KeyCache())
+
+    def run_cipher(ctx):
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        store = ctx.setdefault('store', KeyStore(KEYS_DIR, seeds=ctx['secrets']['keys']))
+        index = KeyStreamIndex(KEYS_DIR)
+        offset = batch_offset(src, index.period, {})
+        total = decrypt_file(src, dst, ctx['tables'], KEYS_DIR, stream=index.stream_at(offset, store))
+        print(f"Decryption completed. Saved to {dst} ({total:,} bytes)")
+
+    def run_verify(ctx):
+        ok = files_equal(reference, dst)
+        print(f"Verification: {'Success' if ok else 'Failed'}")
+
+    return [
+        Stage('substitution', run_substitution, load=load_substitution,
+              inputs=lambda ctx: {'params': {'seed': ctx['secrets']['seed'],
+                                             'rotations': ctx['secrets']['rotations']},
+                                  'files': [char_file]},
+              outputs=lambda ctx: [sub_file, table_file]),
+        Stage('keys', run_keys,
+              inputs=lambda ctx: {'params': {'keys': ctx['secrets']['keys'],
+                                             'digits': ctx['secrets']['digits']}},
+              outputs=key_files),
+        Stage('index', run_index,
+              inputs=lambda ctx: {'params': {'index': ctx['secrets']['index']}},
+              outputs=lambda ctx: [index_file]),
+        Stage('cipher', run_cipher, deps=('substitution', 'keys', 'index'),
+              inputs=lambda ctx: {'params': {'output': os.path.abspath(dst)},
+                                  'files': [src, batch_file, char_file, sub_file, table_file, index_file]
+                                  + key_files(ctx)},
+              outputs=lambda ctx: [dst]),
+    ] + ([
+        Stage('verify', run_verify, deps=('cipher',),
+              inputs=lambda ctx: {'files': [reference, dst]},
+              outputs=lambda ctx: []),
+    ] if reference and os.path.exists(reference) else [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解密流程编排：在一个进程内按依赖执行，输入未变的阶段直接跳过")
+    parser.add_argument("input", nargs="?", default="./result/en.txt")
+    parser.add_argument("output", nargs="?", default="./result/de.txt")
+    parser.add_argument("--verify", default="./test/test1.txt", help="解密后比对的原文文件")
+    parser.add_argument("--generation", help="使用密钥清单中的指定一代（默认最新一代）")
+    parser.add_argument("--force", nargs="*", default=[], help="强制重新执行的阶段（all 表示全部）")
+    parser.add_argument("--workers", type=int, default=0, help="平方根工作进程数，0 表示全部核心")
+    parser.add_argument("--state", default=os.path.join(STATE_DIR, 'de.json'), help="流水线状态文件")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
+
+    secrets = load_secrets(args.generation)
+    stages = build_stages(args.input, args.output, args.verify, args.workers or None)
+    _, summary = run_pipeline(stages, args.state, {'secrets': secrets}, args.force)
+    print("\n" + format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,32 +4,208 @@
 #include <time.h>
 #include <ctype.h>
 #include <sys/stat.h>
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <sys/mman.h>
+#include <fcntl.h>
+#include <unistd.h>
+#endif
 
 // 配置常量
 #define MAX_FILE_SIZE 1073741824   // 最大支持1gb文件
 #define CHAR_SET_SIZE 256
 
+// 二进制密钥文件格式（与 keyfile.py 保持一致）
+#define KEY_MAGIC "JKEY"
+#define KEY_HEADER_SIZE 64
+#define KEY_HEADER_SIZE_OFFSET 6
+#define KEY_COUNT_OFFSET 32
+#define KEY_CRC_OFFSET 40
+
+// 常驻密钥存储：每个密钥文件只加载一次，超出内存预算时按LRU淘汰
+#define KEY_FILE_COUNT 10
+#define DEFAULT_KEY_BUDGET_MB 1024   // 可用环境变量 KEY_STORE_BUDGET_MB 覆盖
+
+typedef struct {
+    unsigned char* values; // 密钥值数组（每字节一个00-99）
+    int len;
+    void* map_base;        // 二进制密钥文件映射基址（NULL表示malloc分配）
+    size_t map_len;
+    int loaded;
+    unsigned long last_used;
+} KeyEntry;
+
+typedef struct KeyStore {
+    KeyEntry entries[KEY_FILE_COUNT];
+    size_t budget;         // 内存预算（字节）
+    size_t resident;       // 当前常驻字节数
+    unsigned long tick;
+    int loads;             // 从磁盘加载次数
+    int hits;              // 内存命中次数
+} KeyStore;
+
 // 密钥流状态结构体
 typedef struct {
     int* key_indices;      // 密钥索引数组
     int key_indices_len;   // 密钥索引数量
     int current_key_idx;   // 当前密钥文件索引
-    int* current_values;   // 当前密钥值数组
+    struct KeyStore* store; // 常驻密钥存储
+    const unsigned char* current_values; // 当前密钥值数组（由store持有）
     int values_len;        // 密钥值数量
     int value_ptr;         // 当前密钥值指针
 } KeyStreamState;
 
+// 编译后的替换表文件（与 subtable.py 保持一致）：16字节文件头 + 每张表520字节
+// 表记录: forward[256] | inverse[256] | min_ord | max_ord | 保留2字节 | crc32（前516字节）
+#define TABLE_MAGIC "JSUB"
+#define TABLE_VERSION 1
+#define TABLE_HEADER_SIZE 16
+#define TABLE_RECORD_SIZE 520
+
+typedef struct {
+    unsigned char forward[256];  // 正向替换
+    unsigned char inverse[256];  // 逆向替换
+    int min_ord;                 // 凯撒移位范围 [min_ord, max_ord]
+    int max_ord;
+} SubstitutionTable;
+
 // 函数声明
-int* read_key_file(int key_index, int* len);
+unsigned char* read_key_file(int key_index, int* len);
+long long text_digit_count(const char* filename);
+unsigned char* map_binary_key(int key_index, int* len, void** map_base, size_t* map_len);
+KeyStore* key_store_create();
+const unsigned char* key_store_get(KeyStore* store, int key_index, int* len);
+void key_store_free(KeyStore* store);
 KeyStreamState* init_key_stream();
 int next_key_value(KeyStreamState* state);
 void free_key_stream(KeyStreamState* state);
-void caesar_decrypt(char* content, int len, KeyStreamState* state, const char* char_set);
-void substitution_decrypt(char* content, int len, const char* original, const char* substitution);
+void caesar_decrypt(char* content, int len, KeyStreamState* state, const SubstitutionTable* table);
+void substitution_decrypt(char* content, int len, const SubstitutionTable* table);
 void print_progress(size_t processed, size_t total);
 
-// 读取密钥文件（返回动态数组）
-int* read_key_file(int key_index, int* len) {
+// 与 zlib.crc32 相同的 CRC32（查表，每字节一次；加载二进制密钥时对整个文件校验）
+unsigned int crc32_bytes(const unsigned char* data, size_t len) {
+    static unsigned int table[256];
+    static int ready = 0;
+    if (!ready) {
+        for (unsigned int n = 0; n < 256; n++) {
+            unsigned int c = n;
+            for (int k = 0; k < 8; k++) {
+                c = (c >> 1) ^ (0xEDB88320u & (0u - (c & 1u)));
+            }
+            table[n] = c;
+        }
+        ready = 1;
+    }
+    unsigned int crc = 0xFFFFFFFFu;
+    for (size_t i = 0; i < len; i++) {
+        crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFFu];
+    }
+    return ~crc;
+}
+
+static unsigned int read_le(const unsigned char* p, int bytes) {
+    unsigned int value = 0;
+    for (int i = bytes - 1; i >= 0; i--) {
+        value = (value << 8) | p[i];
+    }
+    return value;
+}
+
+// 读取第 index 张表并校验；文件不存在、早于 substitution.txt 或校验失败时返回 -1
+int load_table_file(const char* table_file, const char* source_file, int index, SubstitutionTable* table) {
+    struct stat st_table, st_source;
+    if (stat(table_file, &st_table) != 0) return -1;
+    if (stat(source_file, &st_source) == 0 && st_table.st_mtime < st_source.st_mtime) return -1;
+
+    FILE* fp = fopen(table_file, "rb");
+    if (!fp) return -1;
+    unsigned char header[TABLE_HEADER_SIZE];
+    unsigned char record[TABLE_RECORD_SIZE];
+    int ok = fread(header, 1, TABLE_HEADER_SIZE, fp) == TABLE_HEADER_SIZE
+             && memcmp(header, TABLE_MAGIC, 4) == 0
+             && read_le(header + 4, 2) == TABLE_VERSION
+             && read_le(header + 8, 2) == TABLE_RECORD_SIZE
+             && index >= 0 && (unsigned int)index < read_le(header + 12, 4);
+    if (ok) {
+        long offset = (long)read_le(header + 6, 2) + (long)index * TABLE_RECORD_SIZE;
+        ok = fseek(fp, offset, SEEK_SET) == 0
+             && fread(record, 1, TABLE_RECORD_SIZE, fp) == TABLE_RECORD_SIZE
+             && crc32_bytes(record, TABLE_RECORD_SIZE - 4) == read_le(record + TABLE_RECORD_SIZE - 4, 4);
+    }
+    fclose(fp);
+    if (!ok) {
+        fprintf(stderr, "Warning: Invalid substitution table %d in %s\n", index, table_file);
+        return -1;
+    }
+
+    memcpy(table->forward, record, 256);
+    memcpy(table->inverse, record + 256, 256);
+    table->min_ord = record[512];
+    table->max_ord = record[513];
+    return 0;
+}
+
+// 由字符集构造替换表：正向取第一个匹配，逆向后出现的映射覆盖前面的，未映射字节保持原样
+void build_table(const char* original, const char* substitution, SubstitutionTable* table) {
+    int len = strlen(substitution);
+    table->min_ord = 255;
+    table->max_ord = 0;
+    for (int i = 0; i < 256; i++) {
+        table->forward[i] = (unsigned char)i;
+        table->inverse[i] = (unsigned char)i;
+    }
+    for (int i = len - 1; i >= 0; i--) {
+        table->forward[(unsigned char)original[i]] = (unsigned char)substitution[i];
+    }
+    for (int i = 0; i < len; i++) {
+        unsigned char s = (unsigned char)substitution[i];
+        table->inverse[s] = (unsigned char)original[i];
+        if (s < table->min_ord) table->min_ord = s;
+        if (s > table->max_ord) table->max_ord = s;
+    }
+}
+
+// 读取替换表：优先 tables.bin（环境变量 SUBSTITUTION_TABLE 选择轮换表），否则由字符集文本构造
+void load_substitution(const char* char_dir, SubstitutionTable* table) {
+    char table_file[256], original_file[256], substitution_file[256];
+    snprintf(table_file, sizeof(table_file), "%s/tables.bin", char_dir);
+    snprintf(original_file, sizeof(original_file), "%s/char.txt", char_dir);
+    snprintf(substitution_file, sizeof(substitution_file), "%s/substitution.txt", char_dir);
+
+    const char* env = getenv("SUBSTITUTION_TABLE");
+    int index = env ? atoi(env) : 0;
+    if (load_table_file(table_file, substitution_file, index, table) == 0) return;
+    if (index != 0) {
+        fprintf(stderr, "Error: Rotated table %d requires %s\n", index, table_file);
+        exit(1);
+    }
+
+    FILE* fp1 = fopen(original_file, "r");
+    FILE* fp2 = fopen(substitution_file, "r");
+    if (!fp1 || !fp2) {
+        fprintf(stderr, "Error: Missing character set files\n");
+        exit(1);
+    }
+
+    char original[CHAR_SET_SIZE] = {0};
+    char substitution[CHAR_SET_SIZE] = {0};
+
+    fgets(original, CHAR_SET_SIZE, fp1);
+    fgets(substitution, CHAR_SET_SIZE, fp2);
+    fclose(fp1);
+    fclose(fp2);
+
+    if (strlen(original) != strlen(substitution)) {
+        fprintf(stderr, "Error: Character sets length mismatch\n");
+        exit(1);
+    }
+    build_table(original, substitution, table);
+}
+
+// 读取文本密钥文件（返回动态数组）
+unsigned char* read_key_file(int key_index, int* len) {
     char filename[50];
     snprintf(filename, sizeof(filename), "./de/keys/key%d.txt", key_index);
     
@@ -68,16 +244,208 @@ int* read_key_file(int key_index, int* len) {
 
     // 转换为整数数组
     *len = clean_len / 2;
-    int* result = malloc(*len * sizeof(int));
+    unsigned char* result = malloc(*len);
     for (int i = 0; i < *len; i++) {
         char num_str[3] = {clean_buffer[2*i], clean_buffer[2*i+1], '\0'};
-        result[i] = atoi(num_str);
+        result[i] = (unsigned char)atoi(num_str);
     }
     free(clean_buffer);
 
     return result;
 }
 
+// 只读映射整个文件，失败返回NULL
+void* map_file(const char* filename, size_t* map_len) {
+#ifdef _WIN32
+    HANDLE file = CreateFileA(filename, GENERIC_READ, FILE_SHARE_READ, NULL,
+                              OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+    if (file == INVALID_HANDLE_VALUE) return NULL;
+    LARGE_INTEGER size;
+    if (!GetFileSizeEx(file, &size) || size.QuadPart == 0) {
+        CloseHandle(file);
+        return NULL;
+    }
+    HANDLE mapping = CreateFileMappingA(file, NULL, PAGE_READONLY, 0, 0, NULL);
+    CloseHandle(file);
+    if (!mapping) return NULL;
+    void* base = MapViewOfFile(mapping, FILE_MAP_READ, 0, 0, 0);
+    CloseHandle(mapping);
+    if (!base) return NULL;
+    *map_len = (size_t)size.QuadPart;
+    return base;
+#else
+    int fd = open(filename, O_RDONLY);
+    if (fd < 0) return NULL;
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) {
+        close(fd);
+        return NULL;
+    }
+    void* base = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (base == MAP_FAILED) return NULL;
+    *map_len = st.st_size;
+    return base;
+#endif
+}
+
+void unmap_file(void* base, size_t map_len) {
+#ifdef _WIN32
+    (void)map_len;
+    UnmapViewOfFile(base);
+#else
+    munmap(base, map_len);
+#endif
+}
+
+// 文本密钥的位数（按纯数字文件计：文件大小减去末尾的换行等字符），无法读取时返回-1
+long long text_digit_count(const char* filename) {
+    FILE* fp = fopen(filename, "rb");
+    if (!fp) return -1;
+    fseek(fp, 0, SEEK_END);
+    long long size = ftell(fp);
+    while (size > 0) {
+        fseek(fp, (long)(size - 1), SEEK_SET);
+        if (isdigit(fgetc(fp))) break;
+        size--;
+    }
+    fclose(fp);
+    return size;
+}
+
+// 映射二进制密钥文件（零解析），不存在、格式不符、校验失败或与文本密钥不一致
+// （比文本旧、位数不同）时返回NULL，由调用方改为解析文本
+unsigned char* map_binary_key(int key_index, int* len, void** map_base, size_t* map_len) {
+    char filename[50];
+    char text_file[50];
+    snprintf(filename, sizeof(filename), "./de/keys/key%d.bin", key_index);
+    snprintf(text_file, sizeof(text_file), "./de/keys/key%d.txt", key_index);
+
+    size_t size = 0;
+    unsigned char* base = map_file(filename, &size);
+    if (!base) return NULL;
+
+    unsigned short header_size = 0;
+    unsigned long long digit_count = 0;
+    if (size < KEY_HEADER_SIZE || memcmp(base, KEY_MAGIC, 4) != 0) {
+        fprintf(stderr, "Warning: Invalid binary key file %s\n", filename);
+        unmap_file(base, size);
+        return NULL;
+    }
+    memcpy(&header_size, base + KEY_HEADER_SIZE_OFFSET, sizeof(header_size));
+    memcpy(&digit_count, base + KEY_COUNT_OFFSET, sizeof(digit_count));
+
+    size_t pairs = (size_t)((digit_count + 1) / 2);
+    if (size < header_size + pairs) {
+        fprintf(stderr, "Warning: Truncated binary key file %s\n", filename);
+        unmap_file(base, size);
+        return NULL;
+    }
+    if (crc32_bytes(base + header_size, pairs) != read_le(base + KEY_CRC_OFFSET, 4)) {
+        fprintf(stderr, "Warning: Checksum mismatch in binary key file %s\n", filename);
+        unmap_file(base, size);
+        return NULL;
+    }
+    struct stat bin_st, text_st;
+    if (stat(text_file, &text_st) == 0 && stat(filename, &bin_st) == 0
+        && (bin_st.st_mtime < text_st.st_mtime
+            || text_digit_count(text_file) != (long long)digit_count)) {
+        fprintf(stderr, "Warning: Stale binary key file %s, using %s\n", filename, text_file);
+        unmap_file(base, size);
+        return NULL;
+    }
+
+    *len = (int)pairs;
+    *map_base = base;
+    *map_len = size;
+    return base + header_size;
+}
+
+// 释放一个密钥文件的常驻数据
+void key_entry_release(KeyEntry* entry) {
+    if (entry->map_base) {
+        unmap_file(entry->map_base, entry->map_len);
+    } else {
+        free(entry->values);
+    }
+    entry->values = NULL;
+    entry->map_base = NULL;
+    entry->map_len = 0;
+    entry->len = 0;
+    entry->loaded = 0;
+}
+
+// 创建常驻密钥存储
+KeyStore* key_store_create() {
+    KeyStore* store = calloc(1, sizeof(KeyStore));
+    size_t budget_mb = DEFAULT_KEY_BUDGET_MB;
+    const char* env = getenv("KEY_STORE_BUDGET_MB");
+    if (env && atol(env) > 0) {
+        budget_mb = (size_t)atol(env);
+    }
+    store->budget = budget_mb * 1048576;
+    return store;
+}
+
+// 超出预算时淘汰最久未使用的密钥文件（保留 keep）
+void key_store_evict(KeyStore* store, int keep) {
+    while (store->resident > store->budget) {
+        int victim = -1;
+        for (int i = 0; i < KEY_FILE_COUNT; i++) {
+            if (i == keep || !store->entries[i].loaded) continue;
+            if (victim < 0 || store->entries[i].last_used < store->entries[victim].last_used) {
+                victim = i;
+            }
+        }
+        if (victim < 0) break;
+        store->resident -= store->entries[victim].len;
+        key_entry_release(&store->entries[victim]);
+    }
+}
+
+// 获取密钥文件的值数组：已常驻则直接返回，否则加载一次
+const unsigned char* key_store_get(KeyStore* store, int key_index, int* len) {
+    if (key_index < 0 || key_index >= KEY_FILE_COUNT) {
+        *len = 0;
+        return NULL;
+    }
+    KeyEntry* entry = &store->entries[key_index];
+    entry->last_used = ++store->tick;
+    if (entry->loaded) {
+        store->hits++;
+        *len = entry->len;
+        return entry->values;
+    }
+
+    // 优先映射二进制密钥文件，不存在时解析文本格式
+    store->loads++;
+    entry->values = map_binary_key(key_index, &entry->len, &entry->map_base, &entry->map_len);
+    if (entry->values == NULL) {
+        entry->map_base = NULL;
+        entry->values = read_key_file(key_index, &entry->len);
+    }
+    if (entry->values == NULL || entry->len == 0) {
+        key_entry_release(entry);
+        *len = 0;
+        return NULL;
+    }
+
+    entry->loaded = 1;
+    store->resident += entry->len;
+    key_store_evict(store, key_index);
+    *len = entry->len;
+    return entry->values;
+}
+
+// 释放常驻密钥存储并输出统计
+void key_store_free(KeyStore* store) {
+    printf("Key store: %d loads, %d hits\n", store->loads, store->hits);
+    for (int i = 0; i < KEY_FILE_COUNT; i++) {
+        if (store->entries[i].loaded) key_entry_release(&store->entries[i]);
+    }
+    free(store);
+}
+
 // 初始化密钥流状态
 KeyStreamState* init_key_stream() {
     KeyStreamState* state = malloc(sizeof(KeyStreamState));
@@ -109,6 +477,7 @@ KeyStreamState* init_key_stream() {
     }
 
     state->current_key_idx = 0;
+    state->store = key_store_create();
     state->current_values = NULL;
     state->values_len = 0;
     state->value_ptr = 0;
@@ -119,13 +488,12 @@ KeyStreamState* init_key_stream() {
 // 获取下一个密钥值
 int next_key_value(KeyStreamState* state) {
     if (state->value_ptr >= state->values_len) {
-        // 加载下一个密钥文件
-        free(state->current_values);
+        // 切换到下一个密钥文件（已加载过的直接从内存取）
         
         int key_index = state->key_indices[state->current_key_idx];
         state->current_key_idx = (state->current_key_idx + 1) % state->key_indices_len;
         
-        state->current_values = read_key_file(key_index, &state->values_len);
+        state->current_values = key_store_get(state->store, key_index, &state->values_len);
         state->value_ptr = 0;
         
         if (state->current_values == NULL || state->values_len == 0) {
@@ -140,25 +508,17 @@ int next_key_value(KeyStreamState* state) {
 // 释放密钥流资源
 void free_key_stream(KeyStreamState* state) {
     free(state->key_indices);
-    if (state->current_values) free(state->current_values);
+    key_store_free(state->store);
     free(state);
 }
 
 // 凯撒解密
-void caesar_decrypt(char* content, int len, KeyStreamState* state, const char* char_set) {
-    int min_ord = 255, max_ord = 0;
-    int char_set_len = strlen(char_set);
-    
-    // 确定字符范围
-    for (int i = 0; i < char_set_len; i++) {
-        int code = (int)char_set[i];
-        if (code < min_ord) min_ord = code;
-        if (code > max_ord) max_ord = code;
-    }
+void caesar_decrypt(char* content, int len, KeyStreamState* state, const SubstitutionTable* table) {
+    int min_ord = table->min_ord, max_ord = table->max_ord;
     int range = max_ord - min_ord + 1;
 
     for (int i = 0; i < len; i++) {
-        char c = content[i];
+        unsigned char c = (unsigned char)content[i];
         if (c >= min_ord && c <= max_ord) {
             int shift = next_key_value(state);
             int code = (int)c;
@@ -174,22 +534,10 @@ void caesar_decrypt(char* content, int len, KeyStreamState* state, const char* c
     }
 }
 
-// 替换表解密
-void substitution_decrypt(char* content, int len, const char* original, const char* substitution) {
-    // 创建反向映射表
-    char reverse_map[CHAR_SET_SIZE] = {0};
-    int set_len = strlen(substitution);
-    
-    for (int i = 0; i < set_len; i++) {
-        reverse_map[(int)substitution[i]] = original[i];
-    }
-
-    // 执行替换
+// 替换表解密（256项逆向查表）
+void substitution_decrypt(char* content, int len, const SubstitutionTable* table) {
     for (int i = 0; i < len; i++) {
-        char c = content[i];
-        if (reverse_map[(int)c] != 0) {
-            content[i] = reverse_map[(int)c];
-        }
+        content[i] = (char)table->inverse[(unsigned char)content[i]];
     }
 }
 
@@ -203,7 +551,7 @@ void print_progress(size_t processed, size_t total) {
 
 // 主解密函数
 void decryption(const char* encrypted_file, const char* output_file, 
-               const char* original, const char* substitution) {
+               const SubstitutionTable* table) {
     clock_t start = clock();
     
     // 读取加密文件
@@ -230,11 +578,11 @@ void decryption(const char* encrypted_file, const char* output_file,
     
     // 凯撒解密
     KeyStreamState* state = init_key_stream();
-    caesar_decrypt(content, file_size, state, substitution);
+    caesar_decrypt(content, file_size, state, table);
     free_key_stream(state);
     
     // 替换表解密
-    substitution_decrypt(content, file_size, original, substitution);
+    substitution_decrypt(content, file_size, table);
     
     // 保存结果
     FILE* out = fopen(output_file, "w");
@@ -267,30 +615,12 @@ void decryption(const char* encrypted_file, const char* output_file,
 }
 
 void decode(const char* encrypted_file, const char* output_file) {
-    // 读取字符集
-    FILE* fp1 = fopen("./de/char/char.txt", "r");
-    FILE* fp2 = fopen("./de/char/substitution.txt", "r");
-    
-    if (!fp1 || !fp2) {
-        fprintf(stderr, "Error: Missing character set files\n");
-        exit(1);
-    }
-    
-    char original[CHAR_SET_SIZE] = {0};
-    char substitution[CHAR_SET_SIZE] = {0};
-    
-    fgets(original, CHAR_SET_SIZE, fp1);
-    fgets(substitution, CHAR_SET_SIZE, fp2);
-    fclose(fp1);
-    fclose(fp2);
-    
-    if (strlen(original) != strlen(substitution)) {
-        fprintf(stderr, "Error: Character sets length mismatch\n");
-        exit(1);
-    }
+    // 读取替换表
+    SubstitutionTable table;
+    load_substitution("./de/char", &table);
     
     // 执行解密
-    decryption(encrypted_file, output_file, original, substitution);
+    decryption(encrypted_file, output_file, &table);
 }
 int main() {
     const char* encrypted_file = "./result/en.txt";
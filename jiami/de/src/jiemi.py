@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import time
+from cipher import (BLOCK_SIZE, batch_jobs, batch_transform, decrypt_file, files_equal, format_batch_summary,
+                    load_tables, parallel_transform, roundtrip)
+from keystream import KeyStream
+import tracing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量化解密（与 jiemi.c 输出逐字节一致）")
+    parser.add_argument("input", nargs="?", default="./result/en.txt",
+                        help="输入文件，'-' 表示标准输入")
+    parser.add_argument("output", nargs="?", default="./result/de.txt",
+                        help="输出文件，'-' 表示标准输出")
+    parser.add_argument("--char-dir", default="./de/char")
+    parser.add_argument("--table", type=int,
+                        help="使用 tables.bin 中的第几张轮换表（默认取环境变量 SUBSTITUTION_TABLE，否则为 0）")
+    parser.add_argument("--keys-dir", default="./de/keys")
+    parser.add_argument("--verify", default="./test/test1.txt", help="解密后比对的原文文件")
+    parser.add_argument("--roundtrip", metavar="FILE",
+                        help="往返校验模式：加密、解密 FILE 并比较，报告两个方向的 MB/s")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE >> 20,
+                        help="流式处理的块大小（MB）")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="并行进程数（>1 时按范围并行处理，不支持标准输入输出；0 表示全部核心）")
+    parser.add_argument("--batch", nargs="+", metavar="PATH",
+                        help="批量模式：解密这些文件与目录（递归）中的全部文件，按加密时的 batch.json 定位密钥流")
+    parser.add_argument("--out-dir", default="./result/de", help="批量模式的输出目录（目录输入保留相对路径）")
+    parser.add_argument("--threads", type=int, default=0, help="批量模式的线程数，0 表示默认值")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    if args.block_size <= 0:
+        parser.error("--block-size 必须为正整数")
+    tracing.enable(args.trace)
+    # 输出到标准输出时，状态信息改写到标准错误
+    log = sys.stderr if args.output == '-' else sys.stdout
+
+    tables = load_tables(args.char_dir, args.table)
+
+    if args.roundtrip:
+        size = os.path.getsize(args.roundtrip)
+        print(f"往返校验: {args.roundtrip} ({size / 1e6:.1f} MB)")
+        ok, enc_speed, dec_speed = roundtrip(args.roundtrip, tables, args.keys_dir)
+        print(f"加密速度: {enc_speed:.2f} MB/s")
+        print(f"解密速度: {dec_speed:.2f} MB/s")
+        print(f"Verification: {'Success' if ok else 'Failed'}")
+        raise SystemExit(0 if ok else 1)
+
+    start = time.time()
+    if args.batch:
+        try:
+            jobs = batch_jobs(args.batch, args.out_dir)
+        except ValueError as e:
+            parser.error(str(e))
+        records = batch_transform(jobs, tables, args.keys_dir, args.out_dir,
+                                  decrypt=True, threads=args.threads or None, block_size=args.block_size << 20)
+        print(format_batch_summary(records, time.time() - start))
+        raise SystemExit(1 if any('error' in r for r in records) else 0)
+    if args.output != '-':
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    if args.workers != 1 and '-' not in (args.input, args.output):
+        total = parallel_transform(args.input, args.output, tables, args.keys_dir,
+                                   decrypt=True, workers=args.workers or None,
+                                   block_size=args.block_size << 20)
+    else:
+        stream = KeyStream(args.keys_dir)
+        total = decrypt_file(args.input, args.output, tables, args.keys_dir,
+                             args.block_size << 20, stream)
+        print(stream.store.stats(), file=log)
+    elapsed = time.time() - start
+
+    print(f"\n\nDecryption completed. Saved to {args.output}", file=log)
+    print(f"Time elapsed: {elapsed:.2f}s", file=log)
+    print(f"Throughput: {total / max(elapsed, 1e-9) / 1e6:.2f} MB/s", file=log)
+
+    if args.output == '-':
+        return
+    if os.path.exists(args.verify):
+        ok = files_equal(args.verify, args.output)
+        print(f"Verification: {'Success' if ok else 'Failed'}", file=log)
+    else:
+        print("Verification: Original file not found", file=log)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 
-from readkey import read_pswd 
+from manifest import load_generation
 
-import gmpy2
-from gmpy2 import mpfr, get_context
 import time
-from multiprocessing import Process
+import argparse
 import asyncio
 import aiofiles
+from digitstream import DEFAULT_SEGMENT
+from keycache import CACHE_DIR, DEFAULT_MAX_BYTES, KeyCache, RootCache, root_dir
+from keyfile import discard_binary
+from sqrtkey import KEY_SKIP, ENGINES, format_speed, sqrt_digits, write_key_digits, write_sqrt_digits
+from scheduler import default_options, format_reports, plan_jobs, run_sqrt_jobs
+import tracing
 
 from tqdm import tqdm
 
@@ -17,46 +21,65 @@ async def async_write(file, content):
         await f.write(content)
 
 
-def sqrt_task(key, file, digits):
-    """动态位数平方根计算"""
-    ctx = get_context().copy()
-    # 动态计算精度（二进制位数 = 十进制位数 * 3.321928 + 缓冲）
-    ctx.precision = int(digits * 3.321928 * 1.1)
-    gmpy2.set_context(ctx)
+def sqrt_task(key, file, digits, segment_size=DEFAULT_SEGMENT, engine="isqrt",
+              cache_dir=CACHE_DIR, cache_bytes=DEFAULT_MAX_BYTES):
+    """动态位数平方根计算（segment_size 为0时一次性生成整串）；旧的 keyN.bin 随之删除"""
+    discard_binary(file)
+    cache = KeyCache(cache_dir, cache_bytes) if cache_dir else None
+    if cache is not None and cache.fetch(key, KEY_SKIP, digits, file):
+        # 缓存命中：仅做摘要校验，无需重新计算
+        return
 
-    num = mpfr(str(key))
-    result = gmpy2.sqrt(num)
-    # 动态格式化字符串
-    full_str = format(result, f".{digits + 1000}f")  # 多生成1000位防止截断
-    #decimal_part = full_str.split('.')[1][:digits]  # 精确截取
-    decimal_string = full_str.split('.')[1]
-
-    # 确保有足够位数
-    if len(decimal_string) < 10 + digits:
-        # 处理不足情况
-        decimal_part = decimal_string[10:10 + digits].ljust(digits, '0')[:digits]
+    if cache is not None and segment_size and engine == "isqrt":
+        # 同一种子已有较短的密钥时，由缓存的根牛顿修正，只转换新增的尾部数字
+        write_key_digits(key, file, KEY_SKIP, digits, cache,
+                         RootCache(root_dir(cache_dir), cache_bytes), segment_size)
+    elif segment_size:
+        # 流式模式：精确计算数字窗口后按段转换写入，内存峰值由段长决定
+        write_sqrt_digits(key, file, KEY_SKIP, digits, segment_size, engine)
     else:
-        decimal_part = decimal_string[10:10 + digits]
-    asyncio.run(async_write(file, decimal_part))
+        asyncio.run(async_write(file, sqrt_digits(key, KEY_SKIP, digits, engine)))
+
+    if cache is not None:
+        cache.put(key, KEY_SKIP, digits, file)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="平方根密钥生成")
+    parser.add_argument("--segment", type=int, default=DEFAULT_SEGMENT,
+                        help="流式写入的段长（位），0 表示一次性生成整串")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="isqrt",
+                        help="平方根引擎：isqrt 精确整数平方根，mpfr 为旧路径")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="密钥缓存目录，空字符串表示不使用缓存")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help="缓存总大小上限（MB），超出按LRU淘汰")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="工作进程数，0 表示使用全部CPU核心")
+    parser.add_argument("--split-digits", type=int, default=0,
+                        help="超过该位数的密钥拆分为多块并行做十进制转换，0 表示不拆分")
+    parser.add_argument("--binary", action="store_true",
+                        help="同时生成二进制密钥文件 keyN.bin（每两位一字节，可 mmap 直接加载）")
+    parser.add_argument("--generation", help="使用密钥清单中的指定一代（默认最新一代）")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
+
     start_time = time.time()
     print("开始读取密钥...")
-    _,keys,digits_list,_=read_pswd("pswd.txt")
+    _,keys,digits_list,_=load_generation(args.generation, require=('keys', 'digits'))
 
     print("正在创建进程池...")
-    processes = [
-        Process(target=sqrt_task,
-                args=(key, f"./de/keys/key{i}.txt", digits))
-        for i, (key, digits) in enumerate(zip(keys, digits_list))
-    ]
+    jobs = plan_jobs(keys, digits_list, "./de/keys/key{i}.txt")
+    options = default_options(args.segment, args.engine, args.cache_dir, args.cache_size << 20,
+                              args.binary)
+
+    # 执行并计时（按位数从大到小调度）
     print("开始计算平方根...")
     process_start = time.time()
-    for p in processes:
-        p.start()
-    for p in tqdm(processes, desc="计算进度", unit="进程"):
-        p.join()
+    with tqdm(total=len(jobs), desc="计算进度", unit="个") as bar:
+        reports = run_sqrt_jobs(sqrt_task, jobs, args.workers or None, args.split_digits,
+                                options, progress=bar.update)
     total_digits = sum(digits_list)
     total_time = time.time() - start_time
     process_time = time.time() - process_start
@@ -64,8 +87,12 @@ if __name__ == "__main__":
     print("\n=== 生成完成 ===")
     print(f"总耗时: {total_time:.2f}秒")
     print(f"计算耗时: {process_time:.2f}秒")
-    print(f"总生成位数: {total_digits:,} (平均 {total_digits / 10 / 1e6:.2f}百万/文件)")
-    print(f"平均速度: {total_digits / process_time / 1e6:.2f}百万位/秒")
+    print(f"总生成位数: {total_digits:,} (平均 {total_digits / max(len(digits_list), 1) / 1e6:.2f}百万/文件)")
+    print(format_speed(total_digits, process_time))
+    print("\n=== 任务统计 ===")
+    print(format_reports(reports))
+    if tracing.trace_path():
+        print(f"阶段跟踪已追加至: {tracing.trace_path()}（用 python de/src/tracing.py 汇总）")
     print("\n=== 详细信息 ===")
     print("位数列表:", digits_list)
     print("密钥列表:", keys)
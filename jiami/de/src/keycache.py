@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import gmpy2
+
+# 缓存目录（相对项目根目录，加密端与解密端共用）
+CACHE_DIR = './cache/keys'
+# 整数平方根缓存目录（与 CACHE_DIR 同级）
+ROOT_DIR = './cache/roots'
+# 密钥文件格式版本，格式变化时递增使旧缓存失效
+FORMAT_VERSION = 1
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+def file_digest(filename, block_size=1 << 20, size=None):
+    """计算文件（或其前 size 字节）的 SHA-256 摘要"""
+    h = hashlib.sha256()
+    remaining = size
+    with open(filename, 'rb') as f:
+        while remaining is None or remaining > 0:
+            block = f.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            h.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return h.hexdigest()
+
+
+def root_dir(cache_dir):
+    """与密钥缓存目录同级的平方根缓存目录"""
+    return os.path.join(os.path.dirname(os.path.normpath(cache_dir)), 'roots')
+
+
+class KeyCache:
+    """按 (种子, 偏移, 位数, 格式版本) 寻址的本地密钥缓存，按总大小做LRU淘汰"""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def entry_id(seed, skip, count):
+        raw = f"{FORMAT_VERSION}:{seed}:{skip}:{count}"
+        return hashlib.sha256(raw.encode('ascii')).hexdigest()[:32]
+
+    def _paths(self, entry):
+        base = os.path.join(self.root, entry)
+        return base + '.txt', base + '.json'
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path, meta):
+        tmp = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def lookup(self, seed, skip, count):
+        """返回缓存条目的元数据，未命中返回 None"""
+        data_path, meta_path = self._paths(self.entry_id(seed, skip, count))
+        meta = self._read_meta(meta_path)
+        if meta is None or not os.path.exists(data_path):
+            return None
+        return meta
+
+    def fetch(self, seed, skip, count, dest):
+        """命中时保证 dest 与缓存内容一致（仅做摘要校验或复制），返回是否命中"""
+        entry = self.entry_id(seed, skip, count)
+        data_path, meta_path = self._paths(entry)
+        meta = self.lookup(seed, skip, count)
+        if meta is None:
+            return False
+
+        if not (os.path.exists(dest) and os.path.getsize(dest) == meta['size']
+                and file_digest(dest) == meta['digest']):
+            if file_digest(data_path) != meta['digest']:
+                # 缓存文件损坏，丢弃该条目
+                self._remove(entry)
+                return False
+            tmp = f"{dest}.{os.getpid()}.tmp"
+            shutil.copyfile(data_path, tmp)
+            os.replace(tmp, dest)
+
+        meta['last_used'] = time.time()
+        self._write_meta(meta_path, meta)
+        return True
+
+    def put(self, seed, skip, count, src):
+        """将已生成的密钥文件存入缓存"""
+        entry = self.entry_id(seed, skip, count)
+        data_path, meta_path = self._paths(entry)
+        size = os.path.getsize(src)
+        if size > self.max_bytes:
+            return None
+
+        tmp = f"{data_path}.{os.getpid()}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, data_path)
+        meta = {
+            'version': FORMAT_VERSION,
+            'seed': str(seed),
+            'skip': skip,
+            'count': count,
+            'size': size,
+            'digest': file_digest(data_path),
+            'last_used': time.time(),
+        }
+        self._write_meta(meta_path, meta)
+        self.evict(keep=entry)
+        return meta['digest']
+
+    def entries(self):
+        """列出全部条目 (entry, meta)"""
+        result = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            entry = name[:-5]
+            meta = self._read_meta(os.path.join(self.root, name))
+            if meta is not None:
+                result.append((entry, meta))
+        return result
+
+    def _remove(self, entry):
+        for path in self._paths(entry):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self, keep=None):
+        """总大小超过上限时按最近使用时间淘汰"""
+        items = sorted(self.entries(), key=lambda x: x[1]['last_used'])
+        total = sum(meta['size'] for _, meta in items)
+        for entry, meta in items:
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            self._remove(entry)
+            total -= meta['size']
+        return total
+
+
+class RootCache(KeyCache):
+    """按种子保存算过的最高精度整数平方根及其余数（gmpy2 二进制格式），更长的密钥在其基础上修正"""
+
+    def __init__(self, root=ROOT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(root, max_bytes)
+
+    @staticmethod
+    def root_id(seed):
+        raw = f"root:{seed}"
+        return hashlib.sha256(raw.encode('ascii')).hexdigest()[:32]
+
+    def _paths(self, entry):
+        base = os.path.join(self.root, entry)
+        return base + '.bin', base + '.json'
+
+    def load(self, seed):
+        """返回 (精度, 根, 余数)：根为 isqrt(seed * 10^(2*精度))；未命中或校验失败返回 None"""
+        entry = self.root_id(seed)
+        data_path, meta_path = self._paths(entry)
+        meta = self._read_meta(meta_path)
+        if meta is None or not os.path.exists(data_path):
+            return None
+        with open(data_path, 'rb') as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != meta['digest']:
+            self._remove(entry)
+            return None
+        meta['last_used'] = time.time()
+        self._write_meta(meta_path, meta)
+        split = meta['root_size']
+        return meta['precision'], gmpy2.from_binary(data[:split]), gmpy2.from_binary(data[split:])
+
+    def store(self, seed, precision, root, rem):
+        """只保留每个种子精度最高的根"""
+        entry = self.root_id(seed)
+        data_path, meta_path = self._paths(entry)
+        meta = self._read_meta(meta_path)
+        if meta is not None and meta['precision'] >= precision and os.path.exists(data_path):
+            return False
+        root_data = gmpy2.to_binary(root)
+        data = root_data + gmpy2.to_binary(rem)
+        if len(data) > self.max_bytes:
+            return False
+
+        tmp = f"{data_path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, data_path)
+        self._write_meta(meta_path, {
+            'seed': str(seed),
+            'precision': precision,
+            'root_size': len(root_data),
+            'size': len(data),
+            'digest': hashlib.sha256(data).hexdigest(),
+            'last_used': time.time(),
+        })
+        self.evict(keep=entry)
+        return True
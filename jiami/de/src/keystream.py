@@ -0,0 +1,295 @@
+import bisect
+import mmap
+import os
+import threading
+import numpy as np
+from keyfile import HEADER_SIZE, binary_path, check_binary, load_binary_key, read_header
+
+# jiami.c/jiemi.c 只读取 key.txt 的前 99 个字节作为调度序列
+SCHEDULE_BYTES = 99
+# 检查文本密钥是否全为数字、以及 iter_chunks 默认的块大小（位）
+BLOCK_DIGITS = 1 << 22
+_NON_DIGITS = bytes(c for c in range(256) if not ord('0') <= c <= ord('9'))
+
+
+def read_key_indices(keys_dir):
+    """读取 key.txt 调度序列（与 C 端 init_key_stream 一致）"""
+    try:
+        with open(os.path.join(keys_dir, 'key.txt'), 'rb') as f:
+            head = f.read(SCHEDULE_BYTES)
+    except FileNotFoundError:
+        return [0]
+    indices = [c - ord('0') for c in head if ord('0') <= c <= ord('9')]
+    return indices or [0]
+
+
+def map_file(filename):
+    """只读 mmap 整个文件，返回 uint8 视图（空文件返回空数组）；映射随视图存活，不复制数据"""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return np.empty(0, dtype=np.uint8)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return np.frombuffer(mapped, dtype=np.uint8)
+
+
+def digit_view(raw, block_digits=BLOCK_DIGITS):
+    """
+    文本字节 -> 数字字符视图：去掉末尾的换行等字符后全为数字时直接返回原视图的切片（零复制），
+    中间夹有非数字字符时才过滤出一份只读副本（与 C 端 isdigit 过滤一致）。
+    """
+    end = len(raw)
+    while end and not ord('0') <= raw[end - 1] <= ord('9'):
+        end -= 1
+    view = raw[:end]
+    for pos in range(0, end, block_digits):
+        block = view[pos:pos + block_digits]
+        if np.count_nonzero((block < ord('0')) | (block > ord('9'))):
+            digits = view[(view >= ord('0')) & (view <= ord('9'))]
+            digits.flags.writeable = False
+            return digits
+    return view
+
+
+def digits_to_values(digits):
+    """数字字符 -> 两位数值数组（奇数位补0）"""
+    if len(digits) % 2:
+        digits = np.append(digits, np.uint8(ord('0')))
+    return (digits[0::2] - ord('0')) * 10 + (digits[1::2] - ord('0'))
+
+
+class KeyFile:
+    """
+    mmap 打开一次的密钥文件。digits 为 ASCII 数字的只读视图（文本格式），
+    values 为两位数值的只读视图（二进制格式）；缺少的一种按需由另一种分段换算，
+    均可按位偏移切片或分块迭代，不整体复制文件。
+    二进制格式只在校验通过且与文本密钥（及给出的种子）一致时使用，否则回退到文本。
+    """
+
+    def __init__(self, text_file, verify=True, seed=None):
+        self.text_file = text_file
+        self.bin_file = binary_path(text_file)
+        self._digits = None
+        self._values = None
+        if os.path.exists(self.bin_file):
+            try:
+                header, self._values = load_binary_key(self.bin_file, verify, text_file, seed)
+                self.digit_count = header['digit_count']
+            except ValueError:
+                self._values = None
+        if self._values is None:
+            self._digits = digit_view(map_file(text_file))
+            self.digit_count = len(self._digits)
+        self.pair_count = (self.digit_count + 1) // 2
+
+    def __len__(self):
+        return self.digit_count
+
+    def __getitem__(self, item):
+        """按位偏移切片，返回 ASCII 数字"""
+        if not isinstance(item, slice) or item.step not in (None, 1):
+            raise TypeError("密钥只支持步长为1的切片")
+        start, stop, _ = item.indices(self.digit_count)
+        return self.digits(start, stop)
+
+    def digits(self, start=0, stop=None):
+        """第 start 至 stop 位的 ASCII 数字（文本格式为零复制视图）"""
+        stop = self.digit_count if stop is None else min(stop, self.digit_count)
+        if self._digits is not None:
+            return self._digits[start:stop]
+        values = self._values[start // 2:(stop + 1) // 2]
+        out = np.empty(len(values) * 2, dtype=np.uint8)
+        out[0::2] = values // 10
+        out[1::2] = values % 10
+        out += ord('0')
+        return out[start % 2:start % 2 + max(stop - start, 0)]
+
+    def values(self, start=0, stop=None):
+        """第 start 至 stop 个两位数值（二进制格式为零复制视图）"""
+        stop = self.pair_count if stop is None else min(stop, self.pair_count)
+        if self._values is not None:
+            return self._values[start:stop]
+        return digits_to_values(self._digits[2 * start:2 * stop])
+
+    def iter_chunks(self, chunk_digits=BLOCK_DIGITS, start=0, stop=None):
+        """按 chunk_digits 位一块依次给出 ASCII 数字"""
+        stop = self.digit_count if stop is None else min(stop, self.digit_count)
+        for pos in range(start, stop, chunk_digits):
+            yield self.digits(pos, min(pos + chunk_digits, stop))
+
+    def resident_bytes(self):
+        """映射与副本的总字节数（页面由操作系统按需换入，与其他进程共享）"""
+        return sum(a.nbytes for a in (self._digits, self._values) if a is not None)
+
+
+def open_key(keys_dir, key_index, verify=True, seed=None):
+    """打开 keyN（优先二进制格式），两种格式都不存在时返回 None"""
+    text_file = os.path.join(keys_dir, f'key{key_index}.txt')
+    try:
+        return KeyFile(text_file, verify, seed)
+    except FileNotFoundError:
+        return None
+
+
+def load_key_values(keys_dir, key_index):
+    """keyN 的全部密钥值：二进制格式为 mmap 视图，文本格式换算为数组，失败返回 None"""
+    key = open_key(keys_dir, key_index)
+    return None if key is None else key.values()
+
+
+def key_pair_count(keys_dir, key_index, block_size=1 << 22):
+    """keyN 提供的密钥值个数（不解析内容：二进制读文件头，文本只统计数字字符）"""
+    text_file = os.path.join(keys_dir, f'key{key_index}.txt')
+    bin_file = binary_path(text_file)
+    if os.path.exists(bin_file):
+        try:
+            with open(bin_file, 'rb') as f:
+                header = read_header(f.read(HEADER_SIZE))
+            check_binary(header, bin_file, text_file)
+            return header['pairs']
+        except ValueError:
+            pass
+    try:
+        digits = 0
+        with open(text_file, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                digits += len(block.translate(None, _NON_DIGITS))
+        return (digits + 1) // 2
+    except FileNotFoundError:
+        return 0
+
+
+def consuming_table(tables, decrypt=False):
+    """256 项布尔表：该字节是否消耗一个密钥值（替换后落在 [min_ord, max_ord] 内）"""
+    codes = np.arange(256, dtype=np.uint8)
+    if not decrypt:
+        codes = np.frombuffer(tables['forward'], dtype=np.uint8)
+    return (codes >= tables['min_ord']) & (codes <= tables['max_ord'])
+
+
+def count_consuming(data, consuming):
+    """统计一段数据消耗的密钥值个数"""
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    return int(counts[consuming].sum())
+
+
+class KeyStore:
+    """
+    每个密钥文件只 mmap 一次、由密钥流、随机性检验与统计共用的存储，并统计加载与命中次数。
+    文件页面由操作系统按需换入和回收，常驻内存接近密钥文件本身的大小；可在多个线程间共享。
+    """
+
+    def __init__(self, keys_dir, verify=True, seeds=None):
+        self.keys_dir = keys_dir
+        self.verify = verify
+        # 密钥清单中各 keyN 的种子，用于拒绝种子不符的二进制密钥
+        self.seeds = seeds or []
+        self.entries = {}
+        self.loads = 0
+        self.hits = 0
+        self.lock = threading.Lock()
+
+    def get(self, key_index):
+        """keyN 的 KeyFile，文件不存在时返回 None（同样缓存，调度序列中缺失的文件不会反复打开）"""
+        with self.lock:
+            if key_index in self.entries:
+                self.hits += 1
+                return self.entries[key_index]
+            self.loads += 1
+            seed = self.seeds[key_index] if key_index < len(self.seeds) else None
+            key = self.entries[key_index] = open_key(self.keys_dir, key_index, self.verify, seed)
+            return key
+
+    def resident_bytes(self):
+        return sum(key.resident_bytes() for key in self.entries.values() if key is not None)
+
+    def stats(self):
+        return f"Key store: {self.loads} loads, {self.hits} hits"
+
+
+class KeyStreamIndex:
+    """
+    调度序列上各密钥文件值个数的前缀和，支持 O(log n) 由密钥流偏移直接定位
+    (调度槽, 密钥文件, 值偏移)，为随机访问解密和分块并行提供基础。
+    """
+
+    def __init__(self, keys_dir, indices=None):
+        self.keys_dir = keys_dir
+        self.indices = indices if indices is not None else read_key_indices(keys_dir)
+        counts = {}
+        self.lengths = []
+        for key_index in self.indices:
+            if key_index not in counts:
+                counts[key_index] = key_pair_count(keys_dir, key_index)
+            self.lengths.append(counts[key_index])
+        self.prefix = [0]
+        for length in self.lengths:
+            self.prefix.append(self.prefix[-1] + length)
+        self.period = self.prefix[-1]
+        if self.period == 0:
+            raise FileNotFoundError(f"{keys_dir} 中没有可用的密钥文件")
+
+    def locate(self, key_offset):
+        """密钥流第 key_offset 个值 -> (调度槽, 密钥文件序号, 文件内值偏移)"""
+        r = key_offset % self.period
+        slot = bisect.bisect_right(self.prefix, r) - 1
+        return slot, self.indices[slot], r - self.prefix[slot]
+
+    def key_offset(self, data, consuming):
+        """明文/密文前缀 data 对应的密钥流偏移（范围外字符不消耗密钥）"""
+        return count_consuming(data, consuming)
+
+    def stream_at(self, key_offset, store=None):
+        """返回定位到 key_offset 的 KeyStream"""
+        slot, _, pair_offset = self.locate(key_offset)
+        stream = KeyStream(self.keys_dir, self.indices, store)
+        stream.seek(slot, pair_offset)
+        return stream
+
+
+class KeyStream:
+    """与 C 端 KeyStreamState 语义一致的密钥流，可一次取出一整段密钥值"""
+
+    def __init__(self, keys_dir, indices=None, store=None):
+        self.keys_dir = keys_dir
+        self.indices = indices if indices is not None else read_key_indices(keys_dir)
+        self.store = store if store is not None else KeyStore(keys_dir)
+        self.slot = 0
+        self.key = None
+        self.length = 0
+        self.ptr = 0
+
+    def _load_next(self):
+        for _ in range(len(self.indices)):
+            key_index = self.indices[self.slot]
+            self.slot = (self.slot + 1) % len(self.indices)
+            key = self.store.get(key_index)
+            if key is not None and key.pair_count > 0:
+                self.key = key
+                self.length = key.pair_count
+                self.ptr = 0
+                return
+        raise FileNotFoundError(f"{self.keys_dir} 中没有可用的密钥文件")
+
+    def seek(self, slot, pair_offset):
+        """跳到调度槽 slot 对应密钥文件的第 pair_offset 个值"""
+        self.slot = slot
+        self._load_next()
+        if self.slot != (slot + 1) % len(self.indices):
+            raise ValueError(f"调度槽 {slot} 的密钥文件不可用")
+        self.ptr = pair_offset
+
+    def take(self, n):
+        """取出接下来的 n 个密钥值（uint8 数组）"""
+        out = np.empty(n, dtype=np.uint8)
+        filled = 0
+        while filled < n:
+            if self.ptr >= self.length:
+                self._load_next()
+            step = min(n - filled, self.length - self.ptr)
+            out[filled:filled + step] = self.key.values(self.ptr, self.ptr + step)
+            self.ptr += step
+            filled += step
+        return out
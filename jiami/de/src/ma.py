@@ -1,10 +1,11 @@
-import gmpy2
-from gmpy2 import mpfr, get_context
-import secrets
+import argparse
 import os
 import time
 from tqdm import tqdm
-from readkey import read_pswd
+from sqrtkey import substitution_pool
+from cipher import compile_tables
+from manifest import load_generation, load_rotations
+import tracing
 
 
 def generate_ascii_charset(filename):
@@ -16,48 +17,40 @@ def generate_ascii_charset(filename):
     return ''.join(ascii_chars)
 
 
-def create_substitution_table(original, key_file='pswd.txt'):
+def create_substitution_table(original, gen_id=None):
+    """由密钥清单中的一代（默认最新）的种子重建替换表"""
     if ' ' not in original:
         raise ValueError("字符集缺少空格字符")
     if len(original) != 95:
         missing = set(chr(i) for i in range(32, 127)) - set(original)
         raise ValueError(f"缺失字符: {''.join(sorted(missing))}")
-    print("正在初始化加密上下文...")
-    ctx = get_context()
-    original_precision = ctx.precision
-    ctx.precision = 300
+    rand_num,_,_,_= load_generation(gen_id, require=('seed',))
 
-    try:
-        rand_num,_,_,_= read_pswd('pswd.txt')
+    return shuffle_charset(original, rand_num)
 
-        # 计算平方根
-        print("正在计算平方根...")
-        num = mpfr(rand_num)
-        sqrt_num = gmpy2.sqrt(num)
-        sqrt_str = format(sqrt_num, ".500f").split('.')[1]
 
-        # 生成索引池
-        print("正在生成索引池...")
-        num_pool = [int(sqrt_str[i:i + 3]) for i in range(0, 450, 3)]
+def shuffle_charset(original, rand_num, quiet=False):
+    """以种子 rand_num 的平方根数字为索引池做 Fisher-Yates 洗牌（与加密端 massage.py 相同）"""
+    with tracing.span('substitution.table', chars=len(original)):
+        # 生成索引池（整数平方根精确取前450位，字符集更大时按需加长）
+        if not quiet:
+            print("正在生成索引池...")
+        num_pool = substitution_pool(rand_num, max(150, len(original)))
 
         # Fisher-Yates洗牌算法
-        print("正在执行Fisher-Yates洗牌算法...")
+        if not quiet:
+            print("正在执行Fisher-Yates洗牌算法...")
         chars = list(original)
-        for i in tqdm(range(len(chars) - 1, 0, -1), desc="洗牌进度", unit="步"):
-            if not num_pool:
-                new_rand = secrets.randbelow(10 ** 8)
-                new_sqrt = gmpy2.sqrt(mpfr(new_rand))
-                sqrt_str = format(new_sqrt, ".500f").split('.')[1]
-                num_pool = [int(sqrt_str[i:i + 3]) for i in range(0, 450, 3)]
-                with open(key_file, 'ab') as f:
-                    f.write(new_rand.to_bytes(4, 'big'))
-
+        for i in tqdm(range(len(chars) - 1, 0, -1), desc="洗牌进度", unit="步", disable=quiet):
             idx = num_pool.pop() % (i + 1)
             chars[i], chars[idx] = chars[idx], chars[i]
 
-        return ''.join(chars)
-    finally:
-        ctx.precision = original_precision
+    return ''.join(chars)
+
+
+def rotation_substitutions(original, seeds):
+    """按轮换计划批量生成替换串（每个种子一张）"""
+    return [shuffle_charset(original, seed, quiet=True) for seed in tqdm(seeds, desc="轮换表", unit="张")]
 
 
 def verify_substitution(original, substitution):
@@ -69,6 +62,10 @@ def verify_substitution(original, substitution):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="由密钥清单重建替换表，并编译为 tables.bin")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
     start_time = time.time()
 
     char_file = './de/char/char.txt'
@@ -95,6 +92,11 @@ if __name__ == "__main__":
         f.write(substitution)
     print("替换表已保存至 substitution.txt")
 
+    # 编译正向/逆向查找表（含密钥清单中记录的轮换表）
+    rotations = rotation_substitutions(original, load_rotations())
+    tables = compile_tables('./de/char', [substitution] + rotations)
+    print(f"编译后的替换表已保存至 tables.bin（共 {len(tables)} 张）")
+
     # 验证结果
     print("\n正在验证替换表...")
     verify_substitution(original, substitution)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import time
+from keycache import file_digest
+import tracing
+
+# 流水线状态文件：记录每个阶段输入的摘要与输出文件的摘要
+STATE_DIR = './cache/pipeline'
+
+
+class Stage:
+    """
+    流水线中的一个阶段。
+    inputs(ctx) 返回 {'params': 可 JSON 序列化的参数, 'files': [输入文件]}；
+    outputs(ctx) 返回该阶段写出的文件；run(ctx) 执行阶段并把结果放入 ctx；
+    load(ctx) 在阶段被跳过时从已有输出恢复 ctx 中的结果（可省略）。
+    """
+
+    def __init__(self, name, run, inputs, outputs, deps=(), load=None):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.deps = tuple(deps)
+        self.load = load
+
+
+class FileDigests:
+    """按 (大小, 修改时间) 记住文件摘要，未改动的文件不重复计算"""
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def digest(self, path):
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        entry = self.known.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        digest = file_digest(path)
+        self.known[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+
+def topological_order(stages):
+    """按依赖关系排序，检测未知依赖与环"""
+    by_name = {stage.name: stage for stage in stages}
+    order, visiting, done = [], set(), set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"流水线存在循环依赖: {stage.name}")
+        visiting.add(stage.name)
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"阶段 {stage.name} 依赖未知阶段 {dep}")
+            visit(by_name[dep])
+        visiting.discard(stage.name)
+        done.add(stage.name)
+        order.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return order
+
+
+def input_digest(stage, ctx, digests):
+    """阶段输入摘要：参数的 JSON 与各输入文件摘要共同决定"""
+    spec = stage.inputs(ctx)
+    h = hashlib.sha256()
+    h.update(json.dumps(spec.get('params'), sort_keys=True, default=str).encode('utf-8'))
+    for path in spec.get('files', []):
+        h.update(os.path.abspath(path).encode('utf-8'))
+        h.update((digests.digest(path) or 'missing').encode('ascii'))
+    return h.hexdigest()
+
+
+def load_state(state_file):
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'stages': {}, 'files': {}}
+
+
+def save_state(state_file, state):
+    os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+    tmp = f"{state_file}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, state_file)
+
+
+def is_current(record, digest, outputs, digests):
+    """输入摘要未变，且全部输出文件仍与上次写出时一致"""
+    if not record or record.get('input') != digest:
+        return False
+    recorded = record.get('outputs', {})
+    return all(path in recorded and digests.digest(path) == recorded[path] for path in outputs)
+
+
+def run_pipeline(stages, state_file, ctx=None, force=(), log=print):
+    """
+    在当前进程内按依赖顺序执行各阶段，输入未变且输出完好的阶段直接跳过。
+    force 中的阶段名（或 'all'）强制重新执行。返回 (ctx, [(阶段名, 状态, 耗时)])。
+    """
+    ctx = ctx if ctx is not None else {}
+    state = load_state(state_file)
+    digests = FileDigests(state.get('files'))
+    summary = []
+
+    for stage in topological_order(stages):
+        start = time.perf_counter()
+        digest = input_digest(stage, ctx, digests)
+        outputs = [os.path.abspath(p) for p in stage.outputs(ctx)]
+        record = state['stages'].get(stage.name)
+        forced = 'all' in force or stage.name in force
+
+        with tracing.span(f'pipeline.{stage.name}') as span:
+            if not forced and is_current(record, digest, outputs, digests):
+                if stage.load is not None:
+                    stage.load(ctx)
+                status = '跳过'
+            else:
+                stage.run(ctx)
+                # 运行后重新计算输入摘要与输出列表：阶段可能在运行中确定了自己的参数
+                digest = input_digest(stage, ctx, digests)
+                outputs = [os.path.abspath(p) for p in stage.outputs(ctx)]
+                state['stages'][stage.name] = {
+                    'input': digest,
+                    'outputs': {path: digests.digest(path) for path in outputs},
+                    'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                }
+                status = '执行'
+            span.set(status='skipped' if status == '跳过' else 'ran')
+
+        elapsed = time.perf_counter() - start
+        summary.append((stage.name, status, elapsed))
+        if log:
+            log(f"[{status}] {stage.name} ({elapsed:.2f}s)")
+        state['files'] = digests.known
+        save_state(state_file, state)
+
+    return ctx, summary
+
+
+def format_summary(summary):
+    # 中文按两列宽对齐
+    lines = [f"{'阶段':<16}{'状态':<6}{'耗时(秒)':>7}"]
+    for name, status, elapsed in summary:
+        lines.append(f"{name:<18}{status:<6}{elapsed:>10.2f}")
+    return "\n".join(lines)
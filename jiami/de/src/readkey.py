@@ -47,6 +47,12 @@ def read_pswd(filename):
         final_number = all_numbers[-1]
 
     return header_num, key_numbers, lambda_numbers, final_number
+
+
+def format_pswd(header_num, key_numbers, lambda_numbers, final_number):
+    """按 massage.py / key.py / sort.py 依次写入的格式生成 pswd.txt 内容"""
+    lines = "\n".join(f"Key{i}: {k} -> {d}位" for i, (k, d) in enumerate(zip(key_numbers, lambda_numbers)))
+    return f"{header_num}{lines}{final_number}\n"
 if __name__ == "__main__":
     try:
         h, keys, lams, final = read_pswd('D:/min project/jiami/pswd.txt')
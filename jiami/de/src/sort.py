@@ -1,41 +1,38 @@
-import gmpy2
-from gmpy2 import mpfr, get_context
+import argparse
 import os
-from readkey import read_pswd
+from sqrtkey import sqrt_digits
+from keycache import KeyCache
+import tracing
+from manifest import load_generation
 
 
 
 
-def generate_and_save_index(filename, num, digits=10000):
+def generate_and_save_index(filename, num, digits=10000, cache=None):
     """生成并保存一万位数到key.txt作为索引"""
-    # 生成一个随机数
-    random_num = num
+    if cache is not None and cache.fetch(num, 0, digits, filename):
+        return
 
-    # 计算平方根
-    ctx = get_context()
-    original_precision = ctx.precision
-    try:
-        ctx.precision = int(digits * 3.3219280948) + 1000
-        num = mpfr(str(random_num))
-        sqrt_num = gmpy2.sqrt(num)
-
-        # 格式化为十进制字符串
-        str_repr = format(sqrt_num, f".{digits + 100}f")
-        decimal_part = str_repr.split('.')[1][:digits].ljust(digits, '0')
+    with tracing.span('sort.index', digits=digits):
+        # 整数平方根精确计算小数部分前 digits 位
+        decimal_part = sqrt_digits(num, 0, digits)
 
         # 保存到key.txt
         with open(filename, 'w') as f:
             f.write(decimal_part)
 
-    finally:
-        ctx.precision = original_precision
+    if cache is not None:
+        cache.put(num, 0, digits, filename)
 
 
 if __name__ == "__main__":
-    _,_,_,secure_num =read_pswd("pswd.txt")
+    parser = argparse.ArgumentParser(description="由密钥清单中的索引种子重建 key.txt")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
+    _,_,_,secure_num =load_generation(require=('index',))
 
-    generate_and_save_index('./de/keys/key.txt', num=secure_num)
-    print(f"安全数已保存至 pswd.txt")
+    generate_and_save_index('./de/keys/key.txt', num=secure_num, cache=KeyCache())
     print(f"一万位索引已保存至 keys/key.txt")
 
     file_size = os.path.getsize('./de/keys/key.txt')
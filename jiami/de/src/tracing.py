@@ -0,0 +1,195 @@
+import contextlib
+import json
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
+
+# 设置该环境变量（JSON-lines 文件路径）即开启跟踪，子进程通过环境变量继承
+TRACE_ENV = 'JIAMI_TRACE'
+_stack = []
+
+
+def enable(path):
+    """开启跟踪并写入 path；之后创建的子进程同样会记录"""
+    if path:
+        os.environ[TRACE_ENV] = os.path.abspath(path)
+
+
+def trace_path():
+    return os.environ.get(TRACE_ENV) or None
+
+
+def _io_counters():
+    """本进程累计读写字节数（Linux /proc/self/io 的 rchar/wchar），不支持时返回 (None, None)"""
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _usage(who):
+    """(累计 CPU 秒, 峰值常驻内存 MB)，平台不支持时为 (None, None)"""
+    if resource is None:
+        return None, None
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024
+
+
+def _snapshot():
+    _, rss = _usage(resource.RUSAGE_SELF if resource else None)
+    child_cpu, child_rss = _usage(resource.RUSAGE_CHILDREN if resource else None)
+    read, written = _io_counters()
+    return {
+        'wall': time.perf_counter(),
+        'cpu': time.process_time(),
+        'child_cpu': child_cpu,
+        'peak_rss_mb': rss,
+        'child_peak_rss_mb': child_rss,
+        'read': read,
+        'written': written,
+    }
+
+
+def _delta(end, start, key):
+    if end[key] is None or start[key] is None:
+        return None
+    return end[key] - start[key]
+
+
+def emit(record, path=None):
+    """追加一条 JSON 记录（单次 O_APPEND 写入，多进程共享同一文件）"""
+    path = path or trace_path()
+    if not path:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+
+class Span:
+    """一个阶段的计时区间，attrs 中的附加字段（如 digits、file）随记录输出"""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    记录一个阶段：墙钟/CPU 时间、峰值常驻内存、读写字节数，以及期间回收的子进程的 CPU 与峰值内存。
+    未开启跟踪时只返回 Span，不做任何测量。
+    """
+    current = Span(name, attrs)
+    if not trace_path():
+        yield current
+        return
+
+    parent = _stack[-1] if _stack else None
+    _stack.append(name)
+    started = time.time()
+    start = _snapshot()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end = _snapshot()
+        _stack.pop()
+        record = {
+            'name': name,
+            'parent': parent,
+            'pid': os.getpid(),
+            'ppid': os.getppid(),
+            'start': started,
+            'wall': end['wall'] - start['wall'],
+            'cpu': end['cpu'] - start['cpu'],
+            'child_cpu': _delta(end, start, 'child_cpu'),
+            'peak_rss_mb': end['peak_rss_mb'],
+            'child_peak_rss_mb': end['child_peak_rss_mb'],
+            'bytes_read': _delta(end, start, 'read'),
+            'bytes_written': _delta(end, start, 'written'),
+        }
+        if error:
+            record['error'] = error
+        record.update(current.attrs)
+        emit(record)
+
+
+def load_trace(path):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def summarize(records):
+    """按阶段名汇总：次数、进程数、墙钟/CPU 合计、子进程 CPU、峰值内存、读写字节与位数"""
+    stages = {}
+    for r in records:
+        s = stages.setdefault(r['name'], {
+            'count': 0, 'pids': set(), 'wall': 0.0, 'max_wall': 0.0, 'cpu': 0.0, 'child_cpu': 0.0,
+            'peak_rss_mb': 0.0, 'bytes_read': 0, 'bytes_written': 0, 'digits': 0, 'bytes': 0,
+        })
+        s['count'] += 1
+        s['pids'].add(r['pid'])
+        s['wall'] += r['wall']
+        s['max_wall'] = max(s['max_wall'], r['wall'])
+        s['cpu'] += r['cpu']
+        s['child_cpu'] += r.get('child_cpu') or 0.0
+        s['peak_rss_mb'] = max(s['peak_rss_mb'], r.get('peak_rss_mb') or 0.0,
+                               r.get('child_peak_rss_mb') or 0.0)
+        for key in ('bytes_read', 'bytes_written', 'digits', 'bytes'):
+            s[key] += r.get(key) or 0
+    for s in stages.values():
+        s['processes'] = len(s.pop('pids'))
+    return stages
+
+
+def _cell(text, width, left=False):
+    """按显示宽度对齐（中文字符占两列）"""
+    text = str(text)
+    pad = ' ' * max(0, width - len(text) - sum(1 for c in text if ord(c) > 0x2e80))
+    return text + pad if left else pad + text
+
+
+SUMMARY_COLUMNS = [('阶段', 28), ('次数', 6), ('进程', 6), ('墙钟(秒)', 10), ('最长(秒)', 10),
+                   ('CPU(秒)', 10), ('子进程CPU', 11), ('峰值内存(MB)', 14), ('读(MB)', 10),
+                   ('写(MB)', 10), ('位数', 14)]
+
+
+def format_summary(stages):
+    """阶段汇总表，按墙钟合计从大到小排列"""
+    rows = [[title for title, _ in SUMMARY_COLUMNS]]
+    for name, s in sorted(stages.items(), key=lambda item: item[1]['wall'], reverse=True):
+        rows.append([name, s['count'], s['processes'], f"{s['wall']:.2f}", f"{s['max_wall']:.2f}",
+                     f"{s['cpu']:.2f}", f"{s['child_cpu']:.2f}", f"{s['peak_rss_mb']:.1f}",
+                     f"{s['bytes_read'] / 1e6:.1f}", f"{s['bytes_written'] / 1e6:.1f}", f"{s['digits']:,}"])
+    return "\n".join(
+        "".join(_cell(value, width, left=(i == 0)) for i, (value, (_, width)) in enumerate(zip(row, SUMMARY_COLUMNS)))
+        for row in rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="汇总 JSON-lines 跟踪文件")
+    parser.add_argument("trace", nargs="?", default=trace_path(), help=f"跟踪文件（默认取环境变量 {TRACE_ENV}）")
+    args = parser.parse_args()
+    if not args.trace:
+        parser.error("未指定跟踪文件")
+    print(format_summary(summarize(load_trace(args.trace))))
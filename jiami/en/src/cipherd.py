@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import socket
+import struct
+import sys
+import threading
+import time
+from cipher import decrypt_bytes, encrypt_bytes, load_tables, open_binary
+from keystream import KeyStore, KeyStreamIndex, consuming_table, count_consuming
+import tracing
+
+# 常驻加解密服务：替换表与密钥映射只加载一次，通过 UNIX 域套接字按帧收发消息。
+# 请求帧: op 1 字节 (E 加密 / D 解密 / S 统计) | 密钥流偏移 Q | 长度 I（小端） | 负载
+# 响应帧: 状态 1 字节 (K 成功 / ! 错误，负载为 UTF-8 错误信息) | 密钥流偏移 Q | 长度 I | 负载
+# 加密端维护一个密钥流游标，每条消息接续在前一条之后（起点随机），响应中返回该消息的起始偏移；
+# 解密请求带回这个偏移，解密端从同一位置开始
+SOCKET_PATH = './cache/cipherd.sock'
+FRAME_FORMAT = '<cQI'
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+OP_ENCRYPT, OP_DECRYPT, OP_STATS = b'E', b'D', b'S'
+STATUS_OK, STATUS_ERROR = b'K', b'!'
+# 单条消息的上限（字节）
+MAX_MESSAGE = 1 << 26
+# 超过该大小的消息交给线程池处理，避免阻塞事件循环
+INLINE_LIMIT = 1 << 16
+
+
+class CipherEngine:
+    """一个方向（加密或解密）的常驻状态：替换表、密钥流索引、KeyStore 与加密游标"""
+
+    def __init__(self, char_dir, keys_dir, decrypt=False, table=None):
+        self.decrypt = decrypt
+        self.func = decrypt_bytes if decrypt else encrypt_bytes
+        self.tables = load_tables(char_dir, table)
+        self.consuming = consuming_table(self.tables, decrypt)
+        self.index = KeyStreamIndex(keys_dir)
+        self.store = KeyStore(keys_dir)
+        # 预先映射调度序列中的全部密钥文件
+        for key_index in set(self.index.indices):
+            self.store.get(key_index)
+        self.cursor = secrets.randbelow(self.index.period)
+
+    def reserve(self, data):
+        """在 KeyStore 锁内为一条消息分配密钥流区间，返回起始偏移（各消息互不重叠）"""
+        used = count_consuming(data, self.consuming)
+        with self.store.lock:
+            offset = self.cursor
+            self.cursor = (self.cursor + used) % self.index.period
+        return offset
+
+    def transform(self, data, offset=0):
+        """返回 (起始偏移, 结果)：加密时偏移由游标分配，解密时使用请求给出的偏移"""
+        if not self.decrypt:
+            offset = self.reserve(data)
+        if not data:
+            return offset, data
+        return offset, self.func(data, self.tables, self.index.stream_at(offset, self.store))
+
+
+class CipherServer:
+    """asyncio 服务端：每个连接可连续发送多条请求，连接之间并发"""
+
+    def __init__(self, engines, path=SOCKET_PATH):
+        self.engines = engines
+        self.path = path
+        self.requests = 0
+        self.bytes = 0
+        self.clients = 0
+        self.started = time.time()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'bytes': self.bytes,
+            'clients': self.clients,
+            'uptime': time.time() - self.started,
+            'engines': {op.decode(): engine.store.stats() for op, engine in self.engines.items()},
+        }
+
+    async def handle(self, op, offset, payload):
+        """返回 (密钥流偏移, 响应负载)"""
+        if op == OP_STATS:
+            return 0, json.dumps(self.stats(), ensure_ascii=False).encode('utf-8')
+        engine = self.engines.get(op)
+        if engine is None:
+            raise ValueError(f"服务未加载该操作: {op!r}")
+        self.requests += 1
+        self.bytes += len(payload)
+        if len(payload) <= INLINE_LIMIT:
+            return engine.transform(payload, offset)
+        return await asyncio.get_running_loop().run_in_executor(None, engine.transform, payload, offset)
+
+    async def serve_client(self, reader, writer):
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    op, offset, length = struct.unpack(FRAME_FORMAT, await reader.readexactly(FRAME_SIZE))
+                except asyncio.IncompleteReadError:
+                    break
+                if length > MAX_MESSAGE:
+                    # 负载未读取，连接无法继续同步，报错后断开
+                    message = f"消息过大: {length} 字节（上限 {MAX_MESSAGE}）".encode('utf-8')
+                    writer.write(struct.pack(FRAME_FORMAT, STATUS_ERROR, 0, len(message)) + message)
+                    break
+                payload = await reader.readexactly(length)
+                try:
+                    status, (offset, result) = STATUS_OK, await self.handle(op, offset, payload)
+                except Exception as e:
+                    status, offset, result = STATUS_ERROR, 0, str(e).encode('utf-8')
+                writer.write(struct.pack(FRAME_FORMAT, status, offset, len(result)) + result)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        if os.path.exists(self.path):
+            if socket_alive(self.path):
+                raise RuntimeError(f"已有服务在 {self.path} 上运行")
+            # 上次异常退出留下的套接字文件
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # 绑定时即只允许本用户连接（事后 chmod 之前存在可被其他本地用户连接的窗口），
+        # 否则其他本地用户可把服务当作加解密预言机
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.serve_client, path=self.path)
+        finally:
+            os.umask(umask)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def socket_alive(path):
+    """套接字上是否有服务在应答"""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def load_engines(en_char='./en/char', en_keys='./en/keys', de_char='./de/char', de_keys='./de/keys',
+                 table=None, log=sys.stderr):
+    """加载两个方向的引擎；某一方向的字符集或密钥缺失时只提供另一方向"""
+    engines = {}
+    for op, char_dir, keys_dir, decrypt in ((OP_ENCRYPT, en_char, en_keys, False),
+                                            (OP_DECRYPT, de_char, de_keys, True)):
+        try:
+            with tracing.span('cipherd.load', char_dir=char_dir, keys_dir=keys_dir, decrypt=decrypt):
+                engines[op] = CipherEngine(char_dir, keys_dir, decrypt, table)
+        except (OSError, ValueError) as e:
+            print(f"未加载{'解密' if decrypt else '加密'}: {e}", file=log)
+    if not engines:
+        raise RuntimeError("加密与解密都无法加载")
+    return engines
+
+
+class CipherClient:
+    """同步客户端：一个连接上依次发送请求"""
+
+    def __init__(self, path=SOCKET_PATH, timeout=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recv_exact(self, n):
+        chunks = []
+        while n:
+            chunk = self.sock.recv(n)
+            if not chunk:
+                raise ConnectionError("服务端关闭了连接")
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b''.join(chunks)
+
+    def request(self, op, payload=b'', offset=0):
+        """发送一个请求，返回 (密钥流偏移, 响应负载)"""
+        self.sock.sendall(struct.pack(FRAME_FORMAT, op, offset, len(payload)) + payload)
+        status, offset, length = struct.unpack(FRAME_FORMAT, self._recv_exact(FRAME_SIZE))
+        result = self._recv_exact(length)
+        if status != STATUS_OK:
+            raise RuntimeError(result.decode('utf-8', 'replace'))
+        return offset, result
+
+    def encrypt(self, data):
+        """返回 (起始偏移, 密文)；解密时须带回该偏移"""
+        return self.request(OP_ENCRYPT, data)
+
+    def decrypt(self, data, offset):
+        return self.request(OP_DECRYPT, data, offset)[1]
+
+    def stats(self):
+        return json.loads(self.request(OP_STATS)[1])
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def benchmark(path=SOCKET_PATH, size=256, count=10000, clients=1, op=OP_ENCRYPT):
+    """clients 个连接各发送 count 条 size 字节的消息，返回 (逐条延迟秒数列表, 总耗时)"""
+    message = (bytes(range(32, 127)) * (size // 95 + 1))[:size]
+    latencies = [[] for _ in range(clients)]
+
+    def run(samples):
+        with CipherClient(path) as client:
+            for _ in range(count):
+                start = time.perf_counter()
+                client.request(op, message)
+                samples.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=run, args=(samples,)) for samples in latencies]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return sorted(t for samples in latencies for t in samples), elapsed
+
+
+def format_benchmark(latencies, elapsed, size):
+    if not latencies:
+        return "没有完成的请求"
+    us = [t * 1e6 for t in latencies]
+    return "\n".join([
+        f"消息: {len(us)} 条 x {size} 字节，耗时 {elapsed:.2f}s",
+        f"延迟(微秒): 平均 {sum(us) / len(us):.1f}  p50 {percentile(us, 0.5):.1f}  "
+        f"p99 {percentile(us, 0.99):.1f}  最大 {us[-1]:.1f}",
+        f"吞吐: {len(us) / max(elapsed, 1e-9):,.0f} 条/秒  {len(us) * size / max(elapsed, 1e-9) / 1e6:.2f} MB/s",
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻加解密服务（UNIX 域套接字）与客户端")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="套接字路径")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="启动服务")
+    serve.add_argument("--en-char-dir", default="./en/char")
+    serve.add_argument("--en-keys-dir", default="./en/keys")
+    serve.add_argument("--de-char-dir", default="./de/char")
+    serve.add_argument("--de-keys-dir", default="./de/keys")
+    serve.add_argument("--table", type=int,
+                       help="使用 tables.bin 中的第几张轮换表（默认取环境变量 SUBSTITUTION_TABLE，否则为 0）")
+    for name, text in (("encrypt", "加密"), ("decrypt", "解密")):
+        command = sub.add_parser(name, help=f"经服务{text}一个文件")
+        command.add_argument("input", nargs="?", default="-", help="输入文件，'-' 表示标准输入")
+        command.add_argument("output", nargs="?", default="-", help="输出文件，'-' 表示标准输出")
+    sub.choices["decrypt"].add_argument("--offset", type=int, required=True,
+                                        help="加密时服务返回的密钥流偏移")
+    sub.add_parser("stats", help="显示服务统计")
+    bench = sub.add_parser("bench", help="延迟与吞吐测试")
+    bench.add_argument("--size", type=int, default=256, help="每条消息的字节数")
+    bench.add_argument("--count", type=int, default=10000, help="每个连接发送的消息数")
+    bench.add_argument("--clients", type=int, default=1, help="并发连接数")
+    bench.add_argument("--op", choices=["encrypt", "decrypt"], default="encrypt")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
+
+    if args.command == "serve":
+        if not hasattr(socket, 'AF_UNIX'):
+            parser.error("当前平台不支持 UNIX 域套接字")
+        if os.path.exists(args.socket) and socket_alive(args.socket):
+            parser.error(f"已有服务在 {args.socket} 上运行")
+        engines = load_engines(args.en_char_dir, args.en_keys_dir, args.de_char_dir, args.de_keys_dir,
+                               args.table)
+        print(f"服务已启动: {args.socket}（{', '.join(op.decode() for op in engines)}）", file=sys.stderr)
+        try:
+            asyncio.run(CipherServer(engines, args.socket).run())
+        except KeyboardInterrupt:
+            pass
+    elif args.command in ("encrypt", "decrypt"):
+        with open_binary(args.input, 'rb') as fin:
+            data = fin.read()
+        with CipherClient(args.socket) as client:
+            if args.command == "encrypt":
+                offset, result = client.encrypt(data)
+                # 偏移写到标准错误，密文可以直接输出到标准输出
+                print(f"offset: {offset}", file=sys.stderr)
+            else:
+                result = client.decrypt(data, args.offset)
+        with open_binary(args.output, 'wb') as fout:
+            fout.write(result)
+    elif args.command == "stats":
+        with CipherClient(args.socket) as client:
+            print(json.dumps(client.stats(), ensure_ascii=False, indent=2))
+    elif args.command == "bench":
+        op = OP_ENCRYPT if args.op == "encrypt" else OP_DECRYPT
+        latencies, elapsed = benchmark(args.socket, args.size, args.count, args.clients, op)
+        print(format_benchmark(latencies, elapsed, args.size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import os
+import random
+import pytest
+
+# 测试用的最小密钥目录与字符集目录（与 key.py / massage.py 生成的格式相同）
+CHARSET = ''.join(chr(i) for i in range(32, 127))
+
+
+@pytest.fixture
+def keys_dir(tmp_path):
+    """两个奇数位长度的文本密钥，调度序列交替使用"""
+    rng = random.Random(20240601)
+    path = tmp_path / 'keys'
+    path.mkdir()
+    for i, digits in enumerate((4001, 2999)):
+        (path / f'key{i}.txt').write_text(''.join(rng.choice('0123456789') for _ in range(digits)))
+    (path / 'key.txt').write_text('0110')
+    return str(path)
+
+
+@pytest.fixture
+def char_dir(tmp_path):
+    rng = random.Random(7)
+    substitution = list(CHARSET)
+    rng.shuffle(substitution)
+    path = tmp_path / 'char'
+    path.mkdir()
+    (path / 'char.txt').write_text(CHARSET)
+    (path / 'substitution.txt').write_text(''.join(substitution))
+    return str(path)
+
+
+def write_plaintexts(directory, count, size, seed=0):
+    """生成 count 个可打印字符明文，返回路径列表"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'doc{i}.txt')
+        with open(path, 'w', encoding='ascii', newline='') as f:
+            f.write(''.join(rng.choice(CHARSET + '\n') for _ in range(size)))
+        paths.append(path)
+    return paths
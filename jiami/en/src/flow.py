@@ -0,0 +1,141 @@
+import argparse
+import os
+import secrets
+from cipher import BATCH_MANIFEST, compile_tables, encrypt_file, load_tables, save_batch_manifest
+from key import sqrt_task
+from keycache import KeyCache
+from keystream import KeyStore, KeyStreamIndex
+from manifest import GENERATION_ENV, PSWD_FILE, KeyManifest, load_generation, load_rotations
+from massage import generate_ascii_charset, rotation_substitutions, shuffle_charset
+from pipeline import STATE_DIR, Stage, format_summary, run_pipeline
+from pswd import generate_basic, generate_basic1
+from pswd import generate_secure as security
+from scheduler import default_options, plan_jobs, run_sqrt_jobs
+from sort import generate_and_save_index
+import tracing
+
+CHAR_DIR = './en/char'
+KEYS_DIR = './en/keys'
+
+
+def new_secrets(count, rotations=0):
+    """生成一代新的密钥材料（与 massage.py、key.py、sort.py 分别生成的内容相同）"""
+    return {
+        'seed': security(21),
+        'keys': [security(generate_basic1()) for _ in range(count)],
+        'digits': [generate_basic() for _ in range(count)],
+        'index': security(generate_basic1()),
+        'rotations': [security(21) for _ in range(rotations)],
+    }
+
+
+def load_secrets(gen_id=None):
+    seed, keys, digits, index = load_generation(gen_id, require=('seed', 'keys', 'digits', 'index'))
+    return {'seed': seed, 'keys': keys, 'digits': digits, 'index': index,
+            'rotations': load_rotations(gen_id)}
+
+
+def save_secrets(secrets, manifest=None):
+    """作为新的一代记入密钥清单，返回代 id"""
+    return (manifest or KeyManifest()).begin(**secrets)['id']
+
+
+def key_files(ctx):
+    return [os.path.join(KEYS_DIR, f'key{i}.txt') for i in range(len(ctx['secrets']['keys']))]
+
+
+def build_stages(src, dst, workers=None):
+    """
+    加密流程：替换表、平方根密钥、索引相互独立，全部完成后执行加密。
+    沿用同一代密钥时每次加密从随机的密钥流偏移开始，偏移写入输出目录的批量清单（同 jiami.py 批量模式）。
+    """
+    char_file = os.path.join(CHAR_DIR, 'char.txt')
+    sub_file = os.path.join(CHAR_DIR, 'substitution.txt')
+    table_file = os.path.join(CHAR_DIR, 'tables.bin')
+    index_file = os.path.join(KEYS_DIR, 'key.txt')
+    out_dir = os.path.dirname(dst) or '.'
+
+    def run_substitution(ctx):
+        if not os.path.exists(char_file):
+            generate_ascii_charset(char_file)
+        with open(char_file, 'rb') as f:
+            original = f.read().decode('utf-8').strip('\n')
+        substitution = shuffle_charset(original, ctx['secrets']['seed'])
+        with open(sub_file, 'w', encoding='utf-8') as f:
+            f.write(substitution)
+        # 编译 tables.bin（含轮换表），当前替换表直接在内存中交给后续阶段
+        rotations = rotation_substitutions(original, ctx['secrets']['rotations'])
+        ctx['tables'] = compile_tables(CHAR_DIR, [substitution] + rotations)[0]
+
+    def load_substitution(ctx):
+        ctx['tables'] = load_tables(CHAR_DIR, 0)
+
+    def run_keys(ctx):
+        jobs = plan_jobs(ctx['secrets']['keys'], ctx['secrets']['digits'],
+                         os.path.join(KEYS_DIR, 'key{i}.txt'))
+        run_sqrt_jobs(sqrt_task, jobs, workers, options=default_options())
+
+    def run_index(ctx):
+        generate_and_save_index(index_file, ctx['secrets']['index'], cache=KeyCache())
+
+    def run_cipher(ctx):
+        os.makedirs(out_dir, exist_ok=True)
+        store = ctx.setdefault('store', KeyStore(KEYS_DIR, seeds=ctx['secrets']['keys']))
+        index = KeyStreamIndex(KEYS_DIR)
+        offset = secrets.randbelow(index.period)
+        total = encrypt_file(src, dst, ctx['tables'], KEYS_DIR, stream=index.stream_at(offset, store))
+        save_batch_manifest(out_dir, index.period, {os.path.basename(dst): offset})
+        print(f"Encryption completed. Saved to {dst} ({total:,} bytes, keystream offset {offset})")
+
+    return [
+        Stage('substitution', run_substitution, load=load_substitution,
+              inputs=lambda ctx: {'params': {'seed': ctx['secrets']['seed'],
+                                             'rotations': ctx['secrets']['rotations']},
+                                  'files': [char_file]},
+              outputs=lambda ctx: [sub_file, table_file]),
+        Stage('keys', run_keys,
+              inputs=lambda ctx: {'params': {'keys': ctx['secrets']['keys'],
+                                             'digits': ctx['secrets']['digits']}},
+              outputs=key_files),
+        Stage('index', run_index,
+              inputs=lambda ctx: {'params': {'index': ctx['secrets']['index']}},
+              outputs=lambda ctx: [index_file]),
+        Stage('cipher', run_cipher, deps=('substitution', 'keys', 'index'),
+              inputs=lambda ctx: {'params': {'output': os.path.abspath(dst)},
+                                  'files': [src, char_file, sub_file, table_file, index_file] + key_files(ctx)},
+              outputs=lambda ctx: [dst, os.path.join(out_dir, BATCH_MANIFEST)]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="加密流程编排：在一个进程内按依赖执行，输入未变的阶段直接跳过")
+    parser.add_argument("input", nargs="?", default="./test/1.txt")
+    parser.add_argument("output", nargs="?", default="./result/en.txt")
+    parser.add_argument("--new-secrets", action="store_true",
+                        help="生成新一代密钥材料并记入密钥清单（默认沿用最新一代，清单为空时自动生成）")
+    parser.add_argument("--generation", help="使用密钥清单中的指定一代")
+    parser.add_argument("--count", type=int, default=10, help="新生成的密钥个数")
+    parser.add_argument("--rotations", type=int, default=0, help="新生成的轮换替换表数量")
+    parser.add_argument("--force", nargs="*", default=[], help="强制重新执行的阶段（all 表示全部）")
+    parser.add_argument("--workers", type=int, default=0, help="平方根工作进程数，0 表示全部核心")
+    parser.add_argument("--state", default=os.path.join(STATE_DIR, 'en.json'), help="流水线状态文件")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
+
+    # 只有清单与旧 pswd.txt 都不存在时才自动生成新的一代；清单损坏或缺字段直接报错
+    existing = (args.generation or os.environ.get(GENERATION_ENV) or KeyManifest().latest_id()
+                or os.path.exists(PSWD_FILE))
+    if args.new_secrets or not existing:
+        material = new_secrets(args.count, args.rotations)
+        print(f"已生成新的密钥材料，密钥代: {save_secrets(material)}")
+    else:
+        material = load_secrets(args.generation)
+
+    stages = build_stages(args.input, args.output, args.workers or None)
+    _, summary = run_pipeline(stages, args.state, {'secrets': material}, args.force)
+    print("\n" + format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
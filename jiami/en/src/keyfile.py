@@ -0,0 +1,191 @@
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+import numpy as np
+
+# 二进制密钥文件格式（与 jiami.c / jiemi.c 保持一致）
+# 文件头 64 字节，小端序:
+#   magic 4s | version H | header_size H | seed_hash 16s | digit_offset Q | digit_count Q | crc32 I
+# 之后每字节存放一个 00-99 的两位数值，位数为奇数时末尾补0（与文本格式读取规则相同）
+KEY_MAGIC = b'JKEY'
+KEY_VERSION = 1
+HEADER_SIZE = 64
+HEADER_FORMAT = '<4sHH16sQQI'
+CHUNK_DIGITS = 1 << 22  # 转换时每块处理的位数（偶数）
+
+
+def seed_hash(seed):
+    """种子的摘要（不在密钥文件中保存种子本身）"""
+    if seed is None:
+        return b'\0' * 16
+    return hashlib.sha256(str(seed).encode('ascii')).digest()[:16]
+
+
+def binary_path(text_file):
+    """key0.txt -> key0.bin"""
+    return os.path.splitext(text_file)[0] + '.bin'
+
+
+def pack_header(seed_digest, digit_offset, digit_count, checksum):
+    header = struct.pack(HEADER_FORMAT, KEY_MAGIC, KEY_VERSION, HEADER_SIZE,
+                         seed_digest, digit_offset, digit_count, checksum)
+    return header.ljust(HEADER_SIZE, b'\0')
+
+
+def read_header(buffer):
+    """解析文件头，返回字典"""
+    if len(buffer) < HEADER_SIZE:
+        raise ValueError("密钥文件头不完整")
+    magic, version, header_size, digest, offset, count, checksum = \
+        struct.unpack_from(HEADER_FORMAT, buffer)
+    if magic != KEY_MAGIC:
+        raise ValueError("不是二进制密钥文件")
+    if version != KEY_VERSION:
+        raise ValueError(f"不支持的密钥文件版本: {version}")
+    return {
+        'header_size': header_size,
+        'seed_hash': digest,
+        'digit_offset': offset,
+        'digit_count': count,
+        'pairs': (count + 1) // 2,
+        'checksum': checksum,
+    }
+
+
+def digits_to_pairs(digits):
+    """数字字符（bytes/uint8，长度为偶数）转为两位数值数组"""
+    arr = np.frombuffer(digits, dtype=np.uint8) - ord('0')
+    return arr[0::2] * 10 + arr[1::2]
+
+
+def pairs_to_digits(pairs):
+    """两位数值数组转回数字字符 bytes"""
+    out = np.empty(len(pairs) * 2, dtype=np.uint8)
+    out[0::2] = pairs // 10
+    out[1::2] = pairs % 10
+    out += ord('0')
+    return out.tobytes()
+
+
+def _iter_text_digits(src, chunk_digits):
+    """按块读取文本密钥，只保留数字字符（同 C 端 isdigit 过滤）"""
+    table = bytes(range(256))
+    non_digits = bytes(c for c in range(256) if not 48 <= c <= 57)
+    with open(src, 'rb') as f:
+        while True:
+            block = f.read(chunk_digits)
+            if not block:
+                break
+            yield block.translate(table, non_digits)
+
+
+def text_to_binary(src, dst, seed=None, digit_offset=0, chunk_digits=CHUNK_DIGITS):
+    """文本密钥转二进制格式，返回写入的位数"""
+    checksum = 0
+    count = 0
+    carry = b''
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as out:
+        out.write(b'\0' * HEADER_SIZE)
+        for digits in _iter_text_digits(src, chunk_digits):
+            count += len(digits)
+            digits = carry + digits
+            even = len(digits) - len(digits) % 2
+            carry = digits[even:]
+            payload = digits_to_pairs(digits[:even]).tobytes()
+            checksum = zlib.crc32(payload, checksum)
+            out.write(payload)
+        if carry:
+            payload = digits_to_pairs(carry + b'0').tobytes()
+            checksum = zlib.crc32(payload, checksum)
+            out.write(payload)
+        out.seek(0)
+        out.write(pack_header(seed_hash(seed), digit_offset, count, checksum))
+    os.replace(tmp, dst)
+    return count
+
+
+def binary_to_text(src, dst, chunk_pairs=CHUNK_DIGITS // 2):
+    """二进制密钥转回文本格式（去掉奇数位时的补位）"""
+    with open(src, 'rb') as f:
+        header = read_header(f.read(HEADER_SIZE))
+        remaining = header['digit_count']
+        with open(dst, 'wb') as out:
+            while remaining > 0:
+                block = f.read(min(chunk_pairs, (remaining + 1) // 2))
+                if not block:
+                    raise ValueError("二进制密钥文件被截断")
+                digits = pairs_to_digits(np.frombuffer(block, dtype=np.uint8))
+                out.write(digits[:remaining])
+                remaining -= len(digits)
+    return header['digit_count']
+
+
+def discard_binary(text_file):
+    """重写文本密钥前删除对应的 keyN.bin，避免加载端继续使用旧密钥"""
+    try:
+        os.remove(binary_path(text_file))
+    except FileNotFoundError:
+        pass
+
+
+def text_digit_count(text_file, tail=16):
+    """文本密钥的位数（按纯数字文件计：文件大小减去末尾的换行等字符）"""
+    with open(text_file, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - tail, 0))
+        end = f.read()
+    return size - (len(end) - len(end.rstrip(bytes(c for c in range(256) if not 48 <= c <= 57))))
+
+
+def check_binary(header, bin_file, text_file=None, seed=None):
+    """
+    二进制密钥与同名文本密钥或种子不一致时抛出 ValueError：比文本旧、位数不同，
+    或文件头中的种子摘要与 seed 不符（未记录种子的文件头不比较种子）。
+    """
+    if text_file and os.path.exists(text_file):
+        if os.path.getmtime(bin_file) < os.path.getmtime(text_file):
+            raise ValueError("二进制密钥比文本密钥旧")
+        if header['digit_count'] != text_digit_count(text_file):
+            raise ValueError("二进制密钥与文本密钥位数不一致")
+    if seed is not None and header['seed_hash'] not in (seed_hash(None), seed_hash(seed)):
+        raise ValueError("二进制密钥的种子与密钥清单不一致")
+
+
+def load_binary_key(filename, verify=True, text_file=None, seed=None):
+    """
+    通过 mmap 零解析加载二进制密钥，默认校验 CRC32，并与 text_file / seed 比对（见 check_binary）。
+    返回 (header, values)，values 为只读 uint8 视图，文件映射随 values 存活。
+    """
+    with open(filename, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = read_header(mapped)
+    check_binary(header, filename, text_file, seed)
+    end = header['header_size'] + header['pairs']
+    if len(mapped) < end:
+        raise ValueError("二进制密钥文件被截断")
+    values = np.frombuffer(mapped, dtype=np.uint8, count=header['pairs'],
+                           offset=header['header_size'])
+    if verify and zlib.crc32(values) != header['checksum']:
+        raise ValueError("二进制密钥文件校验失败")
+    return header, values
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="文本/二进制密钥格式转换")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--to", choices=["binary", "text"], default="binary")
+    parser.add_argument("--offset", type=int, default=10, help="密钥在平方根小数部分中的起始位")
+    args = parser.parse_args()
+
+    if args.to == "binary":
+        n = text_to_binary(args.src, args.dst, digit_offset=args.offset)
+    else:
+        n = binary_to_text(args.src, args.dst)
+    print(f"已转换 {n:,} 位: {args.src} -> {args.dst}")
+    print(f"文件大小: {os.path.getsize(args.src):,} -> {os.path.getsize(args.dst):,} 字节")
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import secrets
+import time
+from readkey import format_pswd, read_pswd
+
+# 密钥清单目录：每一代密钥材料一个 JSON 记录，LATEST 指向最新一代（加密端与解密端共用）
+MANIFEST_DIR = './manifest'
+PSWD_FILE = 'pswd.txt'
+# 设置该环境变量可让各脚本统一使用指定的一代密钥
+GENERATION_ENV = 'JIAMI_GENERATION'
+# 一代密钥材料包含的字段：替换表种子、平方根密钥与位数、索引种子，以及轮换替换表的种子
+FIELDS = ('seed', 'keys', 'digits', 'index', 'rotations')
+
+
+class KeyManifest:
+    """
+    按代保存密钥材料的清单。generations/<id>.json 是一代的完整记录，
+    LATEST 文件只保存最新一代的 id，查找任何一代都只读一个小文件，与历史长度无关。
+    """
+
+    def __init__(self, root=MANIFEST_DIR):
+        self.root = root
+        self.gen_dir = os.path.join(root, 'generations')
+        self.latest_file = os.path.join(root, 'LATEST')
+
+    def _path(self, gen_id):
+        return os.path.join(self.gen_dir, f'{gen_id}.json')
+
+    @staticmethod
+    def _write_json(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def new_id():
+        """按时间排序的代 id，附加随机后缀避免同一秒内冲突"""
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+    def latest_id(self):
+        try:
+            with open(self.latest_file, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set_latest(self, gen_id):
+        if not os.path.exists(self._path(gen_id)):
+            raise KeyError(f"未找到密钥代: {gen_id}")
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.latest_file}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(gen_id)
+        os.replace(tmp, self.latest_file)
+
+    def get(self, gen_id=None):
+        """读取指定的一代（默认取环境变量 JIAMI_GENERATION，其次为最新一代），不存在返回 None"""
+        gen_id = gen_id or os.environ.get(GENERATION_ENV) or self.latest_id()
+        if not gen_id:
+            return None
+        try:
+            with open(self._path(gen_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, record, latest=True):
+        self._write_json(self._path(record['id']), record)
+        if latest:
+            self.set_latest(record['id'])
+        return record
+
+    def begin(self, gen_id=None, **fields):
+        """开始新的一代（不继承旧值）并设为最新"""
+        record = {'id': gen_id or self.new_id(), 'created': time.strftime('%Y-%m-%d %H:%M:%S')}
+        record.update({name: None for name in FIELDS})
+        record.update(fields)
+        return self.save(record)
+
+    def record(self, **fields):
+        """
+        把字段写入最新一代；若最新一代中这些字段已有值，则另起一代并继承其余字段，
+        已使用过的一代从不被改写。
+        """
+        latest = self.get(self.latest_id())
+        if latest is None:
+            return self.begin(**fields)
+        if any(latest.get(name) for name in fields):
+            inherited = {name: latest.get(name) for name in FIELDS if name not in fields}
+            inherited['parent'] = latest['id']
+            return self.begin(**inherited, **fields)
+        latest.update(fields)
+        return self.save(latest)
+
+    def ids(self):
+        """全部代 id（按时间顺序）；仅用于列表显示，查找不依赖它"""
+        try:
+            return sorted(name[:-5] for name in os.listdir(self.gen_dir) if name.endswith('.json'))
+        except FileNotFoundError:
+            return []
+
+
+def migrate_pswd(manifest, pswd_file=PSWD_FILE):
+    """把旧格式的 pswd.txt 解析一次并存为一代（id 由文件内容决定，重复迁移得到同一代）"""
+    with open(pswd_file, 'rb') as f:
+        gen_id = 'pswd-' + hashlib.sha256(f.read()).hexdigest()[:12]
+    record = manifest.get(gen_id)
+    if record is None:
+        seed, keys, digits, index = read_pswd(pswd_file)
+        record = manifest.begin(gen_id, seed=seed, keys=keys, digits=digits, index=index,
+                                source=os.path.abspath(pswd_file))
+    elif manifest.latest_id() is None:
+        manifest.set_latest(gen_id)
+    return record
+
+
+def load_generation(gen_id=None, manifest=None, pswd_file=PSWD_FILE, require=()):
+    """
+    读取一代密钥材料，返回与 read_pswd 相同顺序的 (种子, 密钥列表, 位数列表, 索引种子)。
+    清单为空而存在旧的 pswd.txt 时，先将其迁移为一代；require 中的字段缺失时报错。
+    """
+    manifest = manifest or KeyManifest()
+    record = manifest.get(gen_id)
+    if record is None and not gen_id and not manifest.latest_id() and os.path.exists(pswd_file):
+        record = migrate_pswd(manifest, pswd_file)
+    if record is None:
+        raise KeyError(f"未找到密钥代: {gen_id or os.environ.get(GENERATION_ENV) or '最新'}（清单目录 {manifest.root}）")
+    missing = [name for name in require if not record.get(name)]
+    if missing:
+        raise ValueError(f"密钥代 {record['id']} 缺少 {', '.join(missing)}（加密端对应脚本尚未运行）")
+    return record['seed'], record['keys'] or [], record['digits'] or [], record['index']
+
+
+def load_rotations(gen_id=None, manifest=None):
+    """一代中轮换替换表的种子列表（没有时为空）"""
+    record = (manifest or KeyManifest()).get(gen_id)
+    return list((record or {}).get('rotations') or [])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="密钥清单：查看、切换、迁移与导出各代密钥材料")
+    parser.add_argument("--dir", default=MANIFEST_DIR, help="清单目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出全部代")
+    show = sub.add_parser("show", help="显示一代（默认最新）")
+    show.add_argument("id", nargs="?")
+    use = sub.add_parser("use", help="把指定的一代设为最新")
+    use.add_argument("id")
+    migrate = sub.add_parser("migrate", help="把旧格式的 pswd.txt 迁移为一代")
+    migrate.add_argument("pswd", nargs="?", default=PSWD_FILE)
+    export = sub.add_parser("export", help="把一代导出为旧格式的 pswd.txt")
+    export.add_argument("output", nargs="?", default=PSWD_FILE)
+    export.add_argument("--id")
+    args = parser.parse_args()
+
+    manifest = KeyManifest(args.dir)
+    if args.command == "list":
+        latest = manifest.latest_id()
+        for gen_id in manifest.ids():
+            record = manifest.get(gen_id)
+            marker = '*' if gen_id == latest else ' '
+            print(f"{marker} {gen_id}  {record.get('created', '')}  密钥 {len(record.get('keys') or [])} 个")
+    elif args.command == "show":
+        record = manifest.get(args.id)
+        if record is None:
+            parser.error("未找到密钥代")
+        print(json.dumps(record, ensure_ascii=False, indent=2))
+    elif args.command == "use":
+        manifest.set_latest(args.id)
+        print(f"最新一代已设为: {args.id}")
+    elif args.command == "migrate":
+        record = migrate_pswd(manifest, args.pswd)
+        print(f"已迁移为密钥代: {record['id']}（密钥 {len(record['keys'])} 个）")
+    elif args.command == "export":
+        seed, keys, digits, index = load_generation(args.id, manifest)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(format_pswd(seed, keys, digits, index))
+        print(f"已导出至: {args.output}")
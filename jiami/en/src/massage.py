@@ -1,10 +1,12 @@
-import gmpy2
-from gmpy2 import mpfr, get_context
-import secrets
+import argparse
 import os
 import time
 from tqdm import tqdm
+from sqrtkey import substitution_pool
 from pswd import generate_secure as security
+from cipher import compile_tables
+from manifest import KeyManifest
+import tracing
 def generate_ascii_charset(filename):
     """生成包含完整ASCII 32-126字符集的文件"""
     print("正在生成ASCII字符集...")
@@ -14,46 +16,39 @@ def generate_ascii_charset(filename):
     return ''.join(ascii_chars)
 
 
-def create_substitution_table(original, key_file='D:\min project\jiami\pswd.txt'):
+def create_substitution_table(original, manifest=None):
+    """生成替换表，种子作为新的一代记入密钥清单"""
     if ' ' not in original:
         raise ValueError("字符集缺少空格字符")
     if len(original) != 95:
         missing = set(chr(i) for i in range(32, 127)) - set(original)
         raise ValueError(f"缺失字符: {''.join(sorted(missing))}")
 
-    print("正在初始化加密上下文...")
-    ctx = get_context()
-    original_precision = ctx.precision
-    ctx.precision = 300
+    print("正在生成加密种子...")
+    rand_num = security(21)
+    substitution = shuffle_charset(original, rand_num)
+    record = (manifest or KeyManifest()).begin(seed=rand_num)
+    print(f"加密种子已记入密钥代: {record['id']}")
+    return substitution
 
-    try:
-        print("正在生成加密种子...")
-        rand_num = security(21)
-        with open(key_file, 'w') as f:
-            f.write(str(rand_num))
-
-        num = mpfr(rand_num)
-        sqrt_num = gmpy2.sqrt(num)
-        sqrt_str = format(sqrt_num, ".500f").split('.')[1]
 
-        num_pool = [int(sqrt_str[i:i + 3]) for i in range(0, 450, 3)]
+def shuffle_charset(original, rand_num, quiet=False):
+    """以种子 rand_num 的平方根数字为索引池做 Fisher-Yates 洗牌（结果只由种子决定，解密端可重建）"""
+    with tracing.span('substitution.table', chars=len(original)):
+        # 整数平方根精确取前450位作为索引池（字符集更大时按需加长，索引池不会用尽）
+        num_pool = substitution_pool(rand_num, max(150, len(original)))
 
         chars = list(original)
-        for i in tqdm(range(len(chars) - 1, 0, -1), desc="进度", unit="步"):
-            if not num_pool:
-                new_rand = secrets.randbelow(10 ** 8)
-                new_sqrt = gmpy2.sqrt(mpfr(new_rand))
-                sqrt_str = format(new_sqrt, ".500f").split('.')[1]
-                num_pool = [int(sqrt_str[i:i + 3]) for i in range(0, 450, 3)]
-                with open(key_file, 'ab') as f:
-                    f.write(new_rand.to_bytes(4, 'big'))
-
+        for i in tqdm(range(len(chars) - 1, 0, -1), desc="进度", unit="步", disable=quiet):
             idx = num_pool.pop() % (i + 1)
             chars[i], chars[idx] = chars[idx], chars[i]
 
-        return ''.join(chars)
-    finally:
-        ctx.precision = original_precision
+    return ''.join(chars)
+
+
+def rotation_substitutions(original, seeds):
+    """按轮换计划批量生成替换串（每个种子一张）"""
+    return [shuffle_charset(original, seed, quiet=True) for seed in tqdm(seeds, desc="轮换表", unit="张")]
 
 
 def verify_substitution(original, substitution):
@@ -65,6 +60,12 @@ def verify_substitution(original, substitution):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成替换表，并编译为 tables.bin")
+    parser.add_argument("--rotations", type=int, default=0,
+                        help="额外批量生成的轮换替换表数量（tables.bin 第 1 张起，种子记入密钥清单）")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
     start_time = time.time()
     char_file = './en/char/char.txt'
     if not os.path.exists(char_file):
@@ -85,6 +86,12 @@ if __name__ == "__main__":
         f.write(substitution)
     print("替换表已保存至 substitution.txt")
     verify_substitution(original, substitution)
+
+    seeds = [security(21) for _ in range(args.rotations)]
+    if seeds:
+        KeyManifest().record(rotations=seeds)
+    tables = compile_tables('./en/char', [substitution] + rotation_substitutions(original, seeds))
+    print(f"编译后的替换表已保存至 tables.bin（共 {len(tables)} 张）")
     
     # 输出总耗时
     end_time = time.time()
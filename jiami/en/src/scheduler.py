@@ -0,0 +1,182 @@
+import os
+import time
+from multiprocessing import Pool
+from gmpy2 import mpz
+from digitstream import DEFAULT_SEGMENT, iter_segments
+from keycache import CACHE_DIR, DEFAULT_MAX_BYTES, KeyCache, RootCache, root_dir
+from keyfile import binary_path, discard_binary, text_to_binary
+from sqrtkey import ENGINES, KEY_SKIP, key_root
+import tracing
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），平台不支持时返回 None"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def default_options(segment_size=DEFAULT_SEGMENT, engine="isqrt",
+                    cache_dir=CACHE_DIR, cache_bytes=DEFAULT_MAX_BYTES, binary=False):
+    """sqrt 任务的公共参数（binary 为真时同时生成 keyN.bin）"""
+    return {
+        'segment_size': segment_size,
+        'engine': engine,
+        'cache_dir': cache_dir,
+        'cache_bytes': cache_bytes,
+        'binary': binary,
+    }
+
+
+def _open_cache(options):
+    if not options['cache_dir']:
+        return None
+    return KeyCache(options['cache_dir'], options['cache_bytes'])
+
+
+def _metrics(name, digits, wall_start, cpu_start, **extra):
+    result = {
+        'name': name,
+        'digits': digits,
+        'wall': time.time() - wall_start,
+        'cpu': time.process_time() - cpu_start,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    result.update(extra)
+    return result
+
+
+def _write_binary(job, options):
+    """文本密钥写完后重新生成 keyN.bin；不生成时删除旧的，避免加载端使用上一代密钥"""
+    if options.get('binary'):
+        text_to_binary(job['file'], binary_path(job['file']), job['key'], KEY_SKIP)
+    else:
+        discard_binary(job['file'])
+
+
+def _whole_job(task, job, options):
+    """在单个工作进程内完成一个密钥"""
+    wall_start, cpu_start = time.time(), time.process_time()
+    with tracing.span('sqrt.job', key=job['name'], digits=job['digits']):
+        task(job['key'], job['file'], job['digits'], options['segment_size'],
+             options['engine'], options['cache_dir'], options['cache_bytes'])
+        _write_binary(job, options)
+    return _metrics(job['name'], job['digits'], wall_start, cpu_start), None
+
+
+def part_widths(digits, split_digits):
+    """拆分任务从高位到低位的各段位数"""
+    return [min(split_digits, digits - offset) for offset in range(0, digits, split_digits)]
+
+
+def split_window(window, widths):
+    """按从高到低的各段位数把数字窗口拆成子整数（二分递归，每层除法的总规模只有一个窗口）"""
+    if len(widths) == 1:
+        return [window]
+    half = len(widths) // 2
+    high, low = divmod(window, mpz(10) ** sum(widths[half:]))
+    return split_window(high, widths[:half]) + split_window(low, widths[half:])
+
+
+def _root_job(job, options, split_digits):
+    """拆分任务的第一步：计算数字窗口并一次拆成各段子整数，十进制转换交给其它工作进程（每个进程只收到自己的一段）"""
+    wall_start, cpu_start = time.time(), time.process_time()
+    cache = _open_cache(options)
+    if cache is not None and cache.fetch(job['key'], KEY_SKIP, job['digits'], job['file']):
+        _write_binary(job, options)
+        return _metrics(job['name'], job['digits'], wall_start, cpu_start, cached=True), None
+    with tracing.span('sqrt.root', key=job['name']):
+        if cache is not None and options['engine'] == "isqrt":
+            roots = RootCache(root_dir(options['cache_dir']), options['cache_bytes'])
+            root, _, _ = key_root(job['key'], KEY_SKIP + job['digits'], roots)
+            window = root % mpz(10) ** job['digits']
+        else:
+            window = ENGINES[options['engine']](job['key'], KEY_SKIP, job['digits'])
+        parts = split_window(window, part_widths(job['digits'], split_digits))
+    return _metrics(job['name'], job['digits'], wall_start, cpu_start), parts
+
+
+def _convert_part(name, part, file, offset, width, segment_size):
+    """转换数字窗口中 [offset, offset+width) 的一段（part 即该段的整数）并写到文件对应位置"""
+    wall_start, cpu_start = time.time(), time.process_time()
+    with tracing.span('sqrt.convert', key=name, offset=offset, digits=width), open(file, 'r+b') as f:
+        f.seek(offset)
+        for segment in iter_segments(part, width, segment_size):
+            f.write(segment.encode('ascii'))
+    return _metrics(f"{name}[{offset}:{offset + width}]", width, wall_start, cpu_start)
+
+
+def plan_jobs(keys, digits_list, path_format):
+    """构造任务列表（path_format 形如 './en/keys/key{i}.txt'）"""
+    return [
+        {'name': f"key{i}", 'key': key, 'file': path_format.format(i=i), 'digits': digits}
+        for i, (key, digits) in enumerate(zip(keys, digits_list))
+    ]
+
+
+def run_sqrt_jobs(task, jobs, workers=None, split_digits=0, options=None, progress=None):
+    """
+    负载均衡地执行平方根任务（大任务优先）。
+    位数超过 split_digits 的密钥在一个进程内求根，再按 split_digits 分块并行转换。
+    返回每个任务（及转换分块）的耗时与内存统计。
+    """
+    options = options or default_options()
+    workers = workers or os.cpu_count() or 1
+    jobs = sorted(jobs, key=lambda job: job['digits'], reverse=True)
+    reports = []
+    splits = []
+
+    with tracing.span('sqrt.run', jobs=len(jobs), workers=workers), \
+            Pool(workers, maxtasksperchild=1) as pool:
+        pending = []
+        for job in jobs:
+            if split_digits and job['digits'] > split_digits and workers > 1:
+                pending.append((job, pool.apply_async(_root_job, (job, options, split_digits))))
+            else:
+                pending.append((job, pool.apply_async(_whole_job, (task, job, options))))
+
+        for job, result in pending:
+            report, window_parts = result.get()
+            reports.append(report)
+            if window_parts is None:
+                if progress is not None:
+                    progress()
+                continue
+
+            # 预分配文件后由多个进程按偏移写入各自的分块
+            with open(job['file'], 'wb') as f:
+                f.truncate(job['digits'])
+            parts = []
+            for offset, part in zip(range(0, job['digits'], split_digits), window_parts):
+                width = min(split_digits, job['digits'] - offset)
+                parts.append(pool.apply_async(
+                    _convert_part,
+                    (job['name'], part, job['file'], offset, width, options['segment_size'])))
+            del window_parts
+            splits.append((job, parts))
+
+        for job, parts in splits:
+            reports.extend(part.get() for part in parts)
+            cache = _open_cache(options)
+            if cache is not None:
+                cache.put(job['key'], KEY_SKIP, job['digits'], job['file'])
+            _write_binary(job, options)
+            if progress is not None:
+                progress()
+
+    return reports
+
+
+def format_reports(reports):
+    """格式化每个任务的墙钟时间、CPU时间和峰值内存"""
+    lines = [f"{'任务':<24}{'位数':>12}{'墙钟(秒)':>10}{'CPU(秒)':>10}{'峰值内存(MB)':>14}"]
+    for r in reports:
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else "-"
+        name = r['name'] + (" (缓存)" if r.get('cached') else "")
+        lines.append(f"{name:<24}{r['digits']:>12,}{r['wall']:>10.2f}{r['cpu']:>10.2f}{rss:>14}")
+    return "\n".join(lines)
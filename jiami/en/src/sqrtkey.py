@@ -0,0 +1,155 @@
+import time
+import gmpy2
+from gmpy2 import mpz, mpfr, get_context
+from digitstream import DEFAULT_SEGMENT, fraction_window, write_digits
+from keycache import file_digest
+
+# 密钥文件跳过平方根小数部分的前10位
+KEY_SKIP = 10
+
+
+def sqrt_window(seed, skip, count):
+    """整数平方根：精确计算 sqrt(seed) 小数部分第 skip 位起的 count 位（返回整数）"""
+    root = gmpy2.isqrt(mpz(seed) * mpz(10) ** (2 * (skip + count)))
+    return root % mpz(10) ** count
+
+
+def sqrt_window_mpfr(seed, skip, count):
+    """旧mpfr路径（精度按 1.1 倍冗余分配），仅用于速度对比"""
+    ctx = get_context().copy()
+    ctx.precision = int((skip + count) * 3.321928 * 1.1) + 64
+    with ctx:
+        result = gmpy2.sqrt(mpfr(str(seed)))
+        return fraction_window(result, skip, count)
+
+
+def sqrt_root(seed, precision):
+    """(根, 余数)：根为 isqrt(seed * 10^(2*precision))，即 sqrt(seed) 保留 precision 位小数"""
+    return gmpy2.isqrt_rem(mpz(seed) * mpz(10) ** (2 * precision))
+
+
+def refine_root(root, rem, precision, new_precision):
+    """
+    牛顿修正（Karatsuba 平方根的一步）：由 precision 位精度的根与余数得到 new_precision 位精度的
+    (根, 余数, 新增的尾部数字)。要求 precision < new_precision <= 2*precision；
+    新增部分只是一个 step 位的商，各步乘除的规模随新增位数而不是总位数增长。
+    """
+    step = new_precision - precision
+    if not 0 < step <= precision:
+        raise ValueError("单步修正要求新精度高于原精度且不超过其两倍")
+    base = mpz(10) ** step
+    twice = 2 * root
+    x = rem * base
+    cut = max(0, twice.bit_length() - base.bit_length() - 64)
+    q = (x >> cut) // (twice >> cut)
+    u = x - q * twice
+    while u < 0:
+        q -= 1
+        u += twice
+    while u >= twice:
+        q += 1
+        u -= twice
+    rem = u * base - q * q
+    root = root * base + q
+    # 余数为负说明商偏大1（至多一次）
+    if rem < 0:
+        q -= 1
+        root -= 1
+        rem += 2 * root + 1
+    return root, rem, q
+
+
+def key_root(seed, precision, roots=None):
+    """
+    返回 (根, known, 尾部)：根为 isqrt(seed * 10^(2*precision))；known 为根缓存中可复用的较低精度
+    （没有时为 0）；尾部为根的末 precision-known 位，即 known 之后新增的数字。
+    新精度不超过缓存精度两倍时一步牛顿修正，否则重新求根（多步修正比 isqrt 更慢）；新的根存回缓存。
+    """
+    cached = roots.load(seed) if roots is not None else None
+    if cached is not None and cached[0] >= precision:
+        known, root, _ = cached
+        root = root // mpz(10) ** (known - precision)
+        return root, 0, root
+    if cached is None:
+        known = 0
+        root, rem = sqrt_root(seed, precision)
+        tail = root
+    elif precision <= 2 * cached[0]:
+        known = cached[0]
+        root, rem, tail = refine_root(cached[1], cached[2], known, precision)
+    else:
+        known = cached[0]
+        root, rem = sqrt_root(seed, precision)
+        tail = root % mpz(10) ** (precision - known)
+    if roots is not None:
+        roots.store(seed, precision, root, rem)
+    return root, known, tail
+
+
+def write_key_digits(seed, file, skip, count, cache, roots, segment_size=DEFAULT_SEGMENT):
+    """
+    借助根缓存写出密钥：同一种子已有较短的密钥时，以文本缓存中的原密钥为前缀，
+    只转换并追加新增的尾部数字，并校验前缀与原密钥文件一致。返回复用的前缀位数。
+    """
+    root, known, tail = key_root(seed, skip + count, roots)
+    old_count = known - skip
+    meta = cache.lookup(seed, skip, old_count) if old_count > 0 else None
+    if meta is not None and cache.fetch(seed, skip, old_count, file):
+        write_digits(file, tail, count - old_count, segment_size, mode="a")
+        if file_digest(file, size=meta['size']) != meta['digest']:
+            raise ValueError(f"{file} 的前 {old_count} 位与原密钥不一致")
+        return old_count
+    write_digits(file, root % mpz(10) ** count, count, segment_size)
+    return 0
+
+
+ENGINES = {
+    "isqrt": sqrt_window,
+    "mpfr": sqrt_window_mpfr,
+}
+
+
+def sqrt_digits(seed, skip, count, engine="isqrt"):
+    """返回 count 位十进制数字串"""
+    if count <= 0:
+        return ""
+    return ENGINES[engine](seed, skip, count).digits().zfill(count)
+
+
+def substitution_pool(seed, size=150):
+    """替换表洗牌用的三位数池（取小数部分前 size*3 位）"""
+    digits = sqrt_digits(seed, 0, size * 3)
+    return [int(digits[i:i + 3]) for i in range(0, size * 3, 3)]
+
+
+def write_sqrt_digits(seed, file, skip, count, segment_size=DEFAULT_SEGMENT, engine="isqrt"):
+    """计算数字窗口并流式写入文件"""
+    window = ENGINES[engine](seed, skip, count)
+    write_digits(file, window, count, segment_size)
+
+
+def format_speed(digits, seconds):
+    """与 key.py 一致的速度输出格式"""
+    return f"平均速度: {digits / max(seconds, 1e-9) / 1e6:.2f}百万位/秒"
+
+
+def measure(seed, count, skip=KEY_SKIP, engine="isqrt"):
+    """计时单次计算，返回 (耗时秒, 速度字符串)"""
+    start = time.time()
+    window = ENGINES[engine](seed, skip, count)
+    elapsed = time.time() - start
+    del window
+    return elapsed, format_speed(count, elapsed)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="isqrt 与 mpfr 密钥引擎速度对比")
+    parser.add_argument("--digits", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=922613107263893084)
+    args = parser.parse_args()
+
+    for name in ENGINES:
+        elapsed, speed = measure(args.seed, args.digits, engine=name)
+        print(f"[{name}] 耗时: {elapsed:.2f}秒  {speed}")
@@ -0,0 +1,83 @@
+import os
+import struct
+import zlib
+
+# 编译后的替换表文件（与 jiami.c / jiemi.c 保持一致），小端序:
+#   文件头 16 字节: magic 4s | version H | header_size H | record_size H | 保留 H | count I
+#   每张表 520 字节: forward 256s | inverse 256s | min_ord B | max_ord B | 保留 2 字节 | crc32 I
+# crc32 覆盖本表前 516 字节；第 0 张为当前替换表，其后为按轮换计划预先生成的表
+TABLE_FILE = 'tables.bin'
+# 选择轮换表序号的环境变量（C 端同名）
+TABLE_ENV = 'SUBSTITUTION_TABLE'
+TABLE_MAGIC = b'JSUB'
+TABLE_VERSION = 1
+HEADER_FORMAT = '<4sHHHHI'
+RECORD_FORMAT = '<256s256sBB2xI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+def table_path(char_dir):
+    return os.path.join(char_dir, TABLE_FILE)
+
+
+def pack_table(tables):
+    """build_tables 的结果打包为一条 520 字节记录"""
+    body = struct.pack('<256s256sBB2x', tables['forward'], tables['inverse'],
+                       tables['min_ord'], tables['max_ord'])
+    return body + struct.pack('<I', zlib.crc32(body))
+
+
+def pack_tables(table_list):
+    header = struct.pack(HEADER_FORMAT, TABLE_MAGIC, TABLE_VERSION, HEADER_SIZE, RECORD_SIZE, 0,
+                         len(table_list))
+    return header + b''.join(pack_table(tables) for tables in table_list)
+
+
+def unpack_tables(buffer):
+    """解析替换表文件并逐表校验 CRC32，返回与 build_tables 相同结构的字典列表"""
+    if len(buffer) < HEADER_SIZE:
+        raise ValueError("替换表文件头不完整")
+    magic, version, header_size, record_size, _, count = struct.unpack_from(HEADER_FORMAT, buffer)
+    if magic != TABLE_MAGIC:
+        raise ValueError("不是替换表文件")
+    if version != TABLE_VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"不支持的替换表文件版本: {version}")
+    if len(buffer) < header_size + count * record_size:
+        raise ValueError("替换表文件不完整")
+
+    table_list = []
+    for i in range(count):
+        offset = header_size + i * record_size
+        forward, inverse, min_ord, max_ord, checksum = struct.unpack_from(RECORD_FORMAT, buffer, offset)
+        if zlib.crc32(buffer[offset:offset + record_size - 4]) != checksum:
+            raise ValueError(f"替换表 {i} 校验失败")
+        table_list.append({
+            'forward': forward,
+            'inverse': inverse,
+            'min_ord': min_ord,
+            'max_ord': max_ord,
+            'range': max_ord - min_ord + 1,
+        })
+    return table_list
+
+
+def save_tables(path, table_list):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(pack_tables(table_list))
+    os.replace(tmp, path)
+
+
+def load_table_file(path):
+    with open(path, 'rb') as f:
+        return unpack_tables(f.read())
+
+
+def is_current(char_dir):
+    """替换表文件存在且不早于 substitution.txt（手工改动字符集后自动回退到文本）"""
+    path = table_path(char_dir)
+    if not os.path.exists(path):
+        return False
+    source = os.path.join(char_dir, 'substitution.txt')
+    return not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)
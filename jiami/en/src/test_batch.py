@@ -0,0 +1,54 @@
+import os
+import shutil
+import pytest
+from cipher import BATCH_MANIFEST, batch_jobs, batch_transform, files_equal, load_tables
+from conftest import write_plaintexts
+
+
+def test_identical_files_use_distinct_keystream(tmp_path, keys_dir, char_dir):
+    tables = load_tables(char_dir)
+    plain = tmp_path / 'plain'
+    first, = write_plaintexts(plain, 1, 500)
+    shutil.copy(first, plain / 'copy.txt')
+
+    enc = str(tmp_path / 'enc')
+    records = batch_transform(batch_jobs([str(plain)], enc), tables, keys_dir, enc)
+    assert all('error' not in r for r in records)
+    assert records[0]['offset'] != records[1]['offset']
+    with open(os.path.join(enc, 'copy.txt'), 'rb') as a, open(os.path.join(enc, 'doc0.txt'), 'rb') as b:
+        assert a.read() != b.read()
+    assert os.path.exists(os.path.join(enc, BATCH_MANIFEST))
+
+    dec = str(tmp_path / 'dec')
+    records = batch_transform(batch_jobs([enc], dec), tables, keys_dir, dec, decrypt=True)
+    assert all('error' not in r for r in records)
+    for name in ('doc0.txt', 'copy.txt'):
+        assert files_equal(os.path.join(plain, name), os.path.join(dec, name))
+
+
+def test_roundtrip_with_large_file(tmp_path, keys_dir, char_dir):
+    tables = load_tables(char_dir)
+    paths = write_plaintexts(tmp_path / 'plain', 5, 3000, seed=1)
+    enc, dec = str(tmp_path / 'enc'), str(tmp_path / 'dec')
+    # 块大小小于文件，覆盖大文件的流水线路径
+    batch_transform(batch_jobs(paths, enc), tables, keys_dir, enc, block_size=1024)
+    records = batch_transform(batch_jobs([enc], dec), tables, keys_dir, dec, decrypt=True, block_size=1024)
+    assert [r.get('error') for r in records] == [None] * 5
+    for path in paths:
+        assert files_equal(path, os.path.join(dec, os.path.basename(path)))
+
+
+def test_decrypt_without_manifest_fails(tmp_path, keys_dir, char_dir):
+    paths = write_plaintexts(tmp_path / 'plain', 1, 100)
+    out = str(tmp_path / 'out')
+    record, = batch_transform(batch_jobs(paths, out), load_tables(char_dir), keys_dir, out, decrypt=True)
+    assert 'error' in record
+
+
+def test_duplicate_destinations_rejected(tmp_path):
+    a = write_plaintexts(tmp_path / 'a', 1, 10)
+    b = write_plaintexts(tmp_path / 'b', 1, 10)
+    with pytest.raises(ValueError):
+        batch_jobs(a + b, str(tmp_path / 'out'))
+    with pytest.raises(ValueError):
+        batch_jobs([str(tmp_path / 'a'), a[0]], str(tmp_path / 'out'))
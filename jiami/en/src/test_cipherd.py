@@ -0,0 +1,53 @@
+import asyncio
+import os
+import stat
+import threading
+import time
+import pytest
+from cipherd import CipherClient, CipherServer, load_engines
+
+
+@pytest.fixture
+def daemon(tmp_path, keys_dir, char_dir):
+    """在后台线程中运行服务，返回套接字路径"""
+    path = str(tmp_path / 'd.sock')
+    server = CipherServer(load_engines(char_dir, keys_dir, char_dir, keys_dir), path)
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(server.run())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.05)
+    yield path
+    loop.call_soon_threadsafe(task.cancel)
+    time.sleep(0.1)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+def test_roundtrip_and_distinct_offsets(daemon):
+    message = b'The quick brown fox jumps over the lazy dog.\n' * 40
+    with CipherClient(daemon) as client:
+        first, cipher1 = client.encrypt(message)
+        second, cipher2 = client.encrypt(message)
+        # 同一明文两次加密不能复用密钥流
+        assert first != second
+        assert cipher1 != cipher2
+        assert client.decrypt(cipher1, first) == message
+        assert client.decrypt(cipher2, second) == message
+        assert client.stats()['requests'] == 4
+
+
+def test_socket_owner_only(daemon):
+    assert stat.S_IMODE(os.stat(daemon).st_mode) == 0o600
+
+
+def test_refuses_running_socket(daemon):
+    server = CipherServer({}, daemon)
+    with pytest.raises(RuntimeError):
+        asyncio.run(server.run())
+    # 运行中的服务不受影响
+    with CipherClient(daemon) as client:
+        assert client.stats()['requests'] == 0
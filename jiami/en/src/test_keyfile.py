@@ -0,0 +1,80 @@
+import os
+import random
+import pytest
+from keyfile import (HEADER_SIZE, binary_to_text, load_binary_key, read_header, seed_hash,
+                     text_to_binary)
+
+
+@pytest.fixture
+def odd_key(tmp_path):
+    """奇数位文本密钥（末尾带换行，转换时应忽略）"""
+    rng = random.Random(5)
+    digits = ''.join(rng.choice('0123456789') for _ in range(1001))
+    path = tmp_path / 'key0.txt'
+    path.write_text(digits + '\n')
+    return path, digits
+
+
+def test_roundtrip(tmp_path, odd_key):
+    text, digits = odd_key
+    binary = str(tmp_path / 'key0.bin')
+    # 小块转换，覆盖块间奇数位的衔接
+    assert text_to_binary(str(text), binary, seed=12345, chunk_digits=97) == len(digits)
+    header, values = load_binary_key(binary, text_file=str(text), seed=12345)
+    assert header['digit_count'] == len(digits)
+    assert header['seed_hash'] == seed_hash(12345)
+    assert bytes(values[:3]) == bytes(int(digits[i:i + 2]) for i in (0, 2, 4))
+    # 奇数位末尾补 0
+    assert values[-1] == int(digits[-1]) * 10
+
+    back = tmp_path / 'back.txt'
+    assert binary_to_text(binary, str(back), chunk_pairs=50) == len(digits)
+    assert back.read_text() == digits
+
+
+def test_corruption_detected(tmp_path, odd_key):
+    text, _ = odd_key
+    binary = str(tmp_path / 'key0.bin')
+    text_to_binary(str(text), binary)
+    with open(binary, 'r+b') as f:
+        f.seek(HEADER_SIZE + 100)
+        value = f.read(1)[0]
+        f.seek(HEADER_SIZE + 100)
+        f.write(bytes([(value + 1) % 100]))
+    with pytest.raises(ValueError, match="校验"):
+        load_binary_key(binary)
+    # 不校验时仍可加载
+    load_binary_key(binary, verify=False)
+
+
+def test_truncated_and_bad_header(tmp_path, odd_key):
+    text, _ = odd_key
+    binary = str(tmp_path / 'key0.bin')
+    text_to_binary(str(text), binary)
+    with open(binary, 'rb') as f:
+        data = f.read()
+    with open(binary, 'wb') as f:
+        f.write(data[:-10])
+    with pytest.raises(ValueError, match="截断"):
+        load_binary_key(binary)
+    with pytest.raises(ValueError):
+        read_header(b'XKEY' + data[4:HEADER_SIZE])
+    with pytest.raises(ValueError):
+        read_header(data[:HEADER_SIZE - 1])
+
+
+def test_stale_or_mismatched_binary_rejected(tmp_path, odd_key):
+    text, digits = odd_key
+    binary = str(tmp_path / 'key0.bin')
+    text_to_binary(str(text), binary, seed=1)
+    with pytest.raises(ValueError, match="种子"):
+        load_binary_key(binary, seed=2)
+    # 文本密钥被重写（位数变化）后旧的 .bin 不能再用
+    text.write_text(digits + '7')
+    stamp = os.path.getmtime(binary)
+    os.utime(text, (stamp, stamp))
+    with pytest.raises(ValueError, match="位数"):
+        load_binary_key(binary, text_file=str(text))
+    os.utime(text, (stamp + 10, stamp + 10))
+    with pytest.raises(ValueError, match="旧"):
+        load_binary_key(binary, text_file=str(text))
@@ -0,0 +1,57 @@
+import os
+import pytest
+from keyfile import binary_path, text_to_binary
+from keystream import KeyFile, KeyStore
+
+# (start, stop) 位偏移：奇偶起止、越过末尾与空区间
+DIGIT_RANGES = [(0, None), (1, 2), (3, 10), (7, 8), (2, 9), (999, 1300), (3990, 4001), (4000, None),
+                (3995, 5000), (11, 11)]
+
+
+def _expected_values(text, start, stop):
+    digits = text + '0' * (len(text) % 2)
+    return [int(digits[i:i + 2]) for i in range(2 * start, min(2 * stop, len(digits)), 2)]
+
+
+@pytest.fixture(params=['text', 'binary'])
+def key(request, keys_dir):
+    """key0（4001 位）分别以文本与二进制格式打开"""
+    text_file = os.path.join(keys_dir, 'key0.txt')
+    if request.param == 'binary':
+        text_to_binary(text_file, binary_path(text_file))
+    key = KeyFile(text_file)
+    assert (key._values is not None) == (request.param == 'binary')
+    with open(text_file) as f:
+        return key, f.read()
+
+
+@pytest.mark.parametrize('start,stop', DIGIT_RANGES)
+def test_digits_at_offsets(key, start, stop):
+    key, text = key
+    assert key.digits(start, stop).tobytes().decode() == text[start:stop]
+    assert key[start:stop].tobytes().decode() == text[start:stop]
+
+
+@pytest.mark.parametrize('start,stop', [(0, 3), (1, 4), (5, 6), (499, 1000), (1999, 2001), (2000, 2001)])
+def test_values_at_offsets(key, start, stop):
+    key, text = key
+    assert key.pair_count == 2001
+    assert key.values(start, stop).tolist() == _expected_values(text, start, stop)
+
+
+def test_iter_chunks_from_odd_offset(key):
+    key, text = key
+    chunks = list(key.iter_chunks(333, start=7, stop=3001))
+    assert b''.join(chunk.tobytes() for chunk in chunks).decode() == text[7:3001]
+    with pytest.raises(TypeError):
+        key[::2]
+
+
+def test_store_maps_each_key_once(keys_dir):
+    store = KeyStore(keys_dir)
+    first = store.get(1)
+    assert store.get(1) is first
+    # 不存在的文件同样缓存
+    assert store.get(5) is None and store.get(5) is None
+    assert (store.loads, store.hits) == (2, 2)
+    assert store.resident_bytes() == len(first) == 2999
@@ -0,0 +1,47 @@
+import pytest
+from manifest import GENERATION_ENV, KeyManifest, load_generation, migrate_pswd
+from readkey import format_pswd, read_pswd
+
+LEGACY = (1234567890, [2, 3, 5], [4001, 2999, 5000], 9876543210)
+
+
+@pytest.fixture
+def pswd_file(tmp_path, monkeypatch):
+    monkeypatch.delenv(GENERATION_ENV, raising=False)
+    path = tmp_path / 'pswd.txt'
+    path.write_text(format_pswd(*LEGACY), encoding='utf-8')
+    return str(path)
+
+
+def test_format_roundtrip(pswd_file):
+    assert read_pswd(pswd_file) == LEGACY
+
+
+def test_migration_is_idempotent(tmp_path, pswd_file):
+    manifest = KeyManifest(str(tmp_path / 'manifest'))
+    record = migrate_pswd(manifest, pswd_file)
+    assert record['id'].startswith('pswd-')
+    assert (record['seed'], record['keys'], record['digits'], record['index']) == LEGACY
+    assert manifest.latest_id() == record['id']
+    assert migrate_pswd(manifest, pswd_file)['id'] == record['id']
+    assert manifest.ids() == [record['id']]
+
+
+def test_load_generation_migrates_empty_manifest(tmp_path, pswd_file):
+    manifest = KeyManifest(str(tmp_path / 'manifest'))
+    assert load_generation(manifest=manifest, pswd_file=pswd_file, require=('keys',)) == LEGACY
+    assert manifest.latest_id().startswith('pswd-')
+    # 清单已有新的一代后不再读取 pswd.txt
+    manifest.record(seed=42)
+    assert load_generation(manifest=manifest, pswd_file=pswd_file)[0] == 42
+
+
+def test_load_generation_errors(tmp_path, pswd_file):
+    manifest = KeyManifest(str(tmp_path / 'manifest'))
+    with pytest.raises(KeyError):
+        load_generation(manifest=manifest, pswd_file=str(tmp_path / 'missing.txt'))
+    with pytest.raises(KeyError):
+        load_generation('no-such-generation', manifest, pswd_file)
+    manifest.begin(seed=7)
+    with pytest.raises(ValueError, match="缺少 keys"):
+        load_generation(manifest=manifest, require=('seed', 'keys'))
@@ -0,0 +1,45 @@
+import gmpy2
+import pytest
+from keycache import RootCache
+from sqrtkey import key_root, refine_root, sqrt_root
+
+
+@pytest.mark.parametrize('seed', [2, 3, 99991, 123456789])
+@pytest.mark.parametrize('precision,new_precision', [(1, 2), (10, 11), (37, 60), (64, 128), (500, 1000)])
+def test_refine_root_matches_isqrt(seed, precision, new_precision):
+    root, rem = sqrt_root(seed, precision)
+    refined, refined_rem, tail = refine_root(root, rem, precision, new_precision)
+    expected, expected_rem = gmpy2.isqrt_rem(gmpy2.mpz(seed) * 10 ** (2 * new_precision))
+    assert (refined, refined_rem) == (expected, expected_rem)
+    assert tail == expected % 10 ** (new_precision - precision)
+
+
+def test_refine_root_rejects_bad_step():
+    root, rem = sqrt_root(7, 10)
+    for new_precision in (10, 9, 21):
+        with pytest.raises(ValueError):
+            refine_root(root, rem, 10, new_precision)
+
+
+def test_key_root_with_cache(tmp_path):
+    roots = RootCache(str(tmp_path / 'roots'))
+    seed = 1234567
+
+    def expected(precision):
+        return gmpy2.isqrt(gmpy2.mpz(seed) * 10 ** (2 * precision))
+
+    # 无缓存：整段重新求根
+    root, known, tail = key_root(seed, 300, roots)
+    assert (root, known, tail) == (expected(300), 0, expected(300))
+    # 不超过两倍：一步牛顿修正，只返回新增的尾部
+    root, known, tail = key_root(seed, 500, roots)
+    assert (root, known) == (expected(500), 300)
+    assert tail == expected(500) % 10 ** 200
+    # 超过两倍：重新求根，尾部仍只是新增部分
+    root, known, tail = key_root(seed, 1200, roots)
+    assert (root, known) == (expected(1200), 500)
+    assert tail == expected(1200) % 10 ** 700
+    # 缓存精度足够：直接截取
+    root, known, _ = key_root(seed, 800, roots)
+    assert (root, known) == (expected(800), 0)
+    assert key_root(seed, 100) == (expected(100), 0, expected(100))
@@ -0,0 +1,71 @@
+import os
+import time
+import pytest
+from cipher import build_tables, load_charsets, load_tables
+from subtable import (HEADER_SIZE, RECORD_SIZE, load_table_file, pack_tables, save_tables, table_path,
+                      unpack_tables)
+
+
+def _tables(char_dir):
+    original, substitution = load_charsets(char_dir)
+    # 第二张表用反转的替换字符集，模拟轮换表
+    return [build_tables(original, substitution), build_tables(original, substitution[::-1])]
+
+
+def test_roundtrip(tmp_path, char_dir):
+    table_list = _tables(char_dir)
+    path = str(tmp_path / 'tables.bin')
+    save_tables(path, table_list)
+    assert os.path.getsize(path) == HEADER_SIZE + 2 * RECORD_SIZE
+    loaded = load_table_file(path)
+    for tables, back in zip(table_list, loaded):
+        for field in ('min_ord', 'max_ord', 'range'):
+            assert back[field] == tables[field]
+        assert bytes(back['forward']) == bytes(tables['forward'])
+        assert bytes(back['inverse']) == bytes(tables['inverse'])
+
+
+def test_crc_detects_corruption(char_dir):
+    data = bytearray(pack_tables(_tables(char_dir)))
+    # 翻转第二张表正向表中的一个字节
+    data[HEADER_SIZE + RECORD_SIZE + 65] ^= 1
+    with pytest.raises(ValueError, match="替换表 1 校验失败"):
+        unpack_tables(bytes(data))
+
+
+def test_bad_header_and_truncation(char_dir):
+    data = pack_tables(_tables(char_dir))
+    with pytest.raises(ValueError, match="不是替换表文件"):
+        unpack_tables(b'XSUB' + data[4:])
+    with pytest.raises(ValueError, match="不完整"):
+        unpack_tables(data[:-1])
+    with pytest.raises(ValueError, match="头不完整"):
+        unpack_tables(data[:HEADER_SIZE - 1])
+
+
+def test_load_tables_prefers_current_file(char_dir):
+    original, substitution = load_charsets(char_dir)
+    rotated = build_tables(original, substitution[::-1])
+    save_tables(table_path(char_dir), [build_tables(original, substitution), rotated])
+    assert bytes(load_tables(char_dir, 1)['forward']) == bytes(rotated['forward'])
+    # substitution.txt 比 tables.bin 新时回退到文本字符集
+    stamp = time.time() + 10
+    os.utime(os.path.join(char_dir, 'substitution.txt'), (stamp, stamp))
+    assert bytes(load_tables(char_dir, 0)['forward']) == bytes(build_tables(original, substitution)['forward'])
+    with pytest.raises(ValueError, match="轮换表 1"):
+        load_tables(char_dir, 1)
+
+
+def test_corrupt_table_falls_back_to_charsets(char_dir, capsys):
+    original, substitution = load_charsets(char_dir)
+    current = build_tables(original, substitution)
+    save_tables(table_path(char_dir), [current, build_tables(original, substitution[::-1])])
+    with open(table_path(char_dir), 'r+b') as f:
+        f.seek(HEADER_SIZE + 10)
+        f.write(b'\xff')
+    # 与 C 端一致：当前替换表损坏时警告并由字符集重新构造
+    assert bytes(load_tables(char_dir, 0)['forward']) == bytes(current['forward'])
+    assert "Invalid substitution table 0" in capsys.readouterr().err
+    # 轮换表无法由字符集重建，仍然报错
+    with pytest.raises(ValueError, match="校验失败"):
+        load_tables(char_dir, 1)
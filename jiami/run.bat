@@ -28,17 +28,14 @@ set "MENU_CHOICE=%errorlevel%"
 if "%MENU_CHOICE%"=="1" (
     set "PROJECT_TYPE=encrypt"
     set "EN_DIR=%PROJECT_ROOT%en"
-    set "C_SRC=jiami.c"
-    set "EXE_NAME=jiami.exe"
-    set "PY_SCRIPTS=massage.py key.py sort.py"
+    set "FLOW_INPUT=%PROJECT_ROOT%en\data\input.txt"
     goto INIT_PROJECT
 )
 if "%MENU_CHOICE%"=="2" (
     set "PROJECT_TYPE=decrypt"
     set "EN_DIR=%PROJECT_ROOT%de"
-    set "C_SRC=jiemi.c"
-    set "EXE_NAME=jiemi.exe"
-    set "PY_SCRIPTS=ma.py key.py sort.py readkey.py"
+    REM 直接解密加密流程的输出：密钥流偏移按文件名记录在同目录的 batch.json 中
+    set "FLOW_INPUT=%PROJECT_ROOT%en\data\output.bin"
     goto INIT_PROJECT
 )
 if "%MENU_CHOICE%"=="3" goto ALL_TESTS
@@ -64,14 +61,6 @@ for %%d in ("%EN_DIR%" "%LOG_DIR%" "%BUILD_DIR%" "%DATA_DIR%") do (
 )
 
 REM ================ 环境检测 ================
-REM 检测GCC编译器
-where gcc >nul 2>&1 || (
-    echo [错误] 未找到GCC编译器
-    echo 请安装MinGW-w64并添加至PATH
-    pause
-    goto MAIN_MENU
-)
-
 REM 检测Python环境
 set "PYTHON_ENV=0"
 set "ENV_PATH=%CONDA_BASE%\envs\%CONDA_ENV%"
@@ -150,62 +139,43 @@ if exist "%REQUIREMENTS%" (
 
 REM ================ 主执行流程 ================
 set "ERROR_FLAG=0"
-set "TASK_COUNTER=0"
 
-REM [阶段1/4] 编译C模块
-echo [阶段1/4] 编译C模块...
-gcc -o "%BUILD_DIR%\%EXE_NAME%" "%SRC_DIR%\%C_SRC%" -I"%CONDA_BASE%\include" -L"%CONDA_BASE%\libs" || (
-    echo [错误] C模块编译失败
+REM [阶段1/2] 在一个Python进程内执行整个流程（flow.py 按依赖调度，输入未变的阶段直接跳过，不再每次编译C程序）
+echo [阶段1/2] 执行%PROJECT_TYPE%流程...
+
+REM 使用24小时制时间避免AM/PM问题
+for /f "tokens=1-3 delims=/" %%a in ("%date%") do (
+    set "log_date=%%a%%b%%c"
+)
+set "log_time=%time%"
+set "log_time=!log_time::=!"
+set "log_time=!log_time:.=!"
+set "log_time=!log_time: =0!"
+set "LOG_FILE=%LOG_DIR%\flow_!log_date!!log_time:~0,4!.log"
+
+REM flow.py 使用相对于项目根目录的 ./en、./de 路径
+pushd "%PROJECT_ROOT%"
+python -X utf8 "%SRC_DIR%\flow.py" "%FLOW_INPUT%" "%DATA_DIR%\output.bin" > "!LOG_FILE!" 2>&1
+set "FLOW_RESULT=!errorlevel!"
+popd
+type "!LOG_FILE!"
+if not "!FLOW_RESULT!"=="0" (
+    echo [错误] 执行失败 (代码: !FLOW_RESULT!^)
+    echo 查看日志: "!LOG_FILE!"
     set "ERROR_FLAG=1"
     goto CLEANUP
 )
 
-REM [阶段2/4] 执行Python预处理脚本
-for %%s in (%PY_SCRIPTS%) do (
-    set /a TASK_COUNTER+=1
-    echo [阶段2/4][!TASK_COUNTER!] 执行 %%~s
-    
-    REM 使用24小时制时间避免AM/PM问题
-    for /f "tokens=1-3 delims=/" %%a in ("%date%") do (
-        set "log_date=%%a%%b%%c"
-    )
-    set "log_time=%time%"
-    set "log_time=!log_time::=!"
-    set "log_time=!log_time:.=!"
-    set "log_time=!log_time: =0!"
-    
-    set "LOG_FILE=%LOG_DIR%\%%~ns_!log_date!!log_time:~0,4!.log"
-    
-    python -X utf8 "%SRC_DIR%\%%~s" > "!LOG_FILE!" 2>&1 || (
-        echo [错误] 执行失败 (代码: !ERRORLEVEL!^)
-        echo 查看日志: "!LOG_FILE!"
-        type "!LOG_FILE!"
-        set "ERROR_FLAG=1"
-        goto CLEANUP
-    )
-)
-
-REM [阶段3/4] 运行C程序
-echo [阶段3/4] 执行%PROJECT_TYPE%程序...
-"%BUILD_DIR%\%EXE_NAME%" "%DATA_DIR%\input.txt" "%DATA_DIR%\output.bin" || (
-    echo [错误] 程序执行失败 (代码: %errorlevel%)
-    set "ERROR_FLAG=1"
-    goto CLEANUP
-)
-
-REM [阶段4/4] 打包输出
-echo [阶段4/4] 生成发布包...
-if not exist "%BUILD_DIR%\%EXE_NAME%" (
-    echo [错误] 核心模块缺失
-    set "ERROR_FLAG=1"
-    goto CLEANUP
-)
+REM [阶段2/2] 打包输出（加密输出附带 batch.json，其中记录解密所需的密钥流偏移）
+echo [阶段2/2] 生成发布包...
+set "PACKAGE_FILES="%DATA_DIR%\output.bin""
+if exist "%DATA_DIR%\batch.json" set "PACKAGE_FILES=!PACKAGE_FILES!, "%DATA_DIR%\batch.json""
 
 set "ZIPFILE=%BUILD_DIR%\release_%PROJECT_TYPE%_%date:~0,4%%date:~5,2%%date:~8,2%.zip"
 if exist "%ProgramFiles%\7-Zip\7z.exe" (
-    "%ProgramFiles%\7-Zip\7z.exe" a -tzip "%ZIPFILE%" "%BUILD_DIR%\%EXE_NAME%" "%DATA_DIR%\output.bin"
+    "%ProgramFiles%\7-Zip\7z.exe" a -tzip "%ZIPFILE%" !PACKAGE_FILES:,=!
 ) else (
-    powershell Compress-Archive -Path "%BUILD_DIR%\%EXE_NAME%", "%DATA_DIR%\output.bin" -DestinationPath "%ZIPFILE%"
+    powershell Compress-Archive -Path !PACKAGE_FILES! -DestinationPath "%ZIPFILE%"
 )
 if errorlevel 1 (
     echo [警告] 打包失败，但主要流程已完成
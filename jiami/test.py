@@ -1,44 +1,109 @@
+import argparse
 import os
 import sys
 from collections import defaultdict
+from multiprocessing import Pool
+import numpy as np
+from scipy.stats import chi2
+
+# 文件的 mmap 视图与阶段跟踪共用 en/src 中的实现
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'en', 'src'))
+from keystream import map_file
+import tracing
+
+# 统计的目标字符集（可打印 ASCII，不含空格）
+TARGET_CHARS = ''.join(sorted(set(
+    r'!"#$%&\'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\]^_`abcdefghijklmnopqrstuvwxyz{|}~'
+)))
+TARGET_CODES = np.frombuffer(TARGET_CHARS.encode('ascii'), dtype=np.uint8)
+# 每次统计的块大小（字节）
+BLOCK_SIZE = 1 << 26
+
+
+def byte_histogram(file_path, block_size=BLOCK_SIZE):
+    """通过 mmap 视图分块统计文件的 256 项字节直方图，文件不存在时返回 None"""
+    hist = np.zeros(256, dtype=np.int64)
+    try:
+        with tracing.span('chars.histogram', file=file_path) as span:
+            data = map_file(file_path)
+            span.set(bytes=len(data))
+            for pos in range(0, len(data), block_size):
+                hist += np.bincount(data[pos:pos + block_size], minlength=256)
+    except FileNotFoundError:
+        return None
+    return hist
 
 
-def analyze_character_distribution(file_path):
-    """分析文本文件中指定字符集的出现频率"""
-    target_chars = ''.join(sorted(
-        r'!"#$%&\'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\]^_`abcdefghijklmnopqrstuvwxyz{|}~'
-    ))
-    char_counts = defaultdict(int)
-    total_valid_chars = 0
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                for char in line:
-                    if char in target_chars:
-                        char_counts[char] += 1
-                        total_valid_chars += 1
+def target_counts(hist):
+    """直方图中目标字符的计数（按 TARGET_CHARS 顺序）"""
+    return hist[TARGET_CODES]
 
-    except FileNotFoundError:
-        print(f"错误: 文件 {file_path} 不存在")
-        return None, None, 0
 
-    # 计算占比
+def histogram_percentages(hist):
+    """直方图 -> (char_counts, char_percentages, total)，格式与逐字符统计相同"""
+    counts = target_counts(hist)
+    total = int(counts.sum())
+    char_counts = defaultdict(int)
     char_percentages = {}
-    if total_valid_chars > 0:
-        for char, count in char_counts.items():
-            char_percentages[char] = (count, count / total_valid_chars * 100)
-
-    return char_counts, char_percentages, total_valid_chars
+    for char, count in zip(TARGET_CHARS, counts.tolist()):
+        if count:
+            char_counts[char] = count
+            char_percentages[char] = (count, count / total * 100)
+    return char_counts, char_percentages, total
 
 
-def generate_report(char_percentages, total):
+def analyze_character_distribution(file_path):
+    """分析文本文件中指定字符集的出现频率"""
+    hist = byte_histogram(file_path)
+    if hist is None:
+        print(f"错误: 文件 {file_path} 不存在")
+        return None, None, 0
+    return histogram_percentages(hist)
+
+
+def uniformity(hist):
+    """目标字符相对均匀分布的卡方统计量、P值与重合指数（IC 以 1/94 归一化，均匀时为 1）"""
+    counts = target_counts(hist).astype(np.float64)
+    total = counts.sum()
+    k = len(counts)
+    if total < 2:
+        return {'total': int(total), 'chi2': 0.0, 'p': 1.0, 'ic': 0.0, 'ic_norm': 0.0}
+    expected = total / k
+    chi2_stat = float(np.sum((counts - expected) ** 2 / expected))
+    ic = float(np.dot(counts, counts - 1) / (total * (total - 1)))
+    return {
+        'total': int(total),
+        'chi2': chi2_stat,
+        'p': float(1 - chi2.cdf(chi2_stat, k - 1)),
+        'ic': ic,
+        'ic_norm': ic * k,
+    }
+
+
+def compare_distributions(plain_hist, cipher_hist):
+    """明文与密文直方图对比，返回报告行"""
+    plain, cipher = uniformity(plain_hist), uniformity(cipher_hist)
+    lines = ["明文/密文字符分布对比", "=" * 40,
+             "指标 | 明文 | 密文"]
+    lines.append(f"有效字符数 | {plain['total']} | {cipher['total']}")
+    lines.append(f"卡方统计量 (df={len(TARGET_CHARS) - 1}) | {plain['chi2']:.2f} | {cipher['chi2']:.2f}")
+    lines.append(f"P值 | {plain['p']:.4e} | {cipher['p']:.4e}")
+    lines.append(f"重合指数 IC | {plain['ic']:.6f} | {cipher['ic']:.6f}")
+    lines.append(f"IC×{len(TARGET_CHARS)} (均匀=1) | {plain['ic_norm']:.4f} | {cipher['ic_norm']:.4f}")
+    if cipher['chi2'] > 0:
+        lines.append(f"卡方压缩比: {plain['chi2'] / cipher['chi2']:.1f}x")
+    lines.append(f"结论: {'密文接近均匀分布' if cipher['p'] > 0.05 else '密文仍偏离均匀分布'}")
+    return lines
+
+
+def generate_report(char_percentages, total, report_path='./result/char_statistics.txt'):
     """生成统计报告和可视化图表"""
     if not char_percentages:
         print("未找到有效字符统计")
         return
 
     # 创建结果目录
-    os.makedirs('./result', exist_ok=True)
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
 
     # 按ASCII码排序
     sorted_chars = sorted(char_percentages.items(), key=lambda x: ord(x[0]))
@@ -52,42 +117,106 @@ def generate_report(char_percentages, total):
     for char, (count, percentage) in sorted_chars:
         report.append(f"'{char}' | {count} | {percentage:.4f}%")
 
-    report_path = './result/char_statistics.txt'
     with open(report_path, 'w', encoding='utf-8') as f:
         f.write('\n'.join(report))
 
     return report_path
 
 
+def category_summary(percentages):
+    """按字符类别汇总占比"""
+    category_counts = defaultdict(float)
+    for char, (count, percent) in percentages.items():
+        if '0' <= char <= '9':
+            category_counts['数字'] += percent
+        elif 'a' <= char <= 'z':
+            category_counts['小写字母'] += percent
+        elif 'A' <= char <= 'Z':
+            category_counts['大写字母'] += percent
+        elif char in r'''!"#$%&'()*+,-./:;<=>?@[\]^_`{|}~''':
+            category_counts['标点符号'] += percent
+        else:
+            category_counts['其他符号'] += percent
+    return category_counts
+
+
+def report_paths(files):
+    """
+    各文件的报告路径：单个文件沿用 char_statistics.txt，多个文件按文件名区分；
+    文件名相同（如 test/1.txt 与 result/1.txt）时加上所在目录名，仍重复时再加序号，报告互不覆盖。
+    """
+    files = list(dict.fromkeys(files))
+    if len(files) == 1:
+        return {files[0]: './result/char_statistics.txt'}
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in files]
+    paths, used = {}, set()
+    for file_path, stem in zip(files, stems):
+        if stems.count(stem) > 1:
+            stem = f"{os.path.basename(os.path.dirname(os.path.abspath(file_path)))}_{stem}"
+        name, n = stem, 1
+        while name in used:
+            n += 1
+            name = f"{stem}_{n}"
+        used.add(name)
+        paths[file_path] = f'./result/char_statistics_{name}.txt'
+    return paths
+
+
+def histograms(paths, workers=None):
+    """多进程并行统计多个文件的直方图"""
+    if len(paths) <= 1 or workers == 1:
+        return [byte_histogram(p) for p in paths]
+    with Pool(min(workers or os.cpu_count() or 1, len(paths))) as pool:
+        return pool.map(byte_histogram, paths)
+
+
 if __name__ == "__main__":
-    # 分析文件
-    file_path = './result/en.txt'
-    counts, percentages, total = analyze_character_distribution(file_path)
-
-    if percentages:
-        # 生成报告
-        report_path = generate_report(percentages, total)
-        print(f"分析完成！结果已保存至: {report_path}")
-
-        # 在终端显示统计概览
-        print("\n字符分布概览:")
-        print("类别     字符数  占比(%)")
-        print("-----------------------")
-
-        category_counts = defaultdict(float)
-        for char, (count, percent) in percentages.items():
-            if '0' <= char <= '9':
-                category_counts['数字'] += percent
-            elif 'a' <= char <= 'z':
-                category_counts['小写字母'] += percent
-            elif 'A' <= char <= 'Z':
-                category_counts['大写字母'] += percent
-            elif char in r'''!"#$%&'()*+,-./:;<=>?@[\]^_`{|}~''':
-                category_counts['标点符号'] += percent
-            else:
-                category_counts['其他符号'] += percent
-
-        for category, percent_sum in category_counts.items():
-            print(f"{category:6} {percent_sum:10.2f}%")
-
-        print("\n详细统计请查看报告文件")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="字符分布统计（字节直方图）")
+    parser.add_argument("files", nargs="*", default=['./result/en.txt'], help="待统计的文件")
+    parser.add_argument("--compare", nargs=2, metavar=("PLAIN", "CIPHER"), action="append", default=[],
+                        help="明文/密文对比（可重复）")
+    parser.add_argument("--workers", type=int, default=0, help="并行进程数，0 表示全部核心")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
+
+    pairs = [tuple(pair) for pair in args.compare]
+    paths = list(dict.fromkeys(args.files + [p for pair in pairs for p in pair]))
+    hists = dict(zip(paths, histograms(paths, args.workers or None)))
+    reports = report_paths(args.files)
+
+    for file_path in args.files:
+        hist = hists[file_path]
+        if hist is None:
+            print(f"错误: 文件 {file_path} 不存在")
+            continue
+        counts, percentages, total = histogram_percentages(hist)
+
+        if percentages:
+            # 生成报告
+            report_path = generate_report(percentages, total, reports[file_path])
+            print(f"分析完成！结果已保存至: {report_path}")
+
+            # 在终端显示统计概览
+            print("\n字符分布概览:")
+            print("类别     字符数  占比(%)")
+            print("-----------------------")
+
+            for category, percent_sum in category_summary(percentages).items():
+                print(f"{category:6} {percent_sum:10.2f}%")
+
+            print("\n详细统计请查看报告文件")
+        else:
+            print("未找到有效字符统计")
+
+    for i, (plain, cipher) in enumerate(pairs):
+        if hists[plain] is None or hists[cipher] is None:
+            print(f"错误: 对比文件不存在 - {plain} / {cipher}")
+            continue
+        lines = [f"明文: {plain}", f"密文: {cipher}"] + compare_distributions(hists[plain], hists[cipher])
+        compare_path = './result/char_comparison.txt' if len(pairs) == 1 else f'./result/char_comparison_{i}.txt'
+        os.makedirs('./result', exist_ok=True)
+        with open(compare_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        print('\n'.join(lines))
+        print(f"对比结果已保存至: {compare_path}")
@@ -1,70 +1,183 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import chi2, norm, entropy
+from scipy.fft import irfft, next_fast_len, rfft
+import argparse
+import csv
+import glob
+import json
 import os
 import sys
 import math
+import time
 import traceback
+from multiprocessing import Pool
+
+# 密钥的 mmap 读取与阶段跟踪共用 en/src 中的实现
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'en', 'src'))
+from keystream import KeyFile
+import tracing
 
 os.makedirs('./result', exist_ok=True)
 
+# 近似熵与串行检验的默认模式长度 m（需要统计 m+1 位数字组）
+APEN_M = 2
+# 自相关检验的最大滞后与报告中列出的最差滞后个数
+MAX_LAG = 4096
+WORST_LAGS = 10
+# 频谱检验每块的位数（逐块做 DFT，内存与序列长度无关）
+SPECTRAL_BLOCK = 1 << 20
+# 均匀随机数字 0-9 的期望与方差
+DIGIT_MEAN = 4.5
+DIGIT_VAR = 8.25
+# 判定通过与否的六项检验（verdicts_of 的键，结果表与通过/失败矩阵中各占一列）
+TEST_NAMES = ('均匀性', '游程', '自相关', '频谱', '复杂性', '二元导数')
+
+
+def xor_distribution(level):
+    """均匀随机数字序列第 level 层异或导数的理论分布（16个取值）"""
+    digit = np.zeros(16)
+    digit[:10] = 0.1
+    # 第k层导数是 popcount(k) 决定的 2^popcount(k) 个独立数字的异或
+    terms = 1 << bin(level).count('1')
+    dist = digit
+    for _ in range(terms - 1):
+        mixed = np.zeros(16)
+        for a in range(16):
+            mixed[a ^ np.arange(16)] += dist[a] * digit
+        dist = mixed
+    return dist
+
+
+def gram_histogram(digits, width):
+    """digits 中所有长度为 width 的连续数字组（十进制编码）的直方图"""
+    bins = 10 ** width
+    n = len(digits) - width + 1
+    if n <= 0:
+        return np.zeros(bins, dtype=np.int64)
+    codes = digits[:n].astype(np.int32)
+    for j in range(1, width):
+        codes *= 10
+        codes += digits[j:j + n]
+    return np.bincount(codes, minlength=bins)
+
+
+def gram_phi(counts, n):
+    """Φ = Σ p·ln p（只对出现过的数字组求和）"""
+    p = counts[counts > 0] / n
+    return float(np.sum(p * np.log(p)))
+
+
+def gram_psi2(counts, n):
+    """串行检验统计量 ψ² = (10^k / n)·Σ ν² - n"""
+    return len(counts) / n * float(np.dot(counts, counts)) - n
+
 
 class IncrementalStats:
-    """增量计算统计量的类"""
+    """分块增量计算统计量的类（NumPy向量化，块之间保留边界状态）"""
 
-    def __init__(self):
+    def __init__(self, m=APEN_M, max_lag=MAX_LAG, spectral_block=SPECTRAL_BLOCK):
         self.count = 0
         self.sum = 0.0
         self.sum_sq = 0.0
         self.prev = None
         self.runs = 1
+        self.counts = np.zeros(10, dtype=np.int64)
 
-        self.window = []
-        self.max_window_size = 5
-
+        # (m+1) 位数字组按十进制编码计数，更短的数字组由其边缘求和得到
+        if m < 1:
+            raise ValueError("模式长度 m 至少为 1")
+        self.m = m
+        self.gram_counts = np.zeros(10 ** (m + 1), dtype=np.int64)
+        self.head = np.empty(0, dtype=np.uint8)
+        self.gram_tail = np.empty(0, dtype=np.uint8)
 
         self.levels = 3
-        self.derivative_counts = []
-        self.current_level = []
-
-    def update(self, digit):
-        """更新统计量"""
-        # 基本计数
-        self.count += 1
-        self.sum += digit
-        self.sum_sq += digit * digit
-
-        if self.prev is not None and digit != self.prev:
-            self.runs += 1
-        self.prev = digit
-
-        self.window.append(digit)
-        if len(self.window) > self.max_window_size:
-            self.window.pop(0)
-
-
-        if not self.current_level:
-            self.current_level = [digit]
-        else:
-
-            self.current_level.append(digit)
-
+        self.derivative_counts = [np.zeros(16, dtype=np.int64) for _ in range(self.levels)]
+        self.tail = np.empty(0, dtype=np.uint8)
 
-            if len(self.current_level) > 1:
-                derivative = self.current_level[-2] ^ self.current_level[-1]
+        # 自相关：S_k = Σ x_i·x_{i+k}（x 为按理论均值中心化的数字），跨块保留末尾 max_lag 个值
+        self.max_lag = max_lag
+        self.lag_sums = np.zeros(max_lag + 1)
+        self.lag_tail = np.empty(0)
 
+        # 频谱检验：凑满一块后做 DFT，累计低于阈值的峰值个数
+        self.spectral_block = spectral_block
+        self.pending = np.empty(0)
+        self.spectral_below = 0
+        self.spectral_total = 0
 
-                if len(self.derivative_counts) < len(self.current_level) - 1:
-                    self.derivative_counts.append({})
-
+    def update(self, digit):
+        """更新单个数字"""
+        self.update_block(np.array([digit], dtype=np.uint8))
 
-                level_index = len(self.current_level) - 2
-                if level_index < self.levels:
-                    if level_index >= len(self.derivative_counts):
-                        self.derivative_counts.append({})
+    def update_block(self, digits):
+        """更新一块数字（uint8数组，取值0-9）"""
+        n = len(digits)
+        if n == 0:
+            return
 
-                    self.derivative_counts[level_index][derivative] = \
-                        self.derivative_counts[level_index].get(derivative, 0) + 1
+        # 基本计数
+        wide = digits.astype(np.int64)
+        self.count += n
+        self.sum += int(wide.sum())
+        self.sum_sq += int(np.dot(wide, wide))
+        self.counts += np.bincount(digits, minlength=10)
+
+        # 游程：相邻数字不同计一次，包括与上一块最后一个数字的比较
+        if self.prev is not None and digits[0] != self.prev:
+            self.runs += 1
+        self.runs += int(np.count_nonzero(digits[1:] != digits[:-1]))
+        self.prev = int(digits[-1])
+
+        self.count_grams(digits)
+
+        # 多层异或导数：拼接上一块末尾的数字，只统计本块新产生的导数
+        joined = np.concatenate((self.tail, digits))
+        carried = len(self.tail)
+        level = joined
+        for k in range(1, self.levels + 1):
+            level = level[:-1] ^ level[1:]
+            fresh = level[max(0, carried - k):]
+            if len(fresh):
+                self.derivative_counts[k - 1] += np.bincount(fresh, minlength=16)
+        self.tail = joined[-self.levels:]
+
+        centered = digits - DIGIT_MEAN
+        self.accumulate_lags(centered)
+        self.accumulate_spectrum(centered)
+
+    def accumulate_lags(self, centered):
+        """FFT 一次算出本块所有滞后 1..max_lag 的乘积和（含与上一块末尾的跨块项）"""
+        joined = np.concatenate((self.lag_tail, centered))
+        fresh = joined.copy()
+        fresh[:len(self.lag_tail)] = 0
+        size = next_fast_len(len(joined) + self.max_lag, real=True)
+        # irfft(conj(A)·B)[k] = Σ_i a[i]·b[i+k]，b 只保留本块的值，避免重复计数
+        corr = irfft(np.conj(rfft(joined, size)) * rfft(fresh, size), size)
+        self.lag_sums += corr[:self.max_lag + 1]
+        self.lag_tail = joined[-self.max_lag:]
+
+    def accumulate_spectrum(self, centered, final=False):
+        """NIST 频谱检验：对每块标准化序列做 DFT，统计前半频段模长低于 95% 阈值的个数"""
+        self.pending = np.concatenate((self.pending, centered))
+        while len(self.pending) >= self.spectral_block or (final and len(self.pending) >= 100):
+            block = self.pending[:self.spectral_block]
+            self.pending = self.pending[len(block):]
+            n = len(block)
+            modulus = np.abs(rfft(block / math.sqrt(DIGIT_VAR))[:n // 2])
+            threshold = math.sqrt(math.log(1 / 0.05) * n)
+            self.spectral_below += int(np.count_nonzero(modulus < threshold))
+            self.spectral_total += n // 2
+
+    def count_grams(self, digits):
+        """滚动编码 (m+1) 位数字组并计数，跨块保留末尾 m 位"""
+        width = self.m + 1
+        if len(self.head) < self.m:
+            self.head = np.concatenate((self.head, digits[:self.m - len(self.head)]))
+        joined = np.concatenate((self.gram_tail, digits))
+        self.gram_tail = joined[-self.m:]
+        self.gram_counts += gram_histogram(joined, width)
 
     def finalize(self):
         """完成计算并返回统计量"""
@@ -72,63 +185,90 @@ class IncrementalStats:
         mean = self.sum / n if n > 0 else 0
         total_variance = self.sum_sq - n * mean * mean
 
-        apen = self.calculate_approximate_entropy()
-
+        apen, serial = self.calculate_approximate_entropy()
+        autocorr = self.analyze_autocorrelation()
+        spectral = self.analyze_spectrum()
 
         binary_derivative_result = self.analyze_binary_derivatives(n)
 
         return {
             'n': n,
+            'counts': self.counts,
             'mean': mean,
             'total_variance': total_variance,
             'runs': self.runs,
             'apen': apen,
+            'serial': serial,
+            'autocorr': autocorr,
+            'spectral': spectral,
+            'm': self.m,
             'binary_derivative': binary_derivative_result
         }
 
     def calculate_approximate_entropy(self):
-        """计算近似熵"""
-        n = len(self.window)
-        if n < 100:
-            return 0.0, 1.0
-
-
-        m = 3
-        patterns = {}
-        for i in range(n - m + 1):
-            pattern = tuple(self.window[i:i + m])
-            patterns[pattern] = patterns.get(pattern, 0) + 1
-
-        phi_m = 0.0
-        for count in patterns.values():
-            p = count / (n - m + 1)
-            phi_m += p * math.log(p + 1e-10)
-
-
-        m1 = m + 1
-        if n < m1 + 1:
-            return phi_m, 1.0
-
-        patterns_m1 = {}
-        for i in range(n - m1 + 1):
-            pattern = tuple(self.window[i:i + m1])
-            patterns_m1[pattern] = patterns_m1.get(pattern, 0) + 1
-
-        # 计算Φ(m+1)
-        phi_m1 = 0.0
-        for count in patterns_m1.values():
-            p = count / (n - m1 + 1)
-            phi_m1 += p * math.log(p + 1e-10)
-
-        # 近似熵
-        apen = phi_m - phi_m1
-
-        # 计算p值 (简化的估计)
-        sd = np.sqrt(14 / n)
-        z = apen / sd
-        p_value = 2 * (1 - norm.cdf(np.abs(z)))
-
-        return apen, p_value
+        """
+        计算整个序列的近似熵与串行检验（NIST SP 800-22 的十进制形式，序列首尾循环相接）。
+        返回 ((近似熵, P值), (∇ψ² P值, ∇²ψ² P值))
+        """
+        n = self.count
+        m = self.m
+        if n < 100 or n < 10 ** (m + 1):
+            return (0.0, 1.0), (1.0, 1.0)
+
+        # 补上跨越序列末尾回到开头的数字组
+        wrap = np.concatenate((self.gram_tail, self.head))
+        counts = self.gram_counts + gram_histogram(wrap, m + 1)
+
+        # 循环计数下，k 位数字组的计数等于 k+1 位数字组对最后一位求和
+        orders = {m + 1: counts}
+        for k in range(m, 0, -1):
+            orders[k] = orders[k + 1].reshape(-1, 10).sum(axis=1)
+
+        # 近似熵：2n(ln10 - ApEn) 服从自由度 10^(m+1) - 10^m 的卡方分布
+        apen = gram_phi(orders[m], n) - gram_phi(orders[m + 1], n)
+        chi_val = 2 * n * (math.log(10) - apen)
+        p_value = 1 - chi2.cdf(chi_val, 10 ** (m + 1) - 10 ** m)
+
+        # 串行检验：∇ψ² 与 ∇²ψ²（ψ²_0 = 0）
+        psi = {k: gram_psi2(orders[k], n) if k > 0 else 0.0 for k in range(m - 2, m + 1)}
+        del1 = psi[m] - psi[m - 1]
+        del2 = psi[m] - 2 * psi[m - 1] + psi[m - 2]
+        p_serial1 = 1 - chi2.cdf(del1, 10 ** m - 10 ** (m - 1))
+        p_serial2 = 1 - chi2.cdf(del2, 81 * 10 ** (m - 2)) if m >= 2 else 1.0
+
+        return (apen, p_value), (p_serial1, p_serial2)
+
+    def analyze_autocorrelation(self):
+        """
+        各滞后的自相关检验：H0 下 z_k = S_k / (σ²·√(n-k)) 近似服从标准正态。
+        返回 (最差滞后列表 [(滞后, 相关系数, P值)], 总体P值)，总体P值对最小P值做 Šidák 校正
+        """
+        n = self.count
+        lags = np.arange(1, min(self.max_lag, n - 100) + 1)
+        if len(lags) == 0:
+            return [], 1.0
+
+        pairs = n - lags
+        sums = self.lag_sums[lags]
+        r = sums / (pairs * DIGIT_VAR)
+        z = np.abs(sums / (DIGIT_VAR * np.sqrt(pairs)))
+        p_values = 2 * norm.sf(z)
+
+        # 按 |z| 排序，P值下溢为0时仍能区分最差的滞后
+        worst = np.argsort(-z, kind='stable')[:WORST_LAGS]
+        worst_lags = [(int(lags[i]), float(r[i]), float(p_values[i])) for i in worst]
+        overall = -np.expm1(len(lags) * np.log1p(-min(p_values[worst[0]], 1 - 1e-16)))
+        return worst_lags, float(overall)
+
+    def analyze_spectrum(self):
+        """汇总频谱检验，返回 (低于阈值的峰值数, 期望数, d 统计量, P值)"""
+        self.accumulate_spectrum(np.empty(0), final=True)
+        total = self.spectral_total
+        if total == 0:
+            return 0, 0.0, 0.0, 1.0
+        expected = 0.95 * total
+        d = (self.spectral_below - expected) / math.sqrt(total * 0.95 * 0.05)
+        return self.spectral_below, expected, d, float(2 * norm.sf(abs(d)))
 
     def analyze_binary_derivatives(self, n):
         """分析二元导数"""
@@ -136,18 +276,13 @@ class IncrementalStats:
         max_level = min(self.levels, len(self.derivative_counts))
 
         for level in range(max_level):
-            level_counts = self.derivative_counts[level]
-            total = sum(level_counts.values())
+            obs = self.derivative_counts[level].astype(np.float64)
+            total = obs.sum()
             if total < 100:
                 continue
 
-            # 计算卡方统计量
-            obs = np.zeros(16)
-            for digit, count in level_counts.items():
-                if digit < 16:  # 确保在0-15范围内
-                    obs[digit] = count
-
-            expected = np.full(16, total / 16)
+            # 计算卡方统计量（期望为均匀数字异或后的理论分布）
+            expected = xor_distribution(level + 1) * total
             chi2_stat = np.sum((obs - expected) ** 2 / expected)
             df = 15
             p_value = 1 - chi2.cdf(chi2_stat, df)
@@ -155,7 +290,7 @@ class IncrementalStats:
 
         # 组合p值
         if p_values:
-            chi_val = -2 * sum(np.log(p) for p in p_values)
+            chi_val = -2 * sum(np.log(max(p, 1e-300)) for p in p_values)
             df = 2 * len(p_values)
             combined_p = 1 - chi2.cdf(chi_val, df)
             return p_values, combined_p
@@ -163,184 +298,348 @@ class IncrementalStats:
         return [], 1.0
 
 
-def process_large_file(filename, chunk_size=1000000):
-    """分块处理大型文件"""
-    stats = IncrementalStats()
-
-    with open(filename, 'r') as f:
-        while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
-                break
+def process_large_file(filename, chunk_size=1000000, m=APEN_M):
+    """经 mmap 分块处理大型文件（每块一次向量化更新，不整体读入内存）"""
+    stats = IncrementalStats(m)
+    for chunk in KeyFile(filename).iter_chunks(chunk_size):
+        stats.update_block(chunk - ord('0'))
+    return stats.finalize()
 
-            for char in chunk:
-                if char in '0123456789':
-                    digit = int(char)
-                    stats.update(digit)
 
-    return stats.finalize()
-def analyze_sequence(filename, output_file):
+def run_tests(filename, m=APEN_M):
+    """对一个文件执行全部检验，返回各统计量与P值的字典（文件中无数字时返回 None）"""
+    results = process_large_file(filename, m=m)
+    n = results['n']
+    if n == 0:
+        return None
+
+    counts = results['counts'].astype(np.float64)
+    expected = n / 10
+
+    # 1. 卡方检验
+    chi2_stat = np.sum((counts - expected) ** 2 / expected)
+    df = 9
+    p_value_chi2 = 1 - chi2.cdf(chi2_stat, df)
+
+    # 2. 游程检验
+    runs = results['runs']
+    p_is = counts / n
+    expected_runs = 1 + (n - 1) * (1 - np.sum(p_is ** 2))
+
+    variance = (n - 1) * (np.sum(p_is ** 2) - np.sum(p_is ** 3)
+                          - (np.sum(p_is ** 2)) ** 2 + np.sum(p_is ** 4))
+
+    if variance <= 0:
+        p_value_runs = 1.0
+    else:
+        z = (runs - expected_runs) / np.sqrt(variance)
+        p_value_runs = 2 * (1 - norm.cdf(abs(z)))
+
+    # 3. 序列复杂性检测 (近似熵)
+    apen, apen_p = results['apen']
+    serial_p1, serial_p2 = results['serial']
+
+    # 4. 二元导数检测
+    binary_p_values, binary_combined_p = results['binary_derivative']
+
+    # 5. 自相关与频谱检验
+    worst_lags, autocorr_p = results['autocorr']
+    peaks, expected_peaks, spectral_d, spectral_p = results['spectral']
+
+    return {
+        'file': filename,
+        'n': n,
+        'counts': [int(c) for c in results['counts']],
+        'chi2': float(chi2_stat),
+        'chi2_df': df,
+        'chi2_p': float(p_value_chi2),
+        'runs': int(runs),
+        'expected_runs': float(expected_runs),
+        'runs_p': float(p_value_runs),
+        'm': results['m'],
+        'apen': float(apen),
+        'apen_p': float(apen_p),
+        'serial_p1': float(serial_p1),
+        'serial_p2': float(serial_p2),
+        'derivative_p': [float(p) for p in binary_p_values],
+        'derivative_combined_p': float(binary_combined_p),
+        'max_lag': MAX_LAG,
+        'autocorr_worst': worst_lags,
+        'autocorr_p': autocorr_p,
+        'spectral_peaks': peaks,
+        'spectral_expected': float(expected_peaks),
+        'spectral_d': float(spectral_d),
+        'spectral_p': spectral_p,
+    }
+
+
+def verdicts_of(stats, alpha=0.05):
+    """六项检验（TEST_NAMES）是否通过（有序字典：检验名 -> bool）；复杂性取近似熵与两项串行检验中最小的P值"""
+    return {
+        '均匀性': stats['chi2_p'] > alpha,
+        '游程': stats['runs_p'] > alpha,
+        '自相关': stats['autocorr_p'] > alpha,
+        '频谱': stats['spectral_p'] > alpha,
+        '复杂性': min(stats['apen_p'], stats['serial_p1'], stats['serial_p2']) > alpha,
+        '二元导数': stats['derivative_combined_p'] > alpha,
+    }
+
+
+def build_report(stats):
+    """由 run_tests 的结果生成文本报告"""
+    n = stats['n']
+    counts = np.array(stats['counts'], dtype=np.float64)
+    expected = n / 10
+    verdicts = verdicts_of(stats)
+
+    report = [
+        "=" * 70,
+        "大型数字序列随机性分析报告",
+        "=" * 70,
+        f"分析文件: {stats['file']}",
+        f"序列长度: {n:,} 个数字",
+        f"分析时间: {np.datetime64('now')}",
+        "",
+        "[1] 各数字出现频率",
+        f"- 总计: {n:,} 个数字",
+        f"- 最高频率: 数字 {np.argmax(counts)} ({counts[np.argmax(counts)]:,}, {counts[np.argmax(counts)] / n:.4%})",
+        f"- 最低频率: 数字 {np.argmin(counts)} ({counts[np.argmin(counts)]:,}, {counts[np.argmin(counts)] / n:.4%})",
+        ""
+    ]
+
+    for digit, count in enumerate(counts):
+        deviation = (count - expected) / expected * 100
+        report.append(f"- 数字 {digit}: {count:,} 次 ({count / n:.4%}) | 偏离: {deviation:+.2f}%")
+
+    report.extend([
+        "",
+        "[2] 卡方检验 (均匀性)",
+        f"- 卡方统计量: {stats['chi2']:.4f}",
+        f"- 自由度: {stats['chi2_df']}",
+        f"- P值: {stats['chi2_p']:.4e}",
+        f"- 结论: {'满足均匀性 (P>0.05)' if verdicts['均匀性'] else '不满足均匀性'}",
+        "",
+        "[3] 游程检验 (模式检测)",
+        f"- 观测游程数: {stats['runs']:,}",
+        f"- 期望游程数: {stats['expected_runs']:.0f}",
+        f"- P值: {stats['runs_p']:.4e}",
+        f"- 结论: {'随机模式' if verdicts['游程'] else '非随机模式'}",
+        "",
+        "[4] 自相关检验 (FFT, 滞后 1-{})".format(stats['max_lag']),
+    ])
+
+    for lag, r, p in stats['autocorr_worst']:
+        report.append(f"- 滞后 {lag}: 相关系数 {r:+.6f} | P值: {p:.4e}")
+
+    report.extend([
+        f"- 总体P值 (Šidák 校正): {stats['autocorr_p']:.4e}",
+        f"- 结论: {'无滞后相关' if verdicts['自相关'] else '检测到滞后相关'}",
+        "",
+        "[5] 频谱检验 (DFT)",
+        f"- 低于阈值的峰值数: {stats['spectral_peaks']:,} (期望 {stats['spectral_expected']:,.0f})",
+        f"- d 统计量: {stats['spectral_d']:+.4f}",
+        f"- P值: {stats['spectral_p']:.4e}",
+        f"- 结论: {'无周期成分' if verdicts['频谱'] else '检测到周期成分'}",
+        "",
+        "[6] 序列复杂性检测 (近似熵)",
+        f"- 模式长度: m = {stats['m']}",
+        f"- 近似熵值: {stats['apen']:.6f} (理想值 ln10 = {math.log(10):.6f})",
+        f"- P值: {stats['apen_p']:.4e}",
+        f"- 串行检验 ∇ψ² P值: {stats['serial_p1']:.4e}",
+        f"- 串行检验 ∇²ψ² P值: {stats['serial_p2']:.4e}",
+        f"- 结论: {'复杂性高(随机)' if verdicts['复杂性'] else '复杂性低(有模式)'}",
+        "",
+        "[7] 二元导数检测 (周期性模式)",
+    ])
+
+    for level, p in enumerate(stats['derivative_p']):
+        report.append(f"- 层级 {level + 1} p值: {p:.4e}")
+
+    report.append(f"- 组合p值: {stats['derivative_combined_p']:.4e}")
+    report.append(f"- 结论: {'无周期性模式' if verdicts['二元导数'] else '检测到周期性模式'}")
+
+    # 综合结论
+    tests_passed = sum(verdicts.values())
+
+    if tests_passed == len(verdicts):
+        conclusion = "序列表现出良好的随机性特征"
+    elif tests_passed >= len(verdicts) // 2:
+        conclusion = "序列表现出一定随机性，但有轻微异常"
+    else:
+        conclusion = "序列不符合随机性要求"
+
+    report.append(conclusion)
+    report.append("=" * 70)
+    return "\n".join(report)
+
+
+def analyze_sequence(filename, output_file, m=APEN_M):
     """分析数字序列的随机性并生成报告"""
     try:
         print("开始分析大型序列 (分块处理)...")
-        results = process_large_file(filename)
-
-        if results['n'] == 0:
+        stats = run_tests(filename, m)
+        if stats is None:
             return "错误: 文件中没有找到有效数字"
 
-        n = results['n']
-
-        print("处理数字频率统计...")
-        counts = np.zeros(10)
-        with open(filename, 'r') as f:
-            while True:
-                chunk = f.read(1000000)
-                if not chunk:
-                    break
-                for char in chunk:
-                    if char in '0123456789':
-                        digit = int(char)
-                        counts[digit] += 1
-
-        expected = n / 10
-        autocorr = {}
+        report = build_report(stats)
 
-        print("基本统计计算完成, 执行高级分析...")
+        # 写入报告文件
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(report)
 
-        # 1. 卡方检验
-        chi2_stat = np.sum((counts - expected) ** 2 / expected)
-        df = 9
-        p_value_chi2 = 1 - chi2.cdf(chi2_stat, df)
+        return report
 
-        # 2. 游程检验
-        runs = results['runs']
-        p_is = counts / n
-        expected_runs = 1 + (n - 1) * (1 - np.sum(p_is ** 2))
+    except Exception as e:
+        return f"分析时发生错误: {str(e)}\n{traceback.format_exc()}"
 
-        variance = (n - 1) * (np.sum(p_is ** 2) - np.sum(p_is ** 3)
-                              - (np.sum(p_is ** 2)) ** 2 + np.sum(p_is ** 4))
 
-        if variance <= 0:
-            p_value_runs = 1.0
-        else:
-            z = (runs - expected_runs) / np.sqrt(variance)
-            p_value_runs = 2 * (1 - norm.cdf(abs(z)))
-
-        # 3. 序列复杂性检测 (近似熵)
-        apen, apen_p = results['apen']
-
-        # 4. 二元导数检测
-        binary_p_values, binary_combined_p = results['binary_derivative']
-
-        # 生成可视化图表
-        plot_path = './result'
-
-        # 生成报告
-        report = [
-            "=" * 70,
-            "大型数字序列随机性分析报告",
-            "=" * 70,
-            f"分析文件: {filename}",
-            f"序列长度: {n:,} 个数字",
-            f"分析时间: {np.datetime64('now')}",
-            "",
-            "[1] 各数字出现频率",
-            f"- 总计: {n:,} 个数字",
-            f"- 最高频率: 数字 {np.argmax(counts)} ({counts[np.argmax(counts)]:,}, {counts[np.argmax(counts)] / n:.4%})",
-            f"- 最低频率: 数字 {np.argmin(counts)} ({counts[np.argmin(counts)]:,}, {counts[np.argmin(counts)] / n:.4%})",
-            ""
-        ]
-
-        for digit, count in enumerate(counts):
-            deviation = (count - expected) / expected * 100
-            report.append(f"- 数字 {digit}: {count:,} 次 ({count / n:.4%}) | 偏离: {deviation:+.2f}%")
-
-        report.extend([
-            "",
-            "[2] 卡方检验 (均匀性)",
-            f"- 卡方统计量: {chi2_stat:.4f}",
-            f"- 自由度: {df}",
-            f"- P值: {p_value_chi2:.4e}",
-            f"- 结论: {'满足均匀性 (P>0.05)' if p_value_chi2 > 0.05 else '不满足均匀性'}",
-            "",
-            "[3] 游程检验 (模式检测)",
-            f"- 观测游程数: {runs:,}",
-            f"- 期望游程数: {expected_runs:.0f}",
-            f"- P值: {p_value_runs:.4e}",
-            f"- 结论: {'随机模式' if p_value_runs > 0.05 else '非随机模式'}",
-            "",
-            "[4] 序列复杂性检测 (近似熵)",
-            f"- 近似熵值: {apen:.6f}",
-            f"- P值: {apen_p:.4e}",
-            f"- 结论: {'复杂性高(随机)' if apen_p > 0.05 else '复杂性低(有模式)'}",
-            "",
-            "[5] 二元导数检测 (周期性模式)",
-        ])
-
-        for level, p in enumerate(binary_p_values):
-            report.append(f"- 层级 {level + 1} p值: {p:.4e}")
-
-        report.append(f"- 组合p值: {binary_combined_p:.4e}")
-        report.append(f"- 结论: {'无周期性模式' if binary_combined_p > 0.05 else '检测到周期性模式'}")
-
-        # 综合结论
-        tests_passed = sum([
-            p_value_chi2 > 0.05,
-            p_value_runs > 0.05,
-            apen_p > 0.05,
-            binary_combined_p > 0.05
-        ])
-
-        if tests_passed == 4:
-            conclusion = "序列表现出良好的随机性特征"
-        elif tests_passed >= 2:
-            conclusion = "序列表现出一定随机性，但有轻微异常"
-        else:
-            conclusion = "序列不符合随机性要求"
+def report_path(filename, out_dir='./result'):
+    """key3.txt -> ./result/test3.txt，其他文件 -> ./result/test_<文件名>.txt"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = 'test' + stem[3:] if stem.startswith('key') else 'test_' + stem
+    return os.path.join(out_dir, name + '.txt')
 
-        report.append(conclusion)
-        report.append("=" * 70)
 
-        # 写入报告文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("\n".join(report))
+def expand_inputs(patterns):
+    """展开文件名与通配符，去重并保持顺序"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in files:
+                files.append(path)
+    return files
 
-        return "\n".join(report)
 
+def _batch_job(args):
+    """进程池任务：分析一个文件、写出报告，返回结果记录"""
+    filename, out_dir, m = args
+    start = time.perf_counter()
+    record = {'file': filename, 'report': report_path(filename, out_dir)}
+    try:
+        with tracing.span('randomness.file', file=filename) as span:
+            stats = run_tests(filename, m)
+            span.set(digits=stats['n'] if stats else 0)
+        if stats is None:
+            record['error'] = "文件中没有找到有效数字"
+        else:
+            with open(record['report'], 'w', encoding='utf-8') as f:
+                f.write(build_report(stats))
+            record.update(stats)
+            record['verdicts'] = verdicts_of(stats)
+            record['passed'] = all(record['verdicts'].values())
     except Exception as e:
-        return f"分析时发生错误: {str(e)}\n{traceback.format_exc()}"
+        record['error'] = str(e)
+    record['elapsed'] = time.perf_counter() - start
+    return record
+
+
+def run_batch(files, out_dir='./result', m=APEN_M, workers=None, progress=None):
+    """多进程并行分析多个文件；大文件先提交，返回与 files 顺序一致的记录列表"""
+    os.makedirs(out_dir, exist_ok=True)
+    order = sorted(files, key=lambda f: os.path.getsize(f) if os.path.exists(f) else 0, reverse=True)
+    records = {}
+    with tracing.span('randomness.batch', files=len(files)), \
+            Pool(min(workers or os.cpu_count() or 1, max(len(files), 1))) as pool:
+        for record in pool.imap_unordered(_batch_job, [(f, out_dir, m) for f in order]):
+            records[record['file']] = record
+            if progress:
+                progress(record)
+    return [records[f] for f in files]
+
+
+# CSV 列：各项统计量与P值，derivative_p1.. 按层数插在 serial_p2 之后，六项检验的判定各占一列（列名同 TEST_NAMES）
+CSV_FIELDS = ['file', 'n', 'chi2', 'chi2_p', 'runs', 'expected_runs', 'runs_p', 'm', 'apen', 'apen_p',
+              'serial_p1', 'serial_p2', 'derivative_combined_p', 'autocorr_p', 'spectral_d', 'spectral_p',
+              *TEST_NAMES, 'passed', 'elapsed', 'error']
+
+
+def write_results(records, json_file=None, csv_file=None):
+    """把结果表写成 JSON（每条记录的 verdicts 含六项检验）和/或 CSV（列见 CSV_FIELDS）"""
+    if json_file:
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+    if csv_file:
+        levels = max((len(r.get('derivative_p', [])) for r in records), default=0)
+        fields = CSV_FIELDS[:12] + [f'derivative_p{k + 1}' for k in range(levels)] + CSV_FIELDS[12:]
+        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for record in records:
+                row = dict(record)
+                for k, p in enumerate(record.get('derivative_p', [])):
+                    row[f'derivative_p{k + 1}'] = p
+                row.update(record.get('verdicts', {}))
+                writer.writerow(row)
+
+
+def format_matrix(records):
+    """通过/失败矩阵：每个文件一行，每项检验一列"""
+    names = TEST_NAMES
+    width = max([len(os.path.basename(r['file'])) for r in records] + [8])
+    # 中文字符按两列宽对齐
+    lines = ["文件" + " " * (width - 4) + "  " + "  ".join(names) + "  综合"]
+    for record in records:
+        name = os.path.basename(record['file']).ljust(width)
+        if 'error' in record:
+            lines.append(f"{name}  错误: {record['error']}")
+            continue
+        marks = ["通过" if record['verdicts'][t] else "失败" for t in names]
+        cells = "  ".join(mark + " " * (2 * len(t) - 4) for mark, t in zip(marks, names))
+        lines.append(f"{name}  {cells}  {'通过' if record['passed'] else '失败'}")
+    passed = sum(1 for r in records if r.get('passed'))
+    lines.append(f"通过: {passed}/{len(records)}")
+    return "\n".join(lines)
 
 
 def main():
     """主函数"""
-    for i in range(10):
-
-        input_file = f"./en/keys/key{i}.txt"
-        output_file = f"./result/test{i}.txt"
-
-        print("=" * 70)
-        print("数字序列随机性分析工具 ")
-        print("=" * 70)
-        print(f"输入文件: {input_file}")
-        print(f"输出报告: {output_file}")
-        print(f"图表目录: ./result/")
-        print("=" * 70)
-
-        if not os.path.exists(input_file):
-            print(f"错误: 输入文件不存在 - {input_file}")
-            return
-        report = analyze_sequence(input_file, output_file)
-        print("\n分析摘要:")
-        print("=" * 70)
-        key_lines = [line for line in report.split('\n') if any(kw in line for kw in ['结论:', 'P值:', '检测', '熵值'])]
-        for line in key_lines:
-            if "=" not in line:  # 跳过分隔线
-                print(line)
-
-        print("=" * 70)
-        print(f"\n完整报告已保存至: {output_file}")
-        print("分析完成!")
+    parser = argparse.ArgumentParser(description="数字序列随机性批量分析")
+    parser.add_argument("inputs", nargs="*", default=[f"./en/keys/key{i}.txt" for i in range(10)],
+                        help="密钥文件或通配符（默认 ./en/keys/key0-9.txt）")
+    parser.add_argument("--out-dir", default="./result", help="文本报告目录")
+    parser.add_argument("--workers", type=int, default=0, help="并行进程数，0 表示全部核心")
+    parser.add_argument("--m", type=int, default=APEN_M, help="近似熵/串行检验的模式长度")
+    parser.add_argument("--json", default="./result/randomness.json", help="JSON 结果表（空字符串表示不写）")
+    parser.add_argument("--csv", default="./result/randomness.csv", help="CSV 结果表（空字符串表示不写）")
+    parser.add_argument("--trace", help="把各阶段的耗时与资源记录追加到该 JSON-lines 文件（也可设置环境变量 JIAMI_TRACE）")
+    args = parser.parse_args()
+    tracing.enable(args.trace)
+
+    files = expand_inputs(args.inputs)
+    missing = [f for f in files if not os.path.exists(f)]
+    for f in missing:
+        print(f"跳过不存在的文件: {f}")
+    files = [f for f in files if f not in missing]
+    if not files:
+        print("错误: 没有可分析的输入文件")
+        return 1
+
+    print("=" * 70)
+    print("数字序列随机性分析工具 ")
+    print("=" * 70)
+    print(f"输入文件: {len(files)} 个")
+    print(f"报告目录: {args.out_dir}")
+    print("=" * 70)
+
+    start = time.perf_counter()
+
+    def progress(record):
+        status = record.get('error') or ('通过' if record['passed'] else '失败')
+        print(f"[{record['elapsed']:.1f}s] {record['file']} -> {record['report']}: {status}")
+
+    records = run_batch(files, args.out_dir, args.m, args.workers or None, progress)
+    write_results(records, args.json or None, args.csv or None)
+
+    print("=" * 70)
+    print(format_matrix(records))
+    print("=" * 70)
+    print(f"总耗时: {time.perf_counter() - start:.1f}s")
+    for path in (args.json, args.csv):
+        if path:
+            print(f"结果表已保存至: {path}")
+    return 0 if all(r.get('passed') for r in records) else 1
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())